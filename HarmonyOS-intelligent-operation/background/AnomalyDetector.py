@@ -0,0 +1,239 @@
+"""
+流式异常检测引擎
+每条时间序列（主机 + 指标）在 NumPy 数组中维护 EWMA 基线、按天周期的季节项和
+指数加权绝对偏差（鲁棒尺度），每个样本 O(1) 更新，一次调用可同时更新全部序列；
+检测到的异常写入 anomalies 表供 /api/anomalies 分页查询
+"""
+import os
+import time
+import platform
+import threading
+import numpy as np
+from datetime import datetime
+from Database import get_connection, transaction
+from MetricStore import snapshot_to_row, METRIC_COLUMNS
+
+
+def anomalies_query(limit, after_id=None, host=None, metric=None):
+    """异常记录查询（按 id 倒序），返回 (sql, params)；同时供 Migrations.hot_queries() 检查执行计划"""
+    conditions = []
+    params = []
+    if host:
+        conditions.append('host = ?')
+        params.append(host)
+    if metric:
+        conditions.append('metric = ?')
+        params.append(metric)
+    if after_id is not None:
+        conditions.append('id < ?')
+        params.append(after_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    params.append(limit)
+    return f'''SELECT id, timestamp, host, metric, value, baseline, score
+        FROM anomalies {where} ORDER BY id DESC LIMIT ?''', params
+
+
+# MAD -> 标准差 的换算系数（正态分布下）
+MAD_TO_SIGMA = 1.4826
+
+
+class AnomalyDetector:
+    """基于 EWMA + 季节基线 + 鲁棒 z-score 的在线异常检测器"""
+
+    def __init__(self, db_path=None, alpha=0.05, season_alpha=0.1, threshold=4.0,
+                 warmup=30, season_slots=288, min_scale=0.5, capacity=64, persist=True):
+        """
+        Args:
+            alpha: 基线与尺度的平滑系数
+            season_alpha: 季节项的平滑系数
+            threshold: |z| 超过该值判定为异常
+            warmup: 每条序列至少观察多少个样本后才开始判定
+            season_slots: 一天划分的季节槽数（288 即每5分钟一个槽）
+            min_scale: 尺度下限，避免常数序列上微小波动被判为异常
+            persist: 是否把异常写入 anomalies 表
+        """
+        self.db_path = db_path or os.path.join(os.path.dirname(__file__), 'monitor.db')
+        self.alpha = alpha
+        self.season_alpha = season_alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.season_slots = season_slots
+        self.slot_seconds = 86400 / season_slots
+        self.min_scale = min_scale
+        self.persist = persist
+        self.host = platform.node()
+
+        self._lock = threading.Lock()
+        self._index = {}
+        self._keys = []
+        # 远程主机已检测到的最新样本时间，由各主机的锁保护
+        self._last_ts = {}
+        self._host_locks = {}
+        self._alloc(capacity)
+        if persist:
+            self._init_table()
+
+    def _alloc(self, capacity):
+        self.level = np.zeros(capacity)
+        self.mad = np.zeros(capacity)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.season = np.zeros((capacity, self.season_slots))
+
+    def _grow(self, capacity):
+        old = (self.level, self.mad, self.count, self.season)
+        n = len(old[0])
+        self._alloc(capacity)
+        self.level[:n], self.mad[:n], self.count[:n], self.season[:n] = old
+
+    def _init_table(self):
+        """初始化异常记录表"""
+        with transaction(self.db_path) as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS anomalies (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                host TEXT,
+                metric TEXT NOT NULL,
+                value REAL,
+                baseline REAL,
+                score REAL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_anomalies_host_metric ON anomalies(host, metric, id)')
+
+    def series_indices(self, keys):
+        """把 (host, metric) 键映射为数组下标，新序列自动注册"""
+        index = self._index
+        out = np.empty(len(keys), dtype=np.int64)
+        with self._lock:
+            for i, key in enumerate(keys):
+                idx = index.get(key)
+                if idx is None:
+                    idx = index[key] = len(self._keys)
+                    self._keys.append(key)
+                out[i] = idx
+            if len(self._keys) > len(self.level):
+                self._grow(max(len(self._keys), len(self.level) * 2))
+        return out
+
+    def update(self, indices, values, timestamp=None):
+        """
+        向量化更新一批序列（同一批内每条序列至多出现一次）
+
+        Args:
+            indices: series_indices() 返回的下标数组
+            values: 对应的观测值
+            timestamp: Unix 秒，决定季节槽
+        Returns:
+            (异常样本在本批中的位置, 基线, z-score)
+        """
+        ts = time.time() if timestamp is None else timestamp
+        slot = int((ts % 86400) // self.slot_seconds)
+        x = np.asarray(values, dtype=float)
+
+        with self._lock:
+            level = self.level[indices]
+            mad = self.mad[indices]
+            count = self.count[indices]
+            seasonal = self.season[indices, slot]
+
+            fresh = count == 0
+            level = np.where(fresh, x, level)
+            baseline = level + seasonal
+            resid = x - baseline
+            scale = np.maximum(MAD_TO_SIGMA * mad, self.min_scale)
+            z = resid / scale
+
+            warmed = count >= self.warmup
+            anomalous = warmed & (np.abs(z) > self.threshold)
+
+            # 预热结束后用截断残差更新，避免异常点污染基线
+            limit = np.where(warmed, self.threshold * scale, np.inf)
+            clipped = np.clip(resid, -limit, limit)
+            new_level = level + self.alpha * clipped
+            self.level[indices] = new_level
+            self.mad[indices] = (1 - self.alpha) * mad + self.alpha * np.abs(clipped)
+            self.season[indices, slot] = seasonal + self.season_alpha * (baseline + clipped - new_level - seasonal)
+            self.count[indices] = count + 1
+
+        positions = np.nonzero(anomalous)[0]
+        return positions, baseline[positions], z[positions]
+
+    def observe(self, host, rows, timestamp=None):
+        """
+        检测一批 {指标: 值} 并持久化异常
+
+        Args:
+            host: 主机标识
+            rows: {metric: value}
+        Returns:
+            检测到的异常列表
+        """
+        keys = [(host, m) for m, v in rows.items() if v is not None]
+        if not keys:
+            return []
+        values = [rows[m] for _, m in keys]
+        indices = self.series_indices(keys)
+        positions, baselines, scores = self.update(indices, values, timestamp)
+        anomalies = []
+        when = datetime.fromtimestamp(timestamp or time.time()).strftime('%Y-%m-%d %H:%M:%S')
+        for pos, baseline, score in zip(positions, baselines, scores):
+            host_name, metric = keys[pos]
+            anomalies.append((when, host_name, metric, float(values[pos]),
+                              round(float(baseline), 3), round(float(score), 2)))
+        if anomalies and self.persist:
+            self._persist(anomalies)
+        return anomalies
+
+    def observe_rows(self, host, rows):
+        """
+        检测远程主机上报的一批样本（MetricIngest 写库后调用）
+
+        Args:
+            rows: [(cpu, memory, disk, network, ts)]，按 ts 排序后逐个时间点更新；
+                不晚于该主机已检测样本的 ts 视为补传 / 重传，跳过以免重复计入基线
+        Returns:
+            检测到的异常列表
+        """
+        with self._lock:
+            host_lock = self._host_locks.setdefault(host, threading.Lock())
+        anomalies = []
+        # 同一主机的并发批次串行处理：检查 ts 与更新基线在同一把锁内，重叠的样本不会被计入两次
+        with host_lock:
+            last = self._last_ts.get(host, float('-inf'))
+            try:
+                for row in sorted(rows, key=lambda r: r[4]):
+                    ts = row[4]
+                    if ts <= last:
+                        continue
+                    last = ts
+                    anomalies += self.observe(host, dict(zip(METRIC_COLUMNS, row[:4])), timestamp=ts)
+            finally:
+                # 中途失败（如写异常表出错）时已计入基线的样本同样不再重复计入
+                self._last_ts[host] = last
+        return anomalies
+
+    def observe_snapshot(self, snapshot):
+        """采样器回调：检测本机 cpu/memory/disk/network"""
+        if "error" in snapshot:
+            return
+        self.observe(self.host, dict(zip(METRIC_COLUMNS, snapshot_to_row(snapshot))))
+
+    def _persist(self, anomalies):
+        with transaction(self.db_path) as conn:
+            conn.executemany('''INSERT INTO anomalies (timestamp, host, metric, value, baseline, score)
+                VALUES (?, ?, ?, ?, ?, ?)''', anomalies)
+
+    def iter_anomalies(self, limit=100, after_id=None, host=None, metric=None):
+        """
+        按 id 倒序逐行产出异常记录（兼容旧接口字段 prediction / real_value / is_anomaly）
+
+        Args:
+            after_id: 键集分页游标（上一页最后一条的 id）
+        """
+        c = get_connection(self.db_path).execute(*anomalies_query(limit, after_id, host, metric))
+        for row in c:
+            r = dict(row)
+            r["prediction"] = r["baseline"]
+            r["real_value"] = r["value"]
+            r["is_anomaly"] = 1
+            yield r
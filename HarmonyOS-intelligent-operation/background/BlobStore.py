@@ -0,0 +1,179 @@
+"""
+内容寻址的脚本存储
+市场脚本正文（nft_products / user_methods 的 script_content）按 sha256 存入 blobs 表，压缩保存
+（安装了 zstandard 时为 zstd，否则 zlib；压缩无收益的短内容保存原文），业务行只保留 script_hash。相同内容只存一份，
+refcount 记录引用的行数，降为 0 时删除。读取时分块解压，支持按字节范围下载
+"""
+import io
+import os
+import zlib
+import hashlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 压缩算法：auto（有 zstandard 用 zstd，否则 zlib）/ zlib / zstd
+CODEC = os.environ.get('MONITOR_BLOB_CODEC', 'auto')
+# 流式下载时每次输出的解压字节数
+CHUNK_SIZE = 64 * 1024
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS blobs (
+        hash TEXT PRIMARY KEY,
+        codec TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        stored_size INTEGER NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        data BLOB NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )''',
+]
+
+# 引用脚本的表：(表名, 正文列, 哈希列)
+SCRIPT_TABLES = (('nft_products', 'script_content', 'script_hash'),
+                 ('user_methods', 'script_content', 'script_hash'))
+
+
+def resolve_codec(codec=None):
+    codec = codec or CODEC
+    if codec == 'auto':
+        return 'zstd' if zstandard is not None else 'zlib'
+    if codec == 'zstd' and zstandard is None:
+        raise ValueError("MONITOR_BLOB_CODEC=zstd 需要安装 zstandard")
+    if codec not in ('zlib', 'zstd'):
+        raise ValueError(f"不支持的压缩算法: {codec}")
+    return codec
+
+
+def _compress(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 9)
+
+
+def _iter_decompressed(codec, data, chunk_size=CHUNK_SIZE):
+    """分块解压，每块不超过 chunk_size 字节（不在内存中展开完整内容）"""
+    if codec == 'raw':
+        for i in range(0, len(data), chunk_size):
+            yield bytes(data[i:i + chunk_size])
+        return
+    if codec == 'zstd':
+        yield from zstandard.ZstdDecompressor().read_to_iter(io.BytesIO(data), write_size=chunk_size)
+        return
+    d = zlib.decompressobj()
+    while data:
+        out = d.decompress(data, chunk_size)
+        if out:
+            yield out
+        data = d.unconsumed_tail
+    tail = d.flush()
+    if tail:
+        yield tail
+
+
+def ensure_schema(conn):
+    """创建 blobs 表并为引用脚本的表增加 script_hash 列（幂等）"""
+    for statement in SCHEMA:
+        conn.execute(statement)
+    for table, _, hash_column in SCRIPT_TABLES:
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if columns and hash_column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {hash_column} TEXT")
+
+
+def put(conn, content, codec=None):
+    """
+    写入内容并增加一次引用（在调用方的事务中执行）
+
+    Returns:
+        sha256 十六进制摘要；内容为空时返回 None
+    """
+    if not content:
+        return None
+    data = content.encode('utf-8') if isinstance(content, str) else bytes(content)
+    digest = hashlib.sha256(data).hexdigest()
+    c = conn.execute('UPDATE blobs SET refcount = refcount + 1 WHERE hash = ?', (digest,))
+    if c.rowcount == 0:
+        codec = resolve_codec(codec)
+        stored = _compress(codec, data)
+        if len(stored) >= len(data):
+            # 很短的脚本压缩后反而更大，按原文保存
+            codec, stored = 'raw', data
+        conn.execute('INSERT INTO blobs (hash, codec, size, stored_size, refcount, data) VALUES (?, ?, ?, ?, 1, ?)',
+                     (digest, codec, len(data), len(stored), stored))
+    return digest
+
+
+def release(conn, digest):
+    """减少一次引用，降为 0 时删除内容"""
+    if not digest:
+        return
+    conn.execute('UPDATE blobs SET refcount = refcount - 1 WHERE hash = ?', (digest,))
+    conn.execute('DELETE FROM blobs WHERE hash = ? AND refcount <= 0', (digest,))
+
+
+def stat(conn, digest):
+    """内容元数据 {hash, codec, size, stored_size, refcount}，不存在时返回 None"""
+    row = conn.execute('SELECT hash, codec, size, stored_size, refcount FROM blobs WHERE hash = ?',
+                       (digest,)).fetchone()
+    return dict(row) if row else None
+
+
+def read_text(conn, digest):
+    """读取完整内容（UTF-8 文本），不存在时返回 None"""
+    if not digest:
+        return None
+    row = conn.execute('SELECT codec, data FROM blobs WHERE hash = ?', (digest,)).fetchone()
+    if row is None:
+        return None
+    return b''.join(_iter_decompressed(row[0], row[1])).decode('utf-8')
+
+
+def open_range(conn, digest, start=0, stop=None, chunk_size=CHUNK_SIZE):
+    """
+    按字节范围 [start, stop) 读取内容
+
+    只在调用时查询一次数据库（压缩后的数据很小），返回的迭代器在解压过程中按块产出，
+    可在请求上下文之外（流式响应）消费
+
+    Returns:
+        (元数据 dict, 字节块迭代器)；不存在时返回 (None, None)
+    """
+    row = conn.execute('SELECT hash, codec, size, stored_size, refcount, data FROM blobs WHERE hash = ?',
+                       (digest,)).fetchone()
+    if row is None:
+        return None, None
+    meta = {key: row[key] for key in ('hash', 'codec', 'size', 'stored_size', 'refcount')}
+    stop = meta['size'] if stop is None else min(stop, meta['size'])
+
+    def chunks():
+        offset = 0
+        for chunk in _iter_decompressed(row['codec'], row['data'], chunk_size):
+            end = offset + len(chunk)
+            if end > start and offset < stop:
+                yield chunk[max(0, start - offset):min(len(chunk), stop - offset)]
+            offset = end
+            if offset >= stop:
+                return
+
+    return meta, chunks()
+
+
+def move_inline_scripts(conn, batch_size=500):
+    """迁移步骤：把行内的 script_content 移入 blobs，行中只保留 script_hash"""
+    ensure_schema(conn)
+    for table, content_column, hash_column in SCRIPT_TABLES:
+        last_id = 0
+        while True:
+            rows = conn.execute(f'''SELECT id, {content_column} FROM {table}
+                WHERE id > ? AND {content_column} IS NOT NULL ORDER BY id LIMIT ?''',
+                                (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            for row_id, content in rows:
+                digest = put(conn, content)
+                conn.execute(f'UPDATE {table} SET {hash_column} = COALESCE(?, {hash_column}), {content_column} = NULL '
+                             f'WHERE id = ?', (digest, row_id))
+            last_id = rows[-1][0]
@@ -0,0 +1,124 @@
+"""
+NFT 商品目录内存索引
+上架商品的列表投影（不含 script_content）常驻内存，按 (分类, 排序) 维护有序键列表，
+/api/nft/products 分页直接在内存中二分定位，不再访问数据库；商品详情仍从数据库读取完整内容。
+索引首次使用时从数据库构建一次，之后由 NFTMarket 在商品变更、购买次数刷新时增量更新
+"""
+import time
+import bisect
+import threading
+
+# 列表接口返回的列（不含体积较大的 script_content）
+LIST_COLUMNS = ('id', 'product_id', 'title', 'description', 'price', 'category', 'seller_id', 'seller_name',
+                'created_at', 'status', 'purchase_count', 'rating', 'image_url', 'os_support')
+
+# 排序方式 -> 排序键（升序存储，倒序输出；created_at、id 作为并列时的次序）
+SORTS = {
+    'newest': lambda p: (p['created_at'] or '', p['id']),
+    'rating': lambda p: (p['rating'] or 0, p['created_at'] or '', p['id']),
+    'purchase_count': lambda p: (p['purchase_count'] or 0, p['created_at'] or '', p['id']),
+}
+
+
+class CatalogIndex:
+    """上架商品列表索引（线程安全）"""
+
+    def __init__(self, loader, rebuild_interval=60):
+        """
+        Args:
+            loader: 无参函数，返回全部上架商品的列表投影（dict 可迭代）
+            rebuild_interval: 定期全量重建的间隔（秒），用于同步其他进程写入的变更；0 表示只构建一次
+        """
+        self._loader = loader
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._products = None
+        self._by_id = {}
+        self._keys = {}
+        self._built_at = 0.0
+
+    def invalidate(self):
+        """丢弃索引，下次访问时重建"""
+        with self._lock:
+            self._products = None
+
+    def page(self, category=None, sort='newest', limit=50, after_id=None):
+        """
+        按排序倒序返回一页商品（dict 副本）
+
+        Args:
+            after_id: 键集分页游标（上一页最后一条的 id），不存在时返回空页
+        """
+        if sort not in SORTS:
+            raise ValueError(f"不支持的排序方式: {sort}")
+        # 空字符串与 None 一样表示不按分类筛选
+        category = category or None
+        with self._lock:
+            self._ensure_built()
+            keys = self._keys.get((category, sort), [])
+            end = len(keys)
+            if after_id is not None:
+                product = self._products.get(self._by_id.get(after_id))
+                if product is None or (category and product['category'] != category):
+                    return []
+                end = bisect.bisect_left(keys, SORTS[sort](product))
+            return [dict(self._products[self._by_id[key[-1]]]) for key in reversed(keys[max(0, end - limit):end])]
+
+    def upsert(self, product):
+        """新增或更新一个商品（非上架状态时从索引中移除）"""
+        with self._lock:
+            if self._products is None:
+                return
+            self._remove(product['product_id'])
+            if product.get('status', 'active') == 'active':
+                self._add({column: product.get(column) for column in LIST_COLUMNS})
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._products is not None:
+                self._remove(product_id)
+
+    def set_purchase_counts(self, counts):
+        """购买次数刷新后更新索引（counts: {product_id: 最新购买次数}）"""
+        with self._lock:
+            if self._products is None:
+                return
+            for product_id, purchase_count in counts.items():
+                product = self._products.get(product_id)
+                if product is None or product['purchase_count'] == purchase_count:
+                    continue
+                self._remove(product_id)
+                product = dict(product, purchase_count=purchase_count)
+                self._add(product)
+
+    def _ensure_built(self):
+        if self._products is not None and not (
+                self.rebuild_interval and time.monotonic() - self._built_at >= self.rebuild_interval):
+            return
+        self._products = {}
+        self._by_id = {}
+        self._keys = {}
+        for product in self._loader():
+            self._add(dict(product))
+        self._built_at = time.monotonic()
+
+    def _add(self, product):
+        self._products[product['product_id']] = product
+        self._by_id[product['id']] = product['product_id']
+        for sort, key_fn in SORTS.items():
+            key = key_fn(product)
+            for category in {None, product['category']}:
+                bisect.insort(self._keys.setdefault((category, sort), []), key)
+
+    def _remove(self, product_id):
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return
+        self._by_id.pop(product['id'], None)
+        for sort, key_fn in SORTS.items():
+            key = key_fn(product)
+            for category in {None, product['category']}:
+                keys = self._keys.get((category, sort), [])
+                i = bisect.bisect_left(keys, key)
+                if i < len(keys) and keys[i] == key:
+                    del keys[i]
@@ -0,0 +1,113 @@
+"""
+共享SQLite访问层
+为 GetRequest / ErrorLogger / NFTMarket / NFTReportGenerator 提供按线程复用的持久连接，
+统一开启 WAL、synchronous=NORMAL、busy_timeout 与预编译语句缓存，避免 "database is locked"
+"""
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from Instrumentation import SQL_LATENCY, sql_operation
+from Profiler import add_span
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), 'monitor.db')
+
+# 等待写锁的最长时间（毫秒）
+BUSY_TIMEOUT_MS = int(os.environ.get('MONITOR_DB_BUSY_TIMEOUT', 5000))
+# 每个连接缓存的预编译语句数量
+STATEMENT_CACHE_SIZE = int(os.environ.get('MONITOR_DB_STATEMENT_CACHE', 256))
+# MONITOR_DB_POOL=0 时退回旧行为：每次调用新建连接（仅用于基准对比）
+POOL_ENABLED = os.environ.get('MONITOR_DB_POOL', '1') != '0'
+
+_local = threading.local()
+
+
+class TimedCursor(sqlite3.Cursor):
+    """记录 execute / executemany 耗时（按语句类型计入 SQL_LATENCY，并作为请求剖析的 sql 分段）的游标"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            SQL_LATENCY.observe(elapsed, (sql_operation(sql),))
+            add_span("sql", sql, started, elapsed)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            SQL_LATENCY.observe(elapsed, (sql_operation(sql),))
+            add_span("sql", sql, started, elapsed)
+
+
+class PooledConnection(sqlite3.Connection):
+    """连接池中的持久连接：游标与 conn.execute 快捷方法都经过 TimedCursor 计时"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(
+        db_path,
+        timeout=BUSY_TIMEOUT_MS / 1000.0,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=PooledConnection
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    return conn
+
+
+def get_connection(db_path=None):
+    """
+    获取当前线程对 db_path 的持久连接
+
+    连接由本模块管理，调用方不要 close()；写操作请使用 transaction()
+    """
+    db_path = db_path or DEFAULT_DB_PATH
+    if not POOL_ENABLED:
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connections[db_path] = _connect(db_path)
+    return conn
+
+
+@contextmanager
+def transaction(db_path=None):
+    """写事务：正常退出时提交，异常时回滚，保证连接不会遗留未结束的事务"""
+    conn = get_connection(db_path)
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def close_thread_connections():
+    """关闭当前线程持有的所有连接"""
+    connections = getattr(_local, 'connections', None) or {}
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
@@ -0,0 +1,154 @@
+"""
+错误指纹与去重
+把消息中的数字、地址、UUID 等易变部分替换为占位符，堆栈只保留“文件名:函数名”，
+与级别、模块、操作系统一起哈希成稳定的指纹。error_signatures 每个指纹一行，累计
+first_seen / last_seen / count；error_signature_hours 按小时累计次数（用于“最近24小时”统计）。
+error_logs 只保存抽样的原始记录（ErrorLogger 的抽样策略），并通过 fingerprint 列关联到签名
+"""
+import re
+import hashlib
+from collections import Counter
+
+# 消息模板最大长度
+TEMPLATE_LIMIT = 500
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS error_signatures (
+        fingerprint TEXT PRIMARY KEY,
+        level TEXT NOT NULL,
+        module TEXT,
+        os_type TEXT,
+        message_template TEXT NOT NULL,
+        sample_message TEXT,
+        first_seen TEXT NOT NULL,
+        last_seen TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        unresolved_count INTEGER NOT NULL DEFAULT 0,
+        auto_fixed_count INTEGER NOT NULL DEFAULT 0,
+        stored_count INTEGER NOT NULL DEFAULT 0,
+        last_stored_at TEXT,
+        last_log_id INTEGER
+    )''',
+    "CREATE INDEX IF NOT EXISTS idx_error_signatures_last_seen ON error_signatures(last_seen)",
+    "CREATE INDEX IF NOT EXISTS idx_error_signatures_count ON error_signatures(count)",
+    '''CREATE TABLE IF NOT EXISTS error_signature_hours (
+        fingerprint TEXT NOT NULL,
+        hour TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (fingerprint, hour)
+    ) WITHOUT ROWID''',
+    "CREATE INDEX IF NOT EXISTS idx_error_signature_hours_hour ON error_signature_hours(hour)",
+]
+
+_UPSERT_SIGNATURE = '''INSERT INTO error_signatures
+    (fingerprint, level, module, os_type, message_template, sample_message, first_seen, last_seen,
+     count, unresolved_count, auto_fixed_count, stored_count, last_stored_at, last_log_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(fingerprint) DO UPDATE SET
+        first_seen = MIN(first_seen, excluded.first_seen),
+        last_seen = MAX(last_seen, excluded.last_seen),
+        count = count + excluded.count,
+        unresolved_count = unresolved_count + excluded.unresolved_count,
+        auto_fixed_count = auto_fixed_count + excluded.auto_fixed_count,
+        stored_count = stored_count + excluded.stored_count,
+        last_stored_at = COALESCE(MAX(last_stored_at, excluded.last_stored_at), last_stored_at, excluded.last_stored_at),
+        last_log_id = COALESCE(excluded.last_log_id, last_log_id)'''
+
+_UPSERT_HOUR = '''INSERT INTO error_signature_hours (fingerprint, hour, count) VALUES (?, ?, ?)
+    ON CONFLICT(fingerprint, hour) DO UPDATE SET count = count + excluded.count'''
+
+_NORMALIZERS = [
+    (re.compile(r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b'), '<uuid>'),
+    (re.compile(r'\b0x[0-9a-fA-F]+\b'), '<addr>'),
+    (re.compile(r'\b(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{16,}\b'), '<hex>'),
+    (re.compile(r'\d+(?:\.\d+)*'), '<n>'),
+    (re.compile(r'\s+'), ' '),
+]
+_FRAME = re.compile(r'^\s*File "([^"]+)", line \d+, in (.+)$', re.MULTILINE)
+_PATH_SEP = re.compile(r'[\\/]')
+
+
+def normalize_message(message):
+    """消息模板：数字、内存地址、UUID、长十六进制 ID 替换为占位符"""
+    text = message or ''
+    for pattern, repl in _NORMALIZERS:
+        text = pattern.sub(repl, text)
+    return text.strip()[:TEMPLATE_LIMIT]
+
+
+def fingerprint(level, module, message, traceback_text='', os_type=''):
+    """
+    计算错误指纹
+
+    Returns:
+        (指纹, 消息模板)；堆栈中的行号和路径前缀不参与计算，同一代码位置的同类异常得到同一指纹
+    """
+    template = normalize_message(message)
+    parts = [level or '', module or '', os_type or '', template]
+    if traceback_text:
+        parts.extend(f"{_PATH_SEP.split(path)[-1]}:{func.strip()}" for path, func in _FRAME.findall(traceback_text))
+        lines = [line for line in traceback_text.strip().splitlines() if line.strip()]
+        if lines:
+            # 末行为 "异常类型: 消息"，只取类型（消息已在模板中）
+            parts.append(lines[-1].split(':', 1)[0].strip())
+    digest = hashlib.sha1('\n'.join(parts).encode('utf-8', errors='replace')).hexdigest()[:16]
+    return digest, template
+
+
+def ensure_schema(conn):
+    """创建签名表并为 error_logs 增加 fingerprint 列（幂等）"""
+    for statement in SCHEMA:
+        conn.execute(statement)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(error_logs)")}
+    if 'fingerprint' not in columns:
+        conn.execute("ALTER TABLE error_logs ADD COLUMN fingerprint TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_error_logs_fingerprint ON error_logs(fingerprint, id)")
+
+
+def record_occurrences(conn, occurrences):
+    """
+    把一批错误发生记录累计到 error_signatures / error_signature_hours（同一指纹合并为一次 upsert）
+
+    Args:
+        occurrences: [(指纹, 模板, timestamp, level, module, message, os_type, resolved, auto_fixed, log_id)]，
+                     log_id 为保存的原始记录 id，未保存时为 None
+    """
+    signatures = {}
+    hours = Counter()
+    for fp, template, ts, level, module, message, os_type, resolved, auto_fixed, log_id in occurrences:
+        s = signatures.get(fp)
+        if s is None:
+            s = signatures[fp] = [fp, level, module, os_type, template, message, ts, ts, 0, 0, 0, 0, None, None]
+        s[6] = min(s[6], ts)
+        s[7] = max(s[7], ts)
+        s[8] += 1
+        s[9] += 0 if resolved else 1
+        s[10] += 1 if auto_fixed else 0
+        if log_id is not None:
+            s[11] += 1
+            s[12] = max(s[12] or ts, ts)
+            s[13] = log_id
+        hours[(fp, ts[:13])] += 1
+    conn.executemany(_UPSERT_SIGNATURE, list(signatures.values()))
+    conn.executemany(_UPSERT_HOUR, [(fp, hour, n) for (fp, hour), n in hours.items()])
+
+
+def backfill(conn, batch_size=5000):
+    """迁移步骤：为尚无指纹的历史记录计算指纹并累计到签名表（历史原始记录全部保留）"""
+    ensure_schema(conn)
+    last_id = 0
+    while True:
+        rows = conn.execute('''SELECT id, timestamp, level, module, message, traceback, os_type, resolved, auto_fixed
+            FROM error_logs WHERE fingerprint IS NULL AND id > ? ORDER BY id LIMIT ?''',
+                            (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        occurrences = []
+        updates = []
+        for log_id, ts, level, module, message, tb, os_type, resolved, auto_fixed in rows:
+            fp, template = fingerprint(level, module, message, tb, os_type)
+            updates.append((fp, log_id))
+            occurrences.append((fp, template, ts, level, module, message, os_type, resolved, auto_fixed, log_id))
+        conn.executemany("UPDATE error_logs SET fingerprint = ? WHERE id = ?", updates)
+        record_occurrences(conn, occurrences)
+        last_id = rows[-1][0]
@@ -3,46 +3,148 @@
 实现轻量化部署和自主运维的错误日志收集
 """
 import os
+import sys
 import json
-import sqlite3
+import queue
+import atexit
 import platform
+import threading
+import time
 import traceback
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
+from Database import get_connection, transaction
+from Instrumentation import ERRORS
+from LogArchive import LogArchiver, MAX_BYTES
+from ErrorFingerprint import fingerprint, ensure_schema, record_occurrences
+
+# 列表接口默认返回的列（不含体积较大的 system_info）
+_ERROR_LOG_COLUMNS = 'id, timestamp, level, module, message, traceback, os_type, resolved, auto_fixed, created_at, fingerprint'
+
+
+def fts_query(text):
+    """把用户输入的关键词转换为 FTS5 查询：每个词加引号（屏蔽 FTS 语法），词尾的 * 保留为前缀匹配，多个词为 AND"""
+    terms = []
+    for term in (text or '').split():
+        prefix = term.endswith('*')
+        term = term.rstrip('*')
+        if term:
+            terms.append('"' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+    if not terms:
+        raise ValueError("缺少检索关键词")
+    return ' '.join(terms)
+
+_INSERT_ERROR_LOG = '''INSERT INTO error_logs 
+    (timestamp, level, module, message, traceback, system_info, os_type, auto_fixed, fingerprint)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+
+# 以下语句与查询构造函数同时供 Migrations.hot_queries() 检查执行计划
+RESOLVE_BY_FINGERPRINT = 'UPDATE error_logs SET resolved = 1 WHERE fingerprint = ? AND resolved = 0'
+RESOLVE_BY_ID = 'UPDATE error_logs SET resolved = 1 WHERE id = ?'
+ERRORS_SINCE_HOUR = 'SELECT COALESCE(SUM(count), 0) FROM error_signature_hours WHERE hour > ?'
+
+
+def error_logs_query(limit, unresolved_only=False, after_id=None, include_system_info=False):
+    """错误日志列表查询（按时间倒序，after_id 为键集分页游标），返回 (sql, params)"""
+    columns = _ERROR_LOG_COLUMNS + (', system_info' if include_system_info else '')
+    conditions = []
+    params = []
+    if unresolved_only:
+        conditions.append('resolved = 0')
+    if after_id is not None:
+        conditions.append('(timestamp, id) < (SELECT timestamp, id FROM error_logs WHERE id = ?)')
+        params.append(after_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    params.append(limit)
+    return f'''SELECT {columns} FROM error_logs 
+        {where}
+        ORDER BY timestamp DESC, id DESC LIMIT ?''', params
+
+
+def error_signatures_query(limit, sort='count', unresolved_only=False):
+    """错误签名列表查询（sort: count / recent），返回 (sql, params)"""
+    order = 'last_seen DESC' if sort == 'recent' else 'count DESC'
+    where = 'WHERE unresolved_count > 0 ' if unresolved_only else ''
+    return f'SELECT * FROM error_signatures {where}ORDER BY {order} LIMIT ?', (limit,)
 
 class ErrorLogger:
-    """跨平台错误日志收集器"""
+    """跨平台错误日志收集器（后台线程批量写入数据库与日志文件）"""
+    
+    # 单批最多合并写入的日志条数
+    BATCH_SIZE = 256
+    # 队列上限，错误风暴时超出部分直接丢弃并计数，避免内存无限增长
+    QUEUE_SIZE = 10000
+    # 全文检索按相关度排序时参与 bm25 计算的最近命中条数
+    SEARCH_RANK_WINDOW = 2000
+    # 时间范围换算 rowid 上下界时最多扫描的索引条目数
+    SEARCH_BOUNDS_SCAN = 50000
+    # 原始记录抽样：每个指纹保存前 SAMPLE_FIRST 次，此后每 SAMPLE_INTERVAL 秒最多保存一次（计数始终准确）
+    SAMPLE_FIRST = 5
+    SAMPLE_INTERVAL = 60
+    # 抽样状态缓存的指纹数上限，超出时清空（按需从 error_signatures 重新加载）
+    SAMPLE_STATE_LIMIT = 10000
     
     def __init__(self, db_path=None, log_dir=None):
         self.system = platform.system().lower()  # windows, linux, darwin
         self.db_path = db_path or os.path.join(os.path.dirname(__file__), 'monitor.db')
-        self.log_dir = log_dir or os.path.join(os.path.dirname(__file__), 'logs')
+        self.log_dir = log_dir or os.environ.get('MONITOR_LOG_DIR') or os.path.join(os.path.dirname(__file__), 'logs')
         
         # 确保日志目录存在（跨平台）
         Path(self.log_dir).mkdir(parents=True, exist_ok=True)
         
+        # 日志文件超过 MAX_BYTES 或跨天时轮转到 logs/archive/ 并在后台分块压缩；启动时处理历史遗留文件
+        self.archiver = LogArchiver(self.log_dir)
+        self.archiver.sweep()
+        
         # 初始化数据库表
         self._init_error_log_table()
+        
+        # 静态系统信息只在启动时采集一次
+        self._system_info = self._get_system_info()
+        self._system_info_json = json.dumps(self._system_info)
+        self._system_info_text = json.dumps(self._system_info, indent=2)
+        
+        # 异步写入：队列 + 写线程（首次记录时启动），按天持有一个缓冲文件句柄
+        self._queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._log_file = None
+        self._log_file_day = None
+        self.dropped = 0
+        # 指纹 -> [已保存条数, 最近保存时间(epoch)]，只在写线程中访问
+        self._sample_state = {}
+        # 数据变更回调（如响应缓存失效），在写入提交后调用
+        self._listeners = []
+        atexit.register(self.close)
+    
+    def add_listener(self, callback):
+        """注册数据变更回调：error_logs 有新增或修改并提交后以 callback() 调用"""
+        self._listeners.append(callback)
+    
+    def _notify(self):
+        for callback in list(self._listeners):
+            try:
+                callback()
+            except Exception:
+                pass
     
     def _init_error_log_table(self):
         """初始化错误日志表"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS error_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            level TEXT NOT NULL,
-            module TEXT,
-            message TEXT NOT NULL,
-            traceback TEXT,
-            system_info TEXT,
-            os_type TEXT,
-            resolved INTEGER DEFAULT 0,
-            auto_fixed INTEGER DEFAULT 0,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )''')
-        conn.commit()
-        conn.close()
+        with transaction(self.db_path) as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS error_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                level TEXT NOT NULL,
+                module TEXT,
+                message TEXT NOT NULL,
+                traceback TEXT,
+                system_info TEXT,
+                os_type TEXT,
+                resolved INTEGER DEFAULT 0,
+                auto_fixed INTEGER DEFAULT 0,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )''')
+            ensure_schema(conn)
     
     def _get_system_info(self):
         """获取系统信息（跨平台）"""
@@ -66,7 +168,7 @@ class ErrorLogger:
     
     def log_error(self, level="ERROR", module="", message="", exception=None, auto_fix_attempted=False):
         """
-        记录错误日志
+        记录错误日志（异步：放入队列后立即返回，由写线程批量落库和写文件）
         
         Args:
             level: 日志级别 (ERROR, WARNING, CRITICAL)
@@ -74,114 +176,340 @@ class ErrorLogger:
             message: 错误消息
             exception: 异常对象
             auto_fix_attempted: 是否尝试了自动修复
+        Returns:
+            是否成功放入写入队列
         """
+        ERRORS.inc((level, module or 'unknown'))
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         tb_text = ""
         if exception:
-            tb_text = traceback.format_exc()
-        
-        system_info = self._get_system_info()
-        
-        # 写入数据库
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''INSERT INTO error_logs 
-            (timestamp, level, module, message, traceback, system_info, os_type, auto_fixed)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-            (timestamp, level, module, message, tb_text, 
-             json.dumps(system_info), self.system, 1 if auto_fix_attempted else 0))
-        conn.commit()
-        log_id = c.lastrowid
-        conn.close()
-        
-        # 同时写入文件（便于直接查看）
-        log_file = os.path.join(self.log_dir, f"error_{datetime.now().strftime('%Y%m%d')}.log")
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(f"[{timestamp}] [{level}] [{module}] {message}\n")
-            if tb_text:
-                f.write(f"{tb_text}\n")
-            f.write(f"System: {json.dumps(system_info, indent=2)}\n")
-            f.write("-" * 80 + "\n")
-        
-        return log_id
-    
-    def get_error_logs(self, limit=100, unresolved_only=False):
-        """获取错误日志列表"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        
-        if unresolved_only:
-            c.execute('''SELECT * FROM error_logs 
-                WHERE resolved = 0 
-                ORDER BY timestamp DESC LIMIT ?''', (limit,))
-        else:
-            c.execute('''SELECT * FROM error_logs 
-                ORDER BY timestamp DESC LIMIT ?''', (limit,))
+            # 堆栈必须在调用线程中格式化
+            if exception.__traceback__ is not None:
+                tb_text = "".join(traceback.format_exception(type(exception), exception, exception.__traceback__))
+            else:
+                tb_text = traceback.format_exc()
         
-        rows = c.fetchall()
-        conn.close()
+        record = (timestamp, level, module, message, tb_text,
+                  self._system_info_json, self.system, 1 if auto_fix_attempted else 0)
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+    
+    def _ensure_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._writer_loop, name="error-log-writer", daemon=True)
+                self._writer.start()
+    
+    def _writer_loop(self):
+        """写线程：阻塞取第一条，再尽量合并队列中已有的记录，一次事务提交"""
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            records = [x for x in batch if isinstance(x, tuple)]
+            if records:
+                try:
+                    self._write_batch(records)
+                except Exception:
+                    traceback.print_exc(file=sys.stderr)
+            
+            stop = False
+            for x in batch:
+                if isinstance(x, threading.Event):
+                    x.set()
+                elif x is None:
+                    stop = True
+                self._queue.task_done()
+            if stop:
+                self._close_log_file()
+                return
+    
+    def _write_batch(self, records):
+        # 写入数据库（group commit）：每条记录累计到其签名，只有抽中的记录保存原始行
+        now = time.time()
+        stored = []
+        occurrences = []
+        try:
+            with transaction(self.db_path) as conn:
+                for record in records:
+                    timestamp, level, module, message, tb_text, _, os_type, auto_fixed = record
+                    fp, template = fingerprint(level, module, message, tb_text, os_type)
+                    log_id = None
+                    if self._sample(conn, fp, now):
+                        log_id = conn.execute(_INSERT_ERROR_LOG, record + (fp,)).lastrowid
+                        stored.append(record)
+                    occurrences.append((fp, template, timestamp, level, module, message, os_type, 0, auto_fixed, log_id))
+                record_occurrences(conn, occurrences)
+        except Exception:
+            # 事务回滚后内存中的抽样状态可能超前于数据库，丢弃后重新加载
+            self._sample_state.clear()
+            raise
+        self._notify()
+        if not stored:
+            return
         
-        result = []
-        for row in rows:
+        # 同时写入文件（便于直接查看）；系统信息是静态的，只在每个文件开头写一次。
+        # 持共享锁写入：其他进程轮转（排他锁）期间不会写入正被移走的文件
+        if self._log_file is not None and self._log_file_day != datetime.now().strftime('%Y%m%d'):
+            self._rotate_log_file()
+        with self.archiver.lock(shared=True):
+            f = self._get_log_file()
+            for timestamp, level, module, message, tb_text, _, _, _ in stored:
+                f.write(f"[{timestamp}] [{level}] [{module}] {message}\n")
+                if tb_text:
+                    f.write(f"{tb_text}\n")
+                f.write("-" * 80 + "\n")
+            f.flush()
+            # 文件由多个进程追加，按实际大小判断
+            full = os.fstat(f.fileno()).st_size >= MAX_BYTES
+        if full:
+            self._rotate_log_file(min_bytes=MAX_BYTES)
+    
+    def _sample(self, conn, fp, now):
+        """抽样判断：该指纹本次是否保存原始记录"""
+        state = self._sample_state.get(fp)
+        if state is None:
+            if len(self._sample_state) >= self.SAMPLE_STATE_LIMIT:
+                self._sample_state.clear()
+            row = conn.execute('SELECT stored_count, last_stored_at FROM error_signatures WHERE fingerprint = ?',
+                               (fp,)).fetchone()
+            state = [0, 0.0]
+            if row:
+                state[0] = row[0]
+                if row[1]:
+                    state[1] = datetime.strptime(row[1], '%Y-%m-%d %H:%M:%S').timestamp()
+            self._sample_state[fp] = state
+        if state[0] < self.SAMPLE_FIRST or now - state[1] >= self.SAMPLE_INTERVAL:
+            state[0] += 1
+            state[1] = now
+            return True
+        return False
+    
+    def _get_log_file(self):
+        """返回当天日志文件句柄；文件已被其他进程轮转时重新打开（调用方持有共享锁，跨天轮转在加锁前完成）"""
+        day = datetime.now().strftime('%Y%m%d')
+        if self._log_file is not None:
+            try:
+                moved = os.stat(self._log_file.name).st_ino != os.fstat(self._log_file.fileno()).st_ino
+            except FileNotFoundError:
+                moved = True
+            if moved:
+                self._close_log_file()
+        if self._log_file is None:
+            log_file = os.path.join(self.log_dir, f"error_{day}.log")
+            self._log_file = open(log_file, 'a', encoding='utf-8', buffering=64 * 1024)
+            self._log_file_day = day
+            if self._log_file.tell() == 0:
+                self._log_file.write(f"System: {self._system_info_text}\n")
+                self._log_file.write("-" * 80 + "\n")
+        return self._log_file
+    
+    def _rotate_log_file(self, min_bytes=0):
+        """关闭当前文件并交给归档器（移入 archive/ 后后台压缩）；其他进程已轮转时不重复处理"""
+        path = self._log_file.name
+        self._close_log_file()
+        self.archiver.rotate(path, min_bytes)
+    
+    def _close_log_file(self):
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+            self._log_file_day = None
+    
+    def flush(self, timeout=5.0):
+        """等待队列中已有的日志全部写入，返回是否在超时前完成"""
+        if self._writer is None or not self._writer.is_alive():
+            return self._queue.empty()
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+    
+    def close(self, timeout=5.0):
+        """关闭钩子：刷新剩余日志并停止写线程（进程退出时自动调用）"""
+        if self._writer is None or not self._writer.is_alive():
+            return
+        self.flush(timeout)
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._writer.join(timeout)
+    
+    def get_error_logs(self, limit=100, unresolved_only=False, after_id=None, include_system_info=True):
+        """获取错误日志列表"""
+        return list(self.iter_error_logs(limit=limit, unresolved_only=unresolved_only,
+                                         after_id=after_id, include_system_info=include_system_info))
+    
+    def iter_error_logs(self, limit=100, unresolved_only=False, after_id=None, include_system_info=False):
+        """
+        按时间倒序逐行产出错误日志（直接遍历游标，不构造完整列表）
+        
+        Args:
+            limit: 最多返回条数
+            unresolved_only: 只返回未解决的错误
+            after_id: 键集分页游标，返回排在该 id 之后的记录
+            include_system_info: 是否查询并解析 system_info JSON
+        """
+        sql, params = error_logs_query(limit, unresolved_only, after_id, include_system_info)
+        c = get_connection(self.db_path).execute(sql, params)
+        for row in c:
             r = dict(row)
             if r.get('system_info'):
                 try:
                     r['system_info'] = json.loads(r['system_info'])
                 except:
                     pass
-            result.append(r)
+            yield r
+    
+    def search_error_logs(self, query, start=None, end=None, level=None, limit=50, sort='rank'):
+        """
+        全文检索 message / module / traceback（FTS5，迁移 6 建立的 error_logs_fts）
         
-        return result
+        Args:
+            query: 关键词，空白分隔，多个词同时命中；词尾加 * 为前缀匹配（中文连续文字是一个词，如 "规则*"）
+            start / end: timestamp 范围（闭区间，可只给日期前缀）
+            level: 日志级别
+            limit: 最多返回条数
+            sort: rank 在最近 SEARCH_RANK_WINDOW 条命中中按相关度排序（bm25，message 权重最高），
+                  recent 按写入顺序倒序
+        Returns:
+            记录列表，含 score 与带 <mark> 标记的 message_snippet / traceback_snippet（未做 HTML 转义）
+        """
+        match = fts_query(query)
+        conn = get_connection(self.db_path)
+        fts_conditions = ['error_logs_fts MATCH ?']
+        fts_params = [match]
+        conditions = []
+        params = []
+        if start or end:
+            # 日期前缀 '2025-11-08' 包含当天所有时间
+            bounds = [('>=', start), ('<=', end + '\uffff' if end else None)]
+            bounds = [(op, value) for op, value in bounds if value]
+            conditions.extend(f'e.timestamp {op} ?' for op, _ in bounds)
+            params.extend(value for _, value in bounds)
+            # 时间范围换算成 rowid 上下界交给 FTS 索引过滤；范围过宽时扫描代价高且收益小，放弃换算
+            lo, hi, scanned = conn.execute(f'''SELECT MIN(id), MAX(id), COUNT(*) FROM (
+                SELECT id FROM error_logs WHERE {' AND '.join(f'timestamp {op} ?' for op, _ in bounds)} LIMIT ?)''',
+                [value for _, value in bounds] + [self.SEARCH_BOUNDS_SCAN]).fetchone()
+            if not scanned:
+                return []
+            if scanned < self.SEARCH_BOUNDS_SCAN:
+                fts_conditions.append('error_logs_fts.rowid BETWEEN ? AND ?')
+                fts_params.extend([lo, hi])
+        if level:
+            conditions.append('e.level = ?')
+            params.append(level)
+        
+        if sort == 'rank':
+            # bm25 需要逐条计算，只对最近的 SEARCH_RANK_WINDOW 条命中排序
+            cutoff = conn.execute(f'''SELECT rowid FROM error_logs_fts WHERE {' AND '.join(fts_conditions)}
+                ORDER BY rowid DESC LIMIT 1 OFFSET ?''', fts_params + [self.SEARCH_RANK_WINDOW - 1]).fetchone()
+            if cutoff:
+                fts_conditions.append('error_logs_fts.rowid >= ?')
+                fts_params.append(cutoff[0])
+            order = 'score'
+        else:
+            order = 'error_logs_fts.rowid DESC'
+        # 先只取排序所需的 id 与分数，再为这一页计算摘要（snippet 对每个候选行都计算代价很高）
+        top = conn.execute(f'''SELECT e.id, bm25(error_logs_fts, 4.0, 2.0, 1.0) AS score
+            FROM error_logs_fts JOIN error_logs e ON e.id = error_logs_fts.rowid
+            WHERE {' AND '.join(fts_conditions + conditions)}
+            ORDER BY {order} LIMIT ?''', fts_params + params + [limit]).fetchall()
+        if not top:
+            return []
+        ids = [row[0] for row in top]
+        placeholders = ','.join('?' * len(ids))
+        # 用一次 rowid 区间扫描取摘要（rowid IN (...) 会让 FTS5 对每个值各执行一次 MATCH），
+        # CASE 保证 snippet 只对本页的行计算
+        snippets = {row[0]: row[1:] for row in conn.execute(f'''SELECT rowid,
+                CASE WHEN rowid IN ({placeholders}) THEN snippet(error_logs_fts, 0, '<mark>', '</mark>', '…', 24) END,
+                CASE WHEN rowid IN ({placeholders}) THEN snippet(error_logs_fts, 2, '<mark>', '</mark>', '…', 24) END
+            FROM error_logs_fts WHERE error_logs_fts MATCH ? AND rowid BETWEEN ? AND ?''',
+            ids + ids + [match, min(ids), max(ids)]) if row[1] is not None or row[2] is not None}
+        rows = {row['id']: dict(row) for row in conn.execute(
+            f"SELECT {_ERROR_LOG_COLUMNS} FROM error_logs WHERE id IN ({placeholders})", ids)}
+        results = []
+        for log_id, score in top:
+            r = rows.get(log_id)
+            if r is None:
+                continue
+            message_snippet, traceback_snippet = snippets.get(log_id, (None, None))
+            r.pop('traceback', None)
+            r['score'] = round(-score, 4)
+            r['message_snippet'] = message_snippet
+            r['traceback_snippet'] = traceback_snippet or None
+            results.append(r)
+        return results
     
     def mark_resolved(self, log_id):
-        """标记错误为已解决"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('UPDATE error_logs SET resolved = 1 WHERE id = ?', (log_id,))
-        conn.commit()
-        conn.close()
+        """标记错误为已解决（同一指纹的签名及其抽样记录一并标记，之后再出现时重新计入未解决）"""
+        with transaction(self.db_path) as conn:
+            row = conn.execute('SELECT fingerprint FROM error_logs WHERE id = ?', (log_id,)).fetchone()
+            if row and row[0]:
+                conn.execute(RESOLVE_BY_FINGERPRINT, (row[0],))
+                conn.execute('UPDATE error_signatures SET unresolved_count = 0 WHERE fingerprint = ?', (row[0],))
+            else:
+                conn.execute(RESOLVE_BY_ID, (log_id,))
+        self._notify()
+    
+    def get_error_signatures(self, limit=50, sort='count', unresolved_only=False):
+        """错误签名列表（sort: count 按出现次数 / recent 按最近出现时间）"""
+        c = get_connection(self.db_path).execute(*error_signatures_query(limit, sort, unresolved_only))
+        return [dict(row) for row in c]
     
     def get_error_statistics(self):
-        """获取错误统计信息"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
+        """获取错误统计信息（按签名聚合：每个指纹一行，count 为累计出现次数）"""
+        c = get_connection(self.db_path).cursor()
+        stats = self._signature_statistics(c)
+        
+        # 如果数据为空，生成一些模拟数据
+        if stats['unresolved'] == 0 and stats['auto_fixed'] == 0 and stats['last_24h'] == 0:
+            self._generate_sample_data()
+            # 重新查询
+            stats = self._signature_statistics(c)
         
+        return stats
+    
+    @staticmethod
+    def _signature_statistics(c):
         stats = {}
         # 按级别统计
-        c.execute('SELECT level, COUNT(*) FROM error_logs GROUP BY level')
+        c.execute('SELECT level, SUM(count) FROM error_signatures GROUP BY level')
         stats['by_level'] = dict(c.fetchall())
         
         # 按操作系统统计
-        c.execute('SELECT os_type, COUNT(*) FROM error_logs GROUP BY os_type')
+        c.execute('SELECT os_type, SUM(count) FROM error_signatures GROUP BY os_type')
         stats['by_os'] = dict(c.fetchall())
         
-        # 未解决错误数
-        c.execute('SELECT COUNT(*) FROM error_logs WHERE resolved = 0')
-        stats['unresolved'] = c.fetchone()[0]
-        
-        # 自动修复数
-        c.execute('SELECT COUNT(*) FROM error_logs WHERE auto_fixed = 1')
-        stats['auto_fixed'] = c.fetchone()[0]
+        # 未解决错误数、自动修复数、签名数
+        c.execute('''SELECT COALESCE(SUM(unresolved_count), 0), COALESCE(SUM(auto_fixed_count), 0), COUNT(*)
+            FROM error_signatures''')
+        stats['unresolved'], stats['auto_fixed'], stats['signatures'] = c.fetchone()
         
-        # 最近24小时错误数
-        c.execute('''SELECT COUNT(*) FROM error_logs 
-            WHERE datetime(timestamp) > datetime('now', '-1 day')''')
+        # 最近24小时错误数（按小时桶累计）
+        cutoff = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d %H')
+        c.execute(ERRORS_SINCE_HOUR, (cutoff,))
         stats['last_24h'] = c.fetchone()[0]
         
-        # 如果数据为空，生成一些模拟数据
-        if stats['unresolved'] == 0 and stats['auto_fixed'] == 0 and stats['last_24h'] == 0:
-            self._generate_sample_data()
-            # 重新查询
-            c.execute('SELECT COUNT(*) FROM error_logs WHERE resolved = 0')
-            stats['unresolved'] = c.fetchone()[0]
-            c.execute('SELECT COUNT(*) FROM error_logs WHERE auto_fixed = 1')
-            stats['auto_fixed'] = c.fetchone()[0]
-            c.execute('''SELECT COUNT(*) FROM error_logs 
-                WHERE datetime(timestamp) > datetime('now', '-1 day')''')
-            stats['last_24h'] = c.fetchone()[0]
-        
-        conn.close()
+        # 出现次数最多的签名
+        c.execute('''SELECT fingerprint, level, module, message_template, count, last_seen
+            FROM error_signatures ORDER BY count DESC LIMIT 5''')
+        stats['top_signatures'] = [dict(row) for row in c.fetchall()]
         return stats
     
     def _generate_sample_data(self):
@@ -202,9 +530,8 @@ class ErrorLogger:
             {"level": "ERROR", "module": "安全监控", "message": "检测到异常登录尝试", "auto_fix": True},
         ]
         
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
+        rows = []
+        occurrences = []
         for i, error in enumerate(sample_errors):
             # 生成过去24小时内的随机时间
             hours_ago = random.randint(0, 23)
@@ -225,12 +552,17 @@ class ErrorLogger:
             else:
                 auto_fixed = 0
             
-            c.execute('''INSERT INTO error_logs 
-                (timestamp, level, module, message, traceback, system_info, os_type, resolved, auto_fixed)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                (timestamp, error['level'], error['module'], error['message'], 
-                 '', json.dumps(self._get_system_info()), self.system, resolved, auto_fixed))
-        
-        conn.commit()
-        conn.close()
+            fp, template = fingerprint(error['level'], error['module'], error['message'], '', self.system)
+            rows.append((timestamp, error['level'], error['module'], error['message'], 
+                         '', self._system_info_json, self.system, resolved, auto_fixed, fp))
+            occurrences.append((fp, template, timestamp, error['level'], error['module'], error['message'],
+                                self.system, resolved, auto_fixed))
+        
+        with transaction(self.db_path) as conn:
+            for row, occurrence in zip(rows, occurrences):
+                log_id = conn.execute('''INSERT INTO error_logs 
+                    (timestamp, level, module, message, traceback, system_info, os_type, resolved, auto_fixed, fingerprint)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', row).lastrowid
+                record_occurrences(conn, [occurrence + (log_id,)])
+        self._notify()
 
@@ -0,0 +1,247 @@
+"""
+指标预测服务
+采样器每个快照追加到各指标的滚动窗口（NumPy 环形缓冲区），/monitor/data 请求时
+对所请求的全部指标做一次批量推理，结果缓存到下一个样本到达为止。
+
+模型：优先加载 NAYDN.py / train_rnn_tcn.py 训练出的 Keras 模型（FORECAST_MODEL_PATH，
+缺省时在 NAYDN/models 与当前目录中查找最新的 .h5）及训练时保存的 MinMaxScaler
+（haydn_model_<ts>.h5 对应 haydn_scaler_<ts>.save，rnn/tcn_model.h5 对应 cpu_scaler.save，
+可用 FORECAST_SCALER_PATH 指定），首次预测时才加载。两个训练脚本都只用 CPU 序列训练，
+模型只用于 MODEL_METRIC，其余指标以及未安装 TensorFlow / joblib、缺少模型或归一化器时
+使用阻尼趋势（Holt）统计预测。
+"""
+import os
+import glob
+import logging
+import threading
+import numpy as np
+from datetime import datetime
+from MetricStore import snapshot_to_row, METRIC_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# 百分比指标的预测值限制在 [0, 100]
+PERCENT_METRICS = ('cpu', 'memory', 'disk')
+# 模型未声明输入长度时使用的窗口（与 NAYDN.py 默认一致）
+DEFAULT_WINDOW = 32
+# 模型训练所用的指标
+MODEL_METRIC = 'cpu'
+# 统计预测的平滑系数与趋势阻尼
+LEVEL_ALPHA = 0.3
+TREND_DAMPING = 0.9
+
+
+def find_model_path(base_dir=None):
+    """按修改时间返回最新的已训练模型文件，找不到返回 None"""
+    base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+    candidates = glob.glob(os.path.join(base_dir, 'NAYDN', 'models', 'haydn_model_*.h5'))
+    candidates += [os.path.join(base_dir, name) for name in ('rnn_model.h5', 'tcn_model.h5')]
+    candidates = [path for path in candidates if os.path.isfile(path)]
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+
+def find_scaler_path(model_path):
+    """返回与模型同一次训练保存的归一化器文件，找不到返回 None"""
+    directory, name = os.path.split(model_path)
+    if name.startswith('haydn_model_'):
+        candidate = os.path.join(directory, 'haydn_scaler_' + name[len('haydn_model_'):-len('.h5')] + '.save')
+    else:
+        candidate = os.path.join(directory, 'cpu_scaler.save')
+    return candidate if os.path.isfile(candidate) else None
+
+
+class ForecastService:
+    """滚动窗口 + 批量推理 + 按样本序号缓存的预测服务"""
+
+    def __init__(self, metrics=METRIC_COLUMNS, capacity=240, history=30, max_horizon=60, model_path=None):
+        """
+        Args:
+            metrics: 维护滚动窗口的指标名
+            capacity: 每个指标保留的样本数
+            history: 响应中 real_values 的长度
+            max_horizon: 单次最多预测的步数
+            model_path: Keras 模型文件；None 时读取 FORECAST_MODEL_PATH 或自动查找
+        """
+        self.metrics = tuple(metrics)
+        self._rows = {m: i for i, m in enumerate(self.metrics)}
+        self.capacity = capacity
+        self.history = history
+        self.max_horizon = max_horizon
+        self.model_path = model_path or os.environ.get('FORECAST_MODEL_PATH') or find_model_path()
+        self.scaler_path = os.environ.get('FORECAST_SCALER_PATH') or (
+            find_scaler_path(self.model_path) if self.model_path else None)
+        self.window_size = DEFAULT_WINDOW
+        self.backend = 'statistical'
+
+        self._buffer = np.zeros((len(self.metrics), capacity))
+        self._count = 0
+        self.seq = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._model = None
+        self._scaler = None
+        self._model_lock = threading.Lock()
+        self._model_checked = False
+
+    # ---------- 滚动窗口 ----------
+
+    def observe(self, values):
+        """追加一个样本（按 self.metrics 顺序），并使缓存失效"""
+        with self._lock:
+            self._buffer[:, self._count % self.capacity] = values
+            self._count += 1
+            self.seq += 1
+            self._cache.clear()
+
+    def observe_snapshot(self, snapshot):
+        """采样器回调"""
+        if "error" in snapshot:
+            return
+        row = dict(zip(METRIC_COLUMNS, snapshot_to_row(snapshot)))
+        self.observe([row[m] for m in self.metrics])
+
+    def seed(self, records):
+        """用历史记录（按时间正序的 dict，如 system_metrics 行）预热窗口"""
+        for record in records:
+            self.observe([record[m] or 0.0 for m in self.metrics])
+
+    def _window(self, rows, length):
+        """返回指定指标最近 length 个样本，形状 (len(rows), n)，按时间正序；调用方持有锁"""
+        n = min(length, self._count, self.capacity)
+        positions = np.arange(self._count - n, self._count) % self.capacity
+        return self._buffer[np.ix_(rows, positions)]
+
+    # ---------- 模型 ----------
+
+    def _load_model(self):
+        """首次预测时加载模型与归一化器，任一缺失或加载失败则保持统计预测"""
+        with self._model_lock:
+            if self._model_checked:
+                return self._model
+            self._model_checked = True
+            if not self.model_path:
+                return None
+            if not self.scaler_path:
+                logger.warning("未找到模型 %s 对应的归一化器，使用统计预测", self.model_path)
+                return None
+            try:
+                import joblib
+                import tensorflow as tf
+                scaler = joblib.load(self.scaler_path)
+                custom_objects = {}
+                try:
+                    from NAYDN.NAYDN import AttentionLayer
+                    custom_objects['AttentionLayer'] = AttentionLayer
+                except ImportError:
+                    pass
+                model = tf.keras.models.load_model(self.model_path, custom_objects=custom_objects, compile=False)
+                self.window_size = model.input_shape[1] or DEFAULT_WINDOW
+                self._scaler = scaler
+                self._model = model
+                self.backend = os.path.basename(self.model_path)
+                logger.info("预测模型已加载: %s (scaler=%s, window=%s)",
+                            self.model_path, self.scaler_path, self.window_size)
+            except Exception as e:
+                logger.warning("预测模型加载失败，使用统计预测: %s", e)
+            return self._model
+
+    def _model_predict(self, model, series, steps):
+        """
+        递归多步预测单个序列（MODEL_METRIC）
+        用训练时保存的 MinMaxScaler 归一化 / 反归一化，与 NAYDN.predict_multi_step 一致
+        """
+        window = series[-self.window_size:].reshape(-1, 1)
+        x = self._scaler.transform(window).reshape(1, -1, 1).astype(np.float32)
+        preds = np.empty(steps)
+        for k in range(steps):
+            y = float(np.asarray(model(x, training=False)).reshape(-1)[0])
+            preds[k] = y
+            x = np.concatenate([x[:, 1:, :], np.full((1, 1, 1), y, dtype=np.float32)], axis=1)
+        return self._scaler.inverse_transform(preds.reshape(-1, 1)).reshape(-1)
+
+    @staticmethod
+    def _statistical_predict(series, steps):
+        """向量化阻尼趋势预测：EWMA 水平 + 最小二乘斜率 * 阻尼累积"""
+        n = series.shape[1]
+        t = np.arange(n, dtype=float)
+        weights = (1 - LEVEL_ALPHA) ** (n - 1 - t)
+        level = series @ weights / weights.sum()
+        if n > 1:
+            tc = t - t.mean()
+            slope = (series - series.mean(axis=1, keepdims=True)) @ tc / (tc @ tc)
+        else:
+            slope = np.zeros(len(series))
+        damping = np.cumsum(TREND_DAMPING ** np.arange(1, steps + 1))
+        return level[:, None] + slope[:, None] * damping[None, :]
+
+    # ---------- 预测 ----------
+
+    def forecast(self, metrics=('cpu',), steps=10):
+        """
+        预测指定指标未来 steps 个采样周期
+
+        Returns:
+            {metric: {"real_values": [...], "predict_values": [...]}}；窗口为空时返回 None
+        Raises:
+            ValueError: 未知指标
+        """
+        metrics = tuple(metrics)
+        unknown = [m for m in metrics if m not in self._rows]
+        if unknown:
+            raise ValueError(f"未知指标: {', '.join(unknown)}")
+        steps = max(1, min(int(steps), self.max_horizon))
+        key = (metrics, steps)
+
+        model = self._load_model()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+            seq = self.seq
+            series = self._window([self._rows[m] for m in metrics], max(self.history, self.window_size))
+        if series.shape[1] == 0:
+            return None
+
+        preds = self._statistical_predict(series, steps)
+        if model is not None and MODEL_METRIC in metrics and series.shape[1] >= self.window_size:
+            i = metrics.index(MODEL_METRIC)
+            try:
+                preds[i] = self._model_predict(model, series[i], steps)
+            except Exception as e:
+                logger.warning("模型推理失败，使用统计预测: %s", e)
+
+        result = {}
+        for i, metric in enumerate(metrics):
+            upper = 100.0 if metric in PERCENT_METRICS else None
+            values = np.clip(preds[i], 0.0, upper)
+            result[metric] = {
+                "real_values": np.round(series[i, -self.history:], 2).tolist(),
+                "predict_values": np.round(values, 2).tolist()
+            }
+        with self._lock:
+            # 推理期间若有新样本到达，结果已过期，不写缓存
+            if self.seq == seq:
+                self._cache[key] = result
+        return result
+
+    def monitor_data(self, num, metrics=('cpu',), sample_age=0):
+        """
+        /monitor/data/<num> 响应体：num 为预测步数（0 表示默认 10 步），
+        real_values / predict_values 取第一个指标，forecasts 含全部请求的指标
+        """
+        forecasts = self.forecast(metrics, num or 10)
+        if forecasts is None:
+            return {
+                "error": "预测数据错误: 尚无采样数据",
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
+        primary = forecasts[metrics[0]]
+        return {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "real_values": primary["real_values"],
+            "predict_values": primary["predict_values"],
+            "forecasts": forecasts,
+            "model": self.backend,
+            "num": num,
+            "sample_age": sample_age
+        }
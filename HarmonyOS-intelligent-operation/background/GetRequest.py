@@ -5,12 +5,29 @@ import sqlite3
 import psutil
 import requests
 import platform
-from flask import Flask, render_template, jsonify, request, make_response, send_from_directory
+from flask import Flask, Response, render_template, jsonify, request, make_response, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
-from ReturnData import return_monitor_data_dynamic_one, return_monitor_data_dynamic, return_anomaly_data
+from ReturnData import return_monitor_data_dynamic_one, return_monitor_data_dynamic
 from ErrorLogger import ErrorLogger
 from ReportGenerator import NFTReportGenerator
 from NFTMarket import NFTMarket
+import BlobStore
+from PaymentProcessor import PaymentProcessor
+from MetricSampler import MetricSampler
+from Database import get_connection, transaction
+from MetricStore import MetricStore, parse_ts
+from Migrations import migrate
+from StreamingJson import json_page_response
+from MetricStream import SnapshotHub
+from AnomalyDetector import AnomalyDetector
+from ForecastService import ForecastService
+from RuleEngine import RuleEngine, CONFIG_LIST_SQL, CONFIG_VERSION_SQL
+from MetricIngest import ingest, IngestError
+from ProcessCollector import ProcessCollector
+from ResponseCache import ResponseCache
+import Instrumentation
+import Profiler
+from OllamaClient import OllamaClient, OllamaError
 
 root_folder = os.path.dirname(__file__)
 get_status_full_file = os.path.join(root_folder, "GetStatus_test.py")
@@ -22,7 +39,7 @@ CORS(app, resources={
         "origins": ["http://localhost:8080", "http://localhost:8081", "http://127.0.0.1:8080"],
         "supports_credentials": True,
         "expose_headers": "Content-Type",
-        "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"]
+        "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "Idempotency-Key"]
     },
     r"/monitor/*": {
         "origins": ["http://localhost:8080", "http://localhost:8081", "http://127.0.0.1:8080"],
@@ -32,13 +49,40 @@ CORS(app, resources={
 })
 app.config['get_status_file'] = get_status_full_file
 
-# 数据库配置
-DB_PATH = os.path.join(root_folder, 'monitor.db')
+# 运行时指标：按路由的请求计数与延迟直方图、进行中请求数，GET /metrics 输出 OpenMetrics 文本
+Instrumentation.install(app)
+# 请求剖析（MONITOR_PROFILE=1 开启）：GET /api/debug/profile 最慢请求分段，/api/debug/profile/flamegraph 折叠栈采样
+request_profiler = Profiler.install(app)
+
+# 数据库配置（MONITOR_DB_PATH 可指向其他数据库文件，便于基准测试）
+DB_PATH = os.environ.get('MONITOR_DB_PATH') or os.path.join(root_folder, 'monitor.db')
 
 # 初始化错误日志和报告生成器
 error_logger = ErrorLogger(db_path=DB_PATH)
 report_generator = NFTReportGenerator(db_path=DB_PATH)
 nft_market = NFTMarket(db_path=DB_PATH)
+# 异步支付：请求只登记并入队，worker 线程推进 pending -> processing -> paid/failed（迁移完成后启动）
+payment_processor = PaymentProcessor(nft_market)
+
+def data_version(name):
+    """config_versions 中的数据版本号（触发器维护，任一进程写入都会递增）；迁移前返回 None"""
+    try:
+        row = get_connection(DB_PATH).execute(CONFIG_VERSION_SQL, (name,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+# 读接口响应缓存：本进程写入后按标签立即失效，其他 worker 的写入通过数据版本号失效
+# （统计中的“最近24小时”由 TTL 兜底）
+response_cache = ResponseCache()
+error_logger.add_listener(lambda: response_cache.invalidate("error_logs"))
+cached_error_statistics = response_cache.cached(
+    "error_statistics", ttl=30, tags=("error_logs",),
+    version=lambda: data_version('error_logs'))(error_logger.get_error_statistics)
+
+# 后台指标采样器（间隔由 MONITOR_SAMPLE_INTERVAL 环境变量配置，默认2秒）；
+# 多个 worker 进程时按锁文件选出一个主采样进程写入时序数据与异常记录
+metric_sampler = MetricSampler(leader_lock=DB_PATH + '.sampler.lock')
 
 # 全局错误处理
 @app.errorhandler(Exception)
@@ -52,9 +96,8 @@ def handle_error(e):
     )
     return jsonify({"error": str(e)}), 500
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """返回当前线程的持久连接（由 Database 模块管理，不要 close）"""
+    return get_connection(DB_PATH)
 
 # 初始化数据库和表
 def init_db():
@@ -96,12 +139,71 @@ def init_db():
             c.execute('INSERT INTO monitor_config (name, description, threshold) VALUES (?, ?, ?)',
                       (name, desc, th))
     conn.commit()
-    conn.close()
 init_db()
 
-# Ollama配置
-OLLAMA_API_URL = "http://localhost:11434/api/chat"
-OLLAMA_MODEL = "mistral"
+# 系统指标时序存储（原始样本 + 1分钟/1小时汇总），由主采样进程持续写入
+metric_store = MetricStore(db_path=DB_PATH)
+metric_sampler.add_listener(metric_store.record_snapshot, leader_only=True)
+
+# 实时推送：每个快照只序列化一次，分发给所有 /monitor/stream 订阅者
+snapshot_hub = SnapshotHub()
+metric_sampler.add_listener(snapshot_hub.publish)
+
+# 在线异常检测：每个快照更新 EWMA/季节基线，异常写入 anomalies 表（只在主采样进程中运行）
+anomaly_detector = AnomalyDetector(db_path=DB_PATH)
+metric_sampler.add_listener(anomaly_detector.observe_snapshot, leader_only=True)
+
+# 指标预测：滚动窗口由采样器持续追加，启动时（迁移完成后）用最近的历史样本预热
+forecast_service = ForecastService()
+metric_sampler.add_listener(forecast_service.observe_snapshot)
+
+# 阈值告警：monitor_config 编译为向量化规则，每个快照评估一次，触发的告警写入错误日志
+rule_engine = RuleEngine(db_path=DB_PATH, error_logger=error_logger)
+rule_engine.reload()
+metric_sampler.add_listener(rule_engine.observe_snapshot)
+
+# 进程 Top-N：缓存 psutil.Process 句柄，按 MONITOR_PROCESS_INTERVAL 节流采集
+process_collector = ProcessCollector()
+metric_sampler.add_listener(process_collector.observe_snapshot)
+
+# 所有表创建完成后执行结构迁移（索引、新增列），再启动采样器写入数据
+migrate(DB_PATH)
+forecast_service.seed(reversed(metric_store.latest(forecast_service.capacity)))
+metric_sampler.start()
+payment_processor.start()
+
+# /metrics 抓取时计算的指标
+Instrumentation.REGISTRY.register_callback(
+    'monitor_response_cache_requests', 'Response cache lookups by endpoint and result', 'counter',
+    lambda: [((name, field), s[field]) for name, s in response_cache.stats()["by_name"].items()
+             for field in ("hits", "misses")],
+    ('name', 'result'))
+Instrumentation.REGISTRY.register_callback(
+    'monitor_error_logs_dropped', 'Error log records dropped because the write queue was full', 'counter',
+    lambda: [((), error_logger.dropped)])
+Instrumentation.REGISTRY.register_callback(
+    'monitor_payments', 'NFT payments finished by the background worker, by outcome', 'counter',
+    lambda: [((outcome,), n) for outcome, n in list(payment_processor.outcomes.items())], ('outcome',))
+Instrumentation.REGISTRY.register_callback(
+    'monitor_payment_queue_depth', 'Payment requests waiting for a worker', 'gauge',
+    lambda: [((), payment_processor.queue_depth)])
+Instrumentation.REGISTRY.register_callback(
+    'monitor_stream_subscribers', 'Connected /monitor/stream subscribers', 'gauge',
+    lambda: [((), snapshot_hub.subscriber_count)])
+
+
+def _sample_age_metric():
+    sampled_at = metric_sampler.latest()[1]
+    return [((), round(time.time() - sampled_at, 3))] if sampled_at else []
+
+
+Instrumentation.REGISTRY.register_callback(
+    'monitor_sample_age_seconds', 'Seconds since the latest sampler snapshot', 'gauge', _sample_age_metric)
+
+# Ollama配置（可用 OLLAMA_API_URL / OLLAMA_MODEL 环境变量覆盖），连接池复用 keep-alive 连接
+ollama_client = OllamaClient()
+OLLAMA_API_URL = ollama_client.api_url
+OLLAMA_MODEL = ollama_client.model
 
 # 登录API
 @app.route("/api/login", methods=["POST", "OPTIONS"])
@@ -147,68 +249,121 @@ def api_login():
             response.headers[k] = v
         return response, 500
 
+# 监控配置列表（增删改时按 monitor_config 标签失效，其他 worker 的修改按 config_versions 版本号失效）
+@response_cache.cached("monitor_configs", ttl=300, tags=("monitor_config",),
+                       version=lambda: data_version('monitor_config'))
+def load_monitor_configs():
+    configs = get_db_connection().execute(CONFIG_LIST_SQL).fetchall()
+    return [dict(row) for row in configs]
+
 # 监控配置API
 @app.route("/api/monitor-configs", methods=["GET", "POST", "PUT", "DELETE"])
 def monitor_configs():
-    conn = get_db_connection()
-    c = conn.cursor()
     if request.method == "GET":
-        configs = c.execute("SELECT * FROM monitor_config ORDER BY created_at DESC").fetchall()
-        conn.close()
-        return jsonify([dict(row) for row in configs])
+        return jsonify(load_monitor_configs())
     elif request.method == "POST":
         data = request.get_json()
-        c.execute("INSERT INTO monitor_config (name, description, threshold) VALUES (?, ?, ?)",
-                  (data.get('name'), data.get('description'), data.get('threshold')))
-        conn.commit()
-        new_id = c.lastrowid
-        conn.close()
+        with transaction(DB_PATH) as conn:
+            c = conn.execute("INSERT INTO monitor_config (name, description, threshold) VALUES (?, ?, ?)",
+                             (data.get('name'), data.get('description'), data.get('threshold')))
+            new_id = c.lastrowid
+        response_cache.invalidate("monitor_config")
+        rule_engine.reload()
         return jsonify({"status": "success", "id": new_id})
     elif request.method == "PUT":
         data = request.get_json()
-        c.execute("UPDATE monitor_config SET name=?, description=?, threshold=? WHERE id=?",
-                  (data.get('name'), data.get('description'), data.get('threshold'), data.get('id')))
-        conn.commit()
-        conn.close()
+        with transaction(DB_PATH) as conn:
+            conn.execute("UPDATE monitor_config SET name=?, description=?, threshold=? WHERE id=?",
+                         (data.get('name'), data.get('description'), data.get('threshold'), data.get('id')))
+        response_cache.invalidate("monitor_config")
+        rule_engine.reload()
         return jsonify({"status": "success"})
     elif request.method == "DELETE":
         data = request.get_json()
-        c.execute("DELETE FROM monitor_config WHERE id=?", (data.get('id'),))
-        conn.commit()
-        conn.close()
+        with transaction(DB_PATH) as conn:
+            conn.execute("DELETE FROM monitor_config WHERE id=?", (data.get('id'),))
+        response_cache.invalidate("monitor_config")
+        rule_engine.reload()
         return jsonify({"status": "success"})
 
+# 响应缓存命中统计
+@app.route("/api/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify({"code": 0, "data": response_cache.stats()})
+
+# 当前处于告警状态的阈值规则
+@app.route("/api/alerts", methods=["GET"])
+def active_alerts():
+    return jsonify({"code": 0, "data": rule_engine.active_alerts(), "unmapped_configs": rule_engine.unmapped})
+
 # 系统指标API
 @app.route("/api/system-metrics", methods=["GET", "POST", "DELETE"])
 def system_metrics():
-    conn = get_db_connection()
-    c = conn.cursor()
     if request.method == "GET":
-        metrics = c.execute("SELECT * FROM system_metrics ORDER BY timestamp DESC LIMIT 10").fetchall()
-        conn.close()
-        return jsonify([dict(row) for row in metrics])
+        # 带 from/to/step 参数时按时间范围查询（自动选择原始/1分钟/1小时分辨率），否则返回最近10条
+        # host 参数查询远程主机批量上报的数据
+        host = request.args.get('host') or None
+        if not any(k in request.args for k in ('from', 'to', 'step')):
+            return jsonify(metric_store.latest(limit=10, host=host))
+        try:
+            series = metric_store.query_range(
+                start=parse_ts(request.args.get('from')),
+                end=parse_ts(request.args.get('to')),
+                step=request.args.get('step', type=int),
+                host=host
+            )
+        except ValueError as e:
+            return jsonify({"code": 1, "message": str(e)}), 400
+        return jsonify({"code": 0, "data": series})
     elif request.method == "POST":
         data = request.get_json()
-        c.execute("INSERT INTO system_metrics (cpu, memory, disk, network) VALUES (?, ?, ?, ?)",
-                  (data.get('cpu'), data.get('memory'), data.get('disk'), data.get('network')))
-        conn.commit()
-        new_id = c.lastrowid
-        conn.close()
+        new_id = metric_store.insert(data.get('cpu'), data.get('memory'), data.get('disk'), data.get('network'))
         return jsonify({"status": "success", "id": new_id})
     elif request.method == "DELETE":
         data = request.get_json()
-        c.execute("DELETE FROM system_metrics WHERE id=?", (data.get('id'),))
-        conn.commit()
-        conn.close()
+        with transaction(DB_PATH) as conn:
+            conn.execute("DELETE FROM system_metrics WHERE id=?", (data.get('id'),))
         return jsonify({"status": "success"})
 
+# 进程 Top-N（?n=10&sort=cpu|memory|io），数据来自采样线程最近一轮采集
+@app.route("/api/processes/top", methods=["GET"])
+def processes_top():
+    sort = request.args.get('sort')
+    if sort not in (None, 'cpu', 'memory', 'io'):
+        return jsonify({"code": 1, "message": "sort 只能是 cpu / memory / io"}), 400
+    try:
+        data = process_collector.top(n=request.args.get('n', type=int), sort=sort)
+        return jsonify({"code": 0, "data": data})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# 远程主机批量上报：NDJSON 或 msgpack（Content-Type 区分），可 gzip 压缩；主机标识取 X-Host-Id 请求头或 host 参数
+@app.route("/api/system-metrics/bulk", methods=["POST"])
+def system_metrics_bulk():
+    try:
+        result = ingest(
+            metric_store,
+            request.get_data(cache=False),
+            host=request.headers.get('X-Host-Id') or request.args.get('host'),
+            content_type=request.content_type,
+            content_encoding=request.headers.get('Content-Encoding'),
+            anomaly_detector=anomaly_detector
+        )
+    except IngestError as e:
+        return jsonify({"code": 1, "message": str(e)}), e.status_code
+    return jsonify({"code": 0, "data": result})
+
 # 监控内部实现：构建状态数据
 def build_status_payload():
     try:
-        payload = return_monitor_data_dynamic_one()
-        # 若函数返回 None 或空则回退到 mock
-        if not payload:
-            raise RuntimeError("empty payload from return_monitor_data_dynamic_one")
+        # 优先返回采样器的最新快照（附带 sample_age）；采样器尚未产出样本时现场采集一次
+        payload = metric_sampler.latest_with_age()
+        if payload is None:
+            payload = return_monitor_data_dynamic_one()
+            # 若函数返回 None 或空则回退到 mock
+            if not payload:
+                raise RuntimeError("empty payload from return_monitor_data_dynamic_one")
+            payload["sample_age"] = 0
         return payload
     except Exception:
         # 兼容回退：（便于前端兼容）
@@ -230,10 +385,35 @@ def api_status():
 def get_status_data():
     return jsonify(build_status_payload())
 
+@app.route("/monitor/stream", methods=['GET'])
+def monitor_stream():
+    """SSE 实时推送采样快照（替代前端定时轮询 /monitor/status）"""
+    sub = snapshot_hub.subscribe()
+    if sub is None:
+        return jsonify({"code": 1, "message": "订阅者数量已达上限"}), 503
+    return Response(stream_with_context(snapshot_hub.stream(sub)), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+def _forecast_metrics():
+    """解析 ?metrics=cpu,memory，未知指标抛出 ValueError"""
+    metrics = tuple(m.strip() for m in request.args.get('metrics', 'cpu').split(',') if m.strip()) or ('cpu',)
+    unknown = [m for m in metrics if m not in forecast_service.metrics]
+    if unknown:
+        raise ValueError(f"未知指标: {', '.join(unknown)}，可选: {', '.join(forecast_service.metrics)}")
+    return metrics
+
+# num 为预测步数；?metrics=cpu,memory,disk,network 一次批量预测多个指标
 @app.route("/monitor/data/<int:num>", methods=['GET','POST'])
 def get_dynamic_data(num):
     try:
-        results = return_monitor_data_dynamic(num)
+        metrics = _forecast_metrics()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        results = return_monitor_data_dynamic(num, real_data=metric_sampler.latest_with_age(),
+                                              forecaster=forecast_service, metrics=metrics)
         return jsonify(results)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -241,60 +421,65 @@ def get_dynamic_data(num):
 @app.route("/api/monitor/data/<int:num>", methods=['GET','POST'])
 def get_dynamic_data_api(num):
     try:
-        results = return_monitor_data_dynamic(num)
+        metrics = _forecast_metrics()
+    except ValueError as e:
+        return jsonify({"code": 1, "message": str(e)}), 400
+    try:
+        results = return_monitor_data_dynamic(num, real_data=metric_sampler.latest_with_age(),
+                                              forecaster=forecast_service, metrics=metrics)
         return jsonify({"code": 0, "data": results})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-# 兼容前端异常接口（/api/anomalies） 
+# 兼容前端异常接口（/api/anomalies），数据来自在线异常检测器（?limit=&after_id=&host=&metric=）
 @app.route("/api/anomalies", methods=["GET"])
 def api_anomalies():
     try:
-        data = return_anomaly_data()
-        return jsonify({"code": 0, "data": data})
+        limit = max(1, request.args.get('limit', 100, type=int))
+        rows = anomaly_detector.iter_anomalies(
+            limit=limit,
+            after_id=request.args.get('after_id', type=int),
+            host=request.args.get('host'),
+            metric=request.args.get('metric')
+        )
+        return json_page_response(rows, limit)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-# 保留原始异常 API 名称（兼容旧客户端）
+# 保留原始异常 API 名称（兼容旧客户端，返回最近的异常列表）
 @app.route("/api/anomaly_data", methods=["GET"])
 def get_anomaly_data():
     try:
-        data = return_anomaly_data()
-        return jsonify(data)
+        limit = max(1, request.args.get('limit', 100, type=int))
+        return jsonify(list(anomaly_detector.iter_anomalies(limit=limit)))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # Ollama大模型问答API
+def _sse(data, event=None):
+    """格式化一条 SSE 消息"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _wants_stream(data):
+    """请求体 stream=true、?stream=1 或 Accept: text/event-stream 时使用流式返回"""
+    if data.get("stream") is True:
+        return True
+    if request.args.get("stream", "").lower() in ("1", "true"):
+        return True
+    return "text/event-stream" in request.headers.get("Accept", "")
+
 @app.route("/api/qa", methods=["POST"])
 def qa_api():
-    data = request.get_json()
+    data = request.get_json() or {}
     question = data.get("question", "").strip()
+    if _wants_stream(data):
+        return qa_stream(question)
     try:
-        response = requests.post(
-            OLLAMA_API_URL,
-            json={
-                "model": OLLAMA_MODEL,
-                "messages": [
-                    {"role": "system", "content": "你是NexGen MetaOps系统运维助手，专业回答系统监控和项目相关问题，回答简洁准确"},
-                    {"role": "user", "content": question}
-                ],
-                "stream": True
-            },
-            stream=True
-        )
-        answer = ""
-        if response.status_code == 200:
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        line_data = json.loads(line.decode('utf-8'))
-                        if "message" in line_data and "content" in line_data["message"]:
-                            answer += line_data["message"]["content"]
-                    except json.JSONDecodeError:
-                        continue
-            return jsonify({"question": question, "answer": answer.strip()})
-        else:
-            return jsonify({"question": question, "answer": f"Ollama调用失败: HTTP {response.status_code}, {response.text}"})
+        answer = ollama_client.chat(question)
+        return jsonify({"question": question, "answer": answer})
+    except OllamaError as e:
+        return jsonify({"question": question, "answer": f"Ollama调用失败: HTTP {e.status_code}, {e.text}"})
     except requests.exceptions.ConnectionError:
         return jsonify({
             "question": question,
@@ -308,6 +493,30 @@ def qa_api():
             "error": str(e)
         })
 
+def qa_stream(question):
+    """SSE 流式问答：每收到一个 token 块立即转发，结束时发送 done 事件"""
+    def generate():
+        parts = []
+        try:
+            for content in ollama_client.stream_chat(question):
+                parts.append(content)
+                yield _sse({"content": content})
+            yield _sse({"question": question, "answer": "".join(parts).strip()}, event="done")
+        except OllamaError as e:
+            yield _sse({"answer": f"Ollama调用失败: HTTP {e.status_code}, {e.text}", "error": "http_error"}, event="error")
+        except requests.exceptions.ConnectionError:
+            yield _sse({
+                "answer": "Ollama服务未启动，请先运行`ollama run mistral`启动本地模型服务",
+                "error": "connection_error"
+            }, event="error")
+        except Exception as e:
+            yield _sse({"answer": f"模型调用错误: {str(e)}", "error": str(e)}, event="error")
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
 # 根路径
 @app.route("/")
 def index():
@@ -326,31 +535,38 @@ def index():
     <p>前端服务请访问: <a href="http://localhost:8080">http://localhost:8080</a></p>
     """
 
+@response_cache.cached("system_info", ttl=5, tags=("system_info",))
+def build_system_info():
+    """系统信息（platform 信息不变，可用内存由 5 秒 TTL 控制新鲜度）"""
+    system_info = {
+        "os": platform.system(),
+        "os_version": platform.version(),
+        "platform": platform.platform(),
+        "hostname": platform.node(),
+        "python_version": platform.python_version(),
+        "supported_os": ["Windows", "Linux", "macOS", "Kylin"],
+        "deployment_type": "轻量化部署",
+        "auto_ops_enabled": True
+    }
+    try:
+        import psutil
+        with Profiler.span("psutil", "virtual_memory"):
+            memory = psutil.virtual_memory()
+        system_info.update({
+            "cpu_count": psutil.cpu_count(),
+            "memory_total_gb": round(memory.total / (1024**3), 2),
+            "memory_available_gb": round(memory.available / (1024**3), 2)
+        })
+    except:
+        pass
+    return system_info
+
 # 多操作系统检测API
 @app.route("/api/system-info", methods=["GET"])
 def get_system_info():
     """获取系统信息，展示多操作系统支持"""
     try:
-        system_info = {
-            "os": platform.system(),
-            "os_version": platform.version(),
-            "platform": platform.platform(),
-            "hostname": platform.node(),
-            "python_version": platform.python_version(),
-            "supported_os": ["Windows", "Linux", "macOS", "Kylin"],
-            "deployment_type": "轻量化部署",
-            "auto_ops_enabled": True
-        }
-        try:
-            import psutil
-            system_info.update({
-                "cpu_count": psutil.cpu_count(),
-                "memory_total_gb": round(psutil.virtual_memory().total / (1024**3), 2),
-                "memory_available_gb": round(psutil.virtual_memory().available / (1024**3), 2)
-            })
-        except:
-            pass
-        return jsonify({"code": 0, "data": system_info})
+        return jsonify({"code": 0, "data": build_system_info()})
     except Exception as e:
         error_logger.log_error("ERROR", "system_info", str(e), e)
         return jsonify({"error": str(e)}), 500
@@ -358,16 +574,66 @@ def get_system_info():
 # 错误日志API
 @app.route("/api/error-logs", methods=["GET"])
 def get_error_logs():
-    """获取错误日志列表"""
+    """获取错误日志列表（?after_id= 键集分页，?include_system_info=true 时返回系统信息）"""
     try:
-        limit = request.args.get('limit', 100, type=int)
+        limit = max(1, request.args.get('limit', 100, type=int))
         unresolved_only = request.args.get('unresolved_only', 'false').lower() == 'true'
-        logs = error_logger.get_error_logs(limit=limit, unresolved_only=unresolved_only)
-        return jsonify({"code": 0, "data": logs})
+        include_system_info = request.args.get('include_system_info', 'false').lower() == 'true'
+        logs = error_logger.iter_error_logs(
+            limit=limit,
+            unresolved_only=unresolved_only,
+            after_id=request.args.get('after_id', type=int),
+            include_system_info=include_system_info
+        )
+        return json_page_response(logs, limit)
     except Exception as e:
         error_logger.log_error("ERROR", "error_logs", str(e), e)
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/error-logs/search", methods=["GET"])
+def search_error_logs():
+    """全文检索错误日志（?q=关键词&from=&to=&level=&sort=rank|recent&limit=），返回相关度与摘要"""
+    sort = request.args.get('sort', 'rank')
+    if sort not in ('rank', 'recent'):
+        return jsonify({"code": 1, "message": "sort 只能是 rank 或 recent"}), 400
+    try:
+        results = error_logger.search_error_logs(
+            request.args.get('q', ''),
+            start=request.args.get('from'),
+            end=request.args.get('to'),
+            level=request.args.get('level'),
+            limit=max(1, min(request.args.get('limit', 50, type=int), 500)),
+            sort=sort
+        )
+    except ValueError as e:
+        return jsonify({"code": 1, "message": str(e)}), 400
+    except Exception as e:
+        error_logger.log_error("ERROR", "error_log_search", str(e), e)
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"code": 0, "data": results})
+
+@app.route("/api/error-logs/archive", methods=["GET"])
+def search_error_log_archive():
+    """检索已轮转压缩的历史日志文件（?from=&to=&level=&module=&limit=），只解压命中的块"""
+    try:
+        limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+        entries = error_logger.archiver.search(
+            start=request.args.get('from'),
+            end=request.args.get('to'),
+            level=request.args.get('level'),
+            module=request.args.get('module'),
+            limit=limit
+        )
+        return jsonify({"code": 0, "data": entries})
+    except Exception as e:
+        error_logger.log_error("ERROR", "error_log_archive", str(e), e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/error-logs/archives", methods=["GET"])
+def list_error_log_archives():
+    """历史日志归档列表（时间范围、条数、压缩前后大小）"""
+    return jsonify({"code": 0, "data": error_logger.archiver.archives()})
+
 @app.route("/api/error-logs/<int:log_id>/resolve", methods=["POST"])
 def resolve_error_log(log_id):
     """标记错误为已解决"""
@@ -378,11 +644,28 @@ def resolve_error_log(log_id):
         error_logger.log_error("ERROR", "resolve_error", str(e), e)
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/error-signatures", methods=["GET"])
+def get_error_signatures():
+    """错误签名列表（?sort=count|recent&unresolved_only=true&limit=）：同类错误合并后的出现次数与首末时间"""
+    sort = request.args.get('sort', 'count')
+    if sort not in ('count', 'recent'):
+        return jsonify({"code": 1, "message": "sort 只能是 count 或 recent"}), 400
+    try:
+        signatures = error_logger.get_error_signatures(
+            limit=max(1, min(request.args.get('limit', 50, type=int), 500)),
+            sort=sort,
+            unresolved_only=request.args.get('unresolved_only', 'false').lower() == 'true'
+        )
+        return jsonify({"code": 0, "data": signatures})
+    except Exception as e:
+        error_logger.log_error("ERROR", "error_signatures", str(e), e)
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/api/error-statistics", methods=["GET"])
 def get_error_statistics():
     """获取错误统计信息"""
     try:
-        stats = error_logger.get_error_statistics()
+        stats = cached_error_statistics()
         return jsonify({"code": 0, "data": stats})
     except Exception as e:
         error_logger.log_error("ERROR", "error_statistics", str(e), e)
@@ -421,24 +704,53 @@ def generate_report():
 
 @app.route("/api/report/<report_id>", methods=["GET"])
 def get_report(report_id):
-    """获取已生成的报告"""
+    """
+    获取已生成的报告：直接返回落盘文件（?format=json|text，默认 json）
+    仅在 ?regenerate=true 时重新生成并保存
+    """
     try:
-        # 这里可以从文件系统读取，简化实现直接重新生成
-        report = report_generator.generate_fault_repair_report(
-            report_id=report_id
-        )
-        return jsonify({
-            "code": 0,
-            "data": {
-                "report_id": report['report_id'],
-                "text_report": report['text'],
-                "json_report": report['json']
-            }
-        })
+        if request.args.get('regenerate', 'false').lower() == 'true':
+            stored = report_generator.report_store.get(report_id)
+            report = report_generator.generate_fault_repair_report(
+                report_id=report_id,
+                title=stored['title'] if stored and stored['title'] else '数据故障修复报告'
+            )
+            saved_files = report_generator.save_report(report)
+            return jsonify({
+                "code": 0,
+                "data": {
+                    "report_id": report['report_id'],
+                    "text_report": report['text'],
+                    "json_report": report['json'],
+                    "saved_files": saved_files
+                }
+            })
+
+        stored = report_generator.report_store.get(report_id)
+        format_type = request.args.get('format', 'json')
+        if format_type not in ('json', 'text'):
+            return jsonify({"code": 1, "message": "format 仅支持 json 或 text"}), 400
+        path = stored and stored['json_file' if format_type == 'json' else 'text_file']
+        if not path or not os.path.exists(path):
+            return jsonify({"code": 1, "message": "报告不存在"}), 404
+        mimetype = 'application/json' if format_type == 'json' else 'text/plain; charset=utf-8'
+        return send_file(path, mimetype=mimetype, conditional=True)
     except Exception as e:
         error_logger.log_error("ERROR", "get_report", str(e), e)
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/reports", methods=["GET"])
+def list_reports():
+    """分页列出历史报告（?limit=&after_id=，按生成时间倒序）"""
+    try:
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        after_id = request.args.get('after_id')
+        records, next_after_id = report_generator.report_store.list(limit=limit, after_id=after_id)
+        return jsonify({"code": 0, "data": records, "next_after_id": next_after_id})
+    except Exception as e:
+        error_logger.log_error("ERROR", "list_reports", str(e), e)
+        return jsonify({"error": str(e)}), 500
+
 # 自主运维API - 自动修复尝试
 @app.route("/api/auto-repair", methods=["POST"])
 def auto_repair():
@@ -482,12 +794,16 @@ def auto_repair():
 # NFT市场API
 @app.route("/api/nft/products", methods=["GET"])
 def get_nft_products():
-    """获取NFT产品列表"""
+    """获取NFT产品列表（?sort=newest|rating|purchase_count&after_id= 键集分页；不含 script_content，详情见 /api/nft/product/<id>）"""
+    sort = request.args.get('sort', 'newest')
+    if sort not in ('newest', 'rating', 'purchase_count'):
+        return jsonify({"code": 1, "message": "sort 只能是 newest、rating 或 purchase_count"}), 400
     try:
         category = request.args.get('category')
-        limit = request.args.get('limit', 50, type=int)
-        products = nft_market.get_products(category=category, limit=limit)
-        return jsonify({"code": 0, "data": products})
+        limit = max(1, request.args.get('limit', 50, type=int))
+        products = nft_market.iter_products(category=category, limit=limit,
+                                            after_id=request.args.get('after_id', type=int), sort=sort)
+        return json_page_response(products, limit)
     except Exception as e:
         error_logger.log_error("ERROR", "get_nft_products", str(e), e)
         return jsonify({"error": str(e)}), 500
@@ -505,6 +821,37 @@ def get_nft_product(product_id):
         error_logger.log_error("ERROR", "get_nft_product", str(e), e)
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/nft/scripts/<script_hash>", methods=["GET"])
+def download_nft_script(script_hash):
+    """按内容哈希下载脚本正文（流式输出，支持 Range 请求；内容不可变，ETag 即哈希）"""
+    try:
+        if request.if_none_match.contains(script_hash):
+            return Response(status=304)
+        meta = BlobStore.stat(get_db_connection(), script_hash)
+        if meta is None:
+            return jsonify({"code": 1, "message": "脚本不存在"}), 404
+        size = meta['size']
+        start, stop, status = 0, size, 200
+        if request.range is not None:
+            byte_range = request.range.range_for_length(size)
+            if byte_range is None:
+                return Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+            start, stop = byte_range
+            status = 206
+        _, chunks = BlobStore.open_range(get_db_connection(), script_hash, start, stop)
+        response = Response(stream_with_context(chunks), status=status, mimetype='text/plain',
+                            headers={"Accept-Ranges": "bytes", "Content-Length": str(stop - start)})
+        if status == 206:
+            response.headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+        response.set_etag(script_hash)
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+        return response
+    except Exception as e:
+        error_logger.log_error("ERROR", "download_nft_script", str(e), e)
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/api/nft/order", methods=["POST"])
 def create_nft_order():
     """创建NFT订单"""
@@ -529,7 +876,10 @@ def create_nft_order():
 
 @app.route("/api/nft/payment", methods=["POST"])
 def process_payment():
-    """处理支付（模拟）"""
+    """
+    提交支付（异步）：登记后立即返回 202 与订单支付状态，后台 worker 完成支付，
+    客户端轮询 GET /api/nft/payment/<order_id>；Idempotency-Key 请求头（或 idempotency_key 字段）用于安全重试
+    """
     try:
         data = request.get_json() or {}
         order_id = data.get('order_id')
@@ -537,28 +887,43 @@ def process_payment():
         if not order_id:
             return jsonify({"code": 1, "message": "缺少订单ID"}), 400
         
-        # 模拟支付处理
-        import time
-        time.sleep(0.5)  # 模拟支付延迟
-        
-        success = nft_market.complete_payment(order_id)
-        if success:
-            return jsonify({"code": 0, "message": "支付成功", "data": {"order_id": order_id}})
-        else:
-            return jsonify({"code": 1, "message": "支付失败"}), 400
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        try:
+            status, _ = payment_processor.submit(order_id, idempotency_key)
+        except ValueError as e:
+            return jsonify({"code": 1, "message": str(e)}), 409
+        if status is None:
+            return jsonify({"code": 1, "message": "订单不存在"}), 404
+        if status['payment_status'] == 'paid':
+            return jsonify({"code": 0, "message": "支付成功", "data": status})
+        status['status_url'] = f"/api/nft/payment/{order_id}"
+        return jsonify({"code": 0, "message": "支付处理中", "data": status}), 202
     except Exception as e:
         error_logger.log_error("ERROR", "process_payment", str(e), e)
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/nft/payment/<order_id>", methods=["GET"])
+def get_payment_status(order_id):
+    """查询订单支付状态（pending / processing / paid / failed）"""
+    try:
+        status = nft_market.get_payment_status(order_id)
+        if status is None:
+            return jsonify({"code": 1, "message": "订单不存在"}), 404
+        return jsonify({"code": 0, "data": status})
+    except Exception as e:
+        error_logger.log_error("ERROR", "get_payment_status", str(e), e)
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/api/nft/user-methods", methods=["GET", "POST"])
 def user_methods():
     """获取或提交用户运维方法"""
     try:
         if request.method == 'GET':
             author_id = request.args.get('author_id')
-            limit = request.args.get('limit', 50, type=int)
-            methods = nft_market.get_user_methods(author_id=author_id, limit=limit)
-            return jsonify({"code": 0, "data": methods})
+            limit = max(1, request.args.get('limit', 50, type=int))
+            methods = nft_market.iter_user_methods(author_id=author_id, limit=limit,
+                                                   after_id=request.args.get('after_id', type=int))
+            return json_page_response(methods, limit)
         else:
             # POST - 提交新方法
             data = request.get_json() or {}
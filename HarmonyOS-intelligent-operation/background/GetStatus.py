@@ -1,33 +1,347 @@
+"""
+系统状态采集代理
+默认作为常驻代理运行：按固定间隔采样，在本地根据累计计数器计算 CPU / 网络增量，
+样本存入 array 实现的紧凑环形缓冲区，按批 gzip 压缩为 NDJSON 推送到
+/api/system-metrics/bulk；后端不可达时批次落盘暂存，恢复后按时间顺序补发。
+代理只依赖 psutil 与标准库，适合在 Dayu200 等开发板上与推理任务共存。
+
+用法:
+    python GetStatus.py --once                      # 打印一次系统状态（原有行为）
+    python GetStatus.py --url http://server:5000/api/system-metrics/bulk --interval 5
+环境变量: MONITOR_AGENT_URL / MONITOR_AGENT_HOST / MONITOR_AGENT_INTERVAL / MONITOR_AGENT_SPOOL
+"""
+import os
+import sys
+import gzip
+import time
+import random
+import signal
+import socket
+import logging
+import argparse
+import platform
+from array import array
+from urllib.parse import urlsplit
 import psutil
 
-# 资源指标
-cpu_times = psutil.cpu_times()
-cpu_counts = psutil.cpu_count()
-cpu_percent_list = []
-for i in range(cpu_counts):
-    cpu_percent_list.append(psutil.cpu_percent(i))
-mem = psutil.virtual_memory()
-memtotal = mem.total
-memfree = mem.free
-mempercent = mem.percent
-memused = mem.used
-disk_usage = psutil.disk_usage('/')
-disk_io = psutil.disk_io_counters()
-net_io = psutil.net_io_counters()
-
-# 业务指标
-users = psutil.users()
-
-print("System Status:")
-print("cpu时间：\t" + str(cpu_times))
-print("cpu占用率：共有" + str(len(cpu_percent_list)) + "个核心，占用率分别为：")
-for j, item in enumerate(cpu_percent_list):
-    print("核心" + str(j) + "的占用率为：\t" + str(item) + '%')
-print("内存总量：\t" + str(memtotal))
-print("内存占用率：\t" + str(mempercent) + "%")
-print("磁盘占用率：\t" + str(disk_usage))
-print("磁盘io：\t" + str(disk_io))
-print("网络io：\t" + str(net_io))
-print("用户信息：\t" + str(users))
-
-print("Finished!!!")
+logger = logging.getLogger("monitor_agent")
+
+DEFAULT_URL = "http://127.0.0.1:5000/api/system-metrics/bulk"
+DEFAULT_SPOOL_DIR = os.path.join(os.path.expanduser("~"), ".monitor_agent_spool")
+
+# 环形缓冲区每个样本的字段：时间戳, CPU%, 内存%, 磁盘%, 网络 KB/s
+FIELDS = ("ts", "cpu", "memory", "disk", "network")
+_LINE_FORMAT = '{"ts":%.3f,"cpu":%.2f,"memory":%.2f,"disk":%.2f,"network":%.2f}'
+
+
+def print_status():
+    """打印一次系统状态（原 GetStatus.py 的行为）"""
+    # 资源指标
+    cpu_times = psutil.cpu_times()
+    cpu_percent_list = psutil.cpu_percent(interval=0.5, percpu=True)
+    mem = psutil.virtual_memory()
+    disk_usage = psutil.disk_usage('/')
+    disk_io = psutil.disk_io_counters()
+    net_io = psutil.net_io_counters()
+
+    # 业务指标
+    users = psutil.users()
+
+    print("System Status:")
+    print("cpu时间：\t" + str(cpu_times))
+    print("cpu占用率：共有" + str(len(cpu_percent_list)) + "个核心，占用率分别为：")
+    for j, item in enumerate(cpu_percent_list):
+        print("核心" + str(j) + "的占用率为：\t" + str(item) + '%')
+    print("内存总量：\t" + str(mem.total))
+    print("内存占用率：\t" + str(mem.percent) + "%")
+    print("磁盘占用率：\t" + str(disk_usage))
+    print("磁盘io：\t" + str(disk_io))
+    print("网络io：\t" + str(net_io))
+    print("用户信息：\t" + str(users))
+
+    print("Finished!!!")
+
+
+class SampleRing:
+    """定长环形缓冲区：所有样本连续存放在一个 array('d') 中，满时覆盖最旧的样本"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.width = len(FIELDS)
+        self._data = array('d', bytes(8 * capacity * self.width))
+        self._start = 0
+        self.count = 0
+        self.overwritten = 0
+
+    def push(self, row):
+        if self.count == self.capacity:
+            self._start = (self._start + 1) % self.capacity
+            self.count -= 1
+            self.overwritten += 1
+        offset = ((self._start + self.count) % self.capacity) * self.width
+        self._data[offset:offset + self.width] = array('d', row)
+        self.count += 1
+
+    def drain(self, limit=None):
+        """按时间顺序取出并移除最多 limit 个样本"""
+        n = self.count if limit is None else min(limit, self.count)
+        rows = []
+        for i in range(n):
+            offset = ((self._start + i) % self.capacity) * self.width
+            rows.append(tuple(self._data[offset:offset + self.width]))
+        self._start = (self._start + n) % self.capacity
+        self.count -= n
+        return rows
+
+
+class Collector:
+    """根据累计计数器计算相邻两次采样之间的 CPU 利用率与网络速率"""
+
+    def __init__(self, disk_path='/'):
+        self.disk_path = disk_path
+        self._prev_cpu = self._cpu_counters()
+        self._prev_net = self._net_bytes()
+        self._prev_ts = time.time()
+
+    @staticmethod
+    def _cpu_counters():
+        times = psutil.cpu_times()
+        idle = times.idle + getattr(times, 'iowait', 0.0)
+        return sum(times), idle
+
+    @staticmethod
+    def _net_bytes():
+        net = psutil.net_io_counters()
+        return net.bytes_sent + net.bytes_recv
+
+    def sample(self):
+        now = time.time()
+        total, idle = self._cpu_counters()
+        prev_total, prev_idle = self._prev_cpu
+        busy_delta = (total - prev_total) - (idle - prev_idle)
+        cpu = 100.0 * busy_delta / (total - prev_total) if total > prev_total else 0.0
+
+        net_bytes = self._net_bytes()
+        elapsed = now - self._prev_ts
+        # 计数器回绕或网卡重置时按 0 处理
+        network = max(0, net_bytes - self._prev_net) / 1024 / elapsed if elapsed > 0 else 0.0
+
+        self._prev_cpu = (total, idle)
+        self._prev_net = net_bytes
+        self._prev_ts = now
+        return (now, min(100.0, max(0.0, cpu)), psutil.virtual_memory().percent,
+                psutil.disk_usage(self.disk_path).percent, network)
+
+
+class Spool:
+    """后端不可达时的批次落盘目录，文件名按纳秒时间戳排序，超过容量时删除最旧的批次"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.ndjson.gz'))
+
+    def put(self, body):
+        name = f"{time.time_ns()}.ndjson.gz"
+        tmp = os.path.join(self.directory, name + '.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, os.path.join(self.directory, name))
+        self._trim()
+
+    def _trim(self):
+        files = self.files()
+        sizes = [os.path.getsize(os.path.join(self.directory, name)) for name in files]
+        total = sum(sizes)
+        for name, size in zip(files, sizes):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+            logger.warning("暂存目录超过上限，丢弃最旧批次 %s", name)
+
+    def read(self, name):
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            return f.read()
+
+    def remove(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+
+class PushAgent:
+    """采样 -> 环形缓冲 -> 批量推送（失败退避 + 落盘暂存）"""
+
+    def __init__(self, url, host, interval=5.0, batch=12, capacity=720,
+                 spool_dir=DEFAULT_SPOOL_DIR, spool_max_bytes=8 * 1024 * 1024, timeout=10.0):
+        self.url = url
+        self.host = host
+        self.interval = interval
+        self.batch = batch
+        self.timeout = timeout
+        self.ring = SampleRing(capacity)
+        self.spool = Spool(spool_dir, spool_max_bytes)
+        self.collector = Collector()
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.stats = {"sent_rows": 0, "sent_batches": 0, "spooled": 0, "failed_posts": 0}
+        self._running = True
+
+    @staticmethod
+    def encode(rows):
+        body = "\n".join(_LINE_FORMAT % row for row in rows).encode()
+        return gzip.compress(body, compresslevel=6)
+
+    def post(self, body):
+        """
+        发送一个 gzip NDJSON 批次
+
+        Returns:
+            True 表示已被后端处理（含被后端拒收的数据，不再重试）；False 表示需要重试
+        """
+        headers = {
+            "Content-Type": "application/x-ndjson",
+            "Content-Encoding": "gzip",
+            "X-Host-Id": self.host,
+        }
+        try:
+            status = self._send(body, headers)
+        except OSError as e:
+            logger.warning("推送失败: %s", e)
+            return False
+        if 200 <= status < 300:
+            return True
+        if 400 <= status < 500 and status not in (408, 429):
+            logger.error("后端拒收批次 (HTTP %s)，丢弃", status)
+            return True
+        logger.warning("推送失败 (HTTP %s)", status)
+        return False
+
+    def _send(self, body, headers):
+        """
+        返回 HTTP 状态码；http 直接走 socket，避免加载 http.client/ssl/email（约 6MB 常驻内存），
+        https 才按需使用 urllib
+        """
+        url = urlsplit(self.url)
+        if url.scheme == 'https':
+            import urllib.error
+            import urllib.request
+            req = urllib.request.Request(self.url, data=body, method='POST', headers=headers)
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                    resp.read()
+                    return resp.status
+            except urllib.error.HTTPError as e:
+                return e.code
+            except urllib.error.URLError as e:
+                raise OSError(str(e.reason))
+
+        path = (url.path or '/') + (f"?{url.query}" if url.query else '')
+        head = [f"POST {path} HTTP/1.1", f"Host: {url.netloc}", f"Content-Length: {len(body)}",
+                "Connection: close"] + [f"{k}: {v}" for k, v in headers.items()]
+        request = ("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body
+        with socket.create_connection((url.hostname, url.port or 80), timeout=self.timeout) as sock:
+            sock.sendall(request)
+            reader = sock.makefile('rb')
+            status_line = reader.readline(1024).split()
+            # 读完响应，避免服务端在发送途中收到 RST
+            while reader.read(65536):
+                pass
+        if len(status_line) < 2 or not status_line[1].isdigit():
+            raise OSError("无效的 HTTP 响应")
+        return int(status_line[1])
+
+    def _backoff(self):
+        self.failures += 1
+        self.stats["failed_posts"] += 1
+        delay = min(300.0, self.interval * (2 ** min(self.failures, 10)))
+        self.next_attempt = time.monotonic() + delay * random.uniform(0.5, 1.0)
+
+    def flush(self, force=False):
+        """推送暂存批次和缓冲区中的样本；退避期间只把满批样本落盘"""
+        if not force and self.ring.count < self.batch:
+            return
+        if time.monotonic() < self.next_attempt:
+            while self.ring.count >= self.batch:
+                self.spool.put(self.encode(self.ring.drain(self.batch)))
+                self.stats["spooled"] += 1
+            return
+
+        # 先补发暂存的旧批次，保证时间顺序
+        for name in self.spool.files():
+            if not self.post(self.spool.read(name)):
+                self._backoff()
+                self.flush(force=False)
+                return
+            self.spool.remove(name)
+            self.stats["sent_batches"] += 1
+
+        while self.ring.count and (force or self.ring.count >= self.batch):
+            rows = self.ring.drain(self.batch)
+            body = self.encode(rows)
+            if not self.post(body):
+                self.spool.put(body)
+                self.stats["spooled"] += 1
+                self._backoff()
+                return
+            self.failures = 0
+            self.stats["sent_rows"] += len(rows)
+            self.stats["sent_batches"] += 1
+
+    def stop(self, *_):
+        self._running = False
+
+    def run(self, duration=None):
+        """主循环：按 interval 对齐采样，duration 秒后退出（None 表示一直运行）"""
+        started = time.monotonic()
+        next_tick = started
+        while self._running and (duration is None or time.monotonic() - started < duration):
+            next_tick += self.interval
+            self.ring.push(self.collector.sample())
+            self.flush()
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+        # 退出前尽量推送剩余样本，失败则落盘
+        self.next_attempt = 0.0
+        self.flush(force=True)
+        while self.ring.count:
+            self.spool.put(self.encode(self.ring.drain(self.batch)))
+            self.stats["spooled"] += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="系统状态采集代理")
+    parser.add_argument("--once", action="store_true", help="只打印一次系统状态后退出")
+    parser.add_argument("--url", default=os.environ.get("MONITOR_AGENT_URL", DEFAULT_URL))
+    parser.add_argument("--host", default=os.environ.get("MONITOR_AGENT_HOST", platform.node()))
+    parser.add_argument("--interval", type=float, default=float(os.environ.get("MONITOR_AGENT_INTERVAL", 5)),
+                        help="采样间隔（秒）")
+    parser.add_argument("--batch", type=int, default=12, help="每批推送的样本数")
+    parser.add_argument("--capacity", type=int, default=720, help="内存环形缓冲区容量（样本数）")
+    parser.add_argument("--spool-dir", default=os.environ.get("MONITOR_AGENT_SPOOL", DEFAULT_SPOOL_DIR))
+    parser.add_argument("--spool-max-mb", type=float, default=8, help="暂存目录容量上限（MB）")
+    parser.add_argument("--duration", type=float, default=None, help="运行指定秒数后退出（调试用）")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.once:
+        print_status()
+        return
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    agent = PushAgent(args.url, args.host, interval=args.interval, batch=args.batch,
+                      capacity=args.capacity, spool_dir=args.spool_dir,
+                      spool_max_bytes=int(args.spool_max_mb * 1024 * 1024))
+    signal.signal(signal.SIGTERM, agent.stop)
+    signal.signal(signal.SIGINT, agent.stop)
+    agent.run(args.duration)
+    logger.info("代理退出: %s", agent.stats)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,287 @@
+"""
+运行时指标（OpenMetrics / Prometheus）
+计数器、直方图与加减型 Gauge 都按线程分片：每个线程只写自己的分片字典，热路径上没有锁，
+/metrics 抓取时再把所有分片合并输出；已退出线程的分片并入基础分片后移除（线程式服务器每个连接一个线程，
+分片数只与存活线程数相关）。install(app) 为 Flask 注册按路由统计的请求钩子
+"""
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# 请求延迟桶（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# SQL / psutil 调用耗时桶（秒）
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Registry:
+    """指标注册表：持有全部指标与所有线程的分片"""
+
+    def __init__(self):
+        self._metrics = []
+        self._callbacks = []
+        # [(线程, 分片)]；已退出线程的计数并入 _base
+        self._shards = []
+        self._base = {}
+        self._shards_lock = threading.Lock()
+        self._local = threading.local()
+
+    def shard(self):
+        """当前线程的分片（首次访问时注册，仅此一次加锁）"""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._reap()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _reap(self):
+        """把已退出线程的分片并入基础分片并移除（调用方持有 _shards_lock）"""
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+                continue
+            for metric, series in shard.items():
+                merged = self._base.setdefault(metric, {})
+                for labels, value in series.items():
+                    metric._merge(merged, labels, value)
+        self._shards = alive
+
+    def _all_shards(self):
+        with self._shards_lock:
+            self._reap()
+            # 基础分片在锁外合并时可能被并发回收修改，输出副本
+            base = {metric: {labels: list(value) if isinstance(value, list) else value
+                             for labels, value in series.items()}
+                    for metric, series in self._base.items()}
+            return [base] + [shard for _, shard in self._shards]
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def register_callback(self, name, documentation, metric_type, fn, labelnames=()):
+        """
+        注册抓取时计算的指标
+
+        Args:
+            metric_type: gauge / counter
+            fn: callable() -> [(标签值元组, 数值)]
+        """
+        self._callbacks.append((name, documentation, metric_type, tuple(labelnames), fn))
+
+    def render(self):
+        """合并所有分片，输出 OpenMetrics 文本"""
+        shards = self._all_shards()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(shards))
+        for name, documentation, metric_type, labelnames, fn in self._callbacks:
+            try:
+                samples = fn()
+            except Exception:
+                continue
+            suffix = '_total' if metric_type == 'counter' else ''
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.append(f'# HELP {name} {documentation}')
+            for labels, value in samples:
+                lines.append(f'{name}{suffix}{_format_labels(labelnames, labels)} {_format_value(value)}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, registry, name, documentation, labelnames):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _merged(self, shards):
+        merged = {}
+        for shard in shards:
+            series = shard.get(self)
+            if series:
+                for labels, value in list(series.items()):
+                    self._merge(merged, labels, value)
+        return merged
+
+    def _header(self):
+        return [f'# TYPE {self.name} {self.metric_type}', f'# HELP {self.name} {self.documentation}']
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    metric_type = 'counter'
+
+    def inc(self, labels=(), value=1):
+        series = self.registry.shard().setdefault(self, {})
+        series[labels] = series.get(labels, 0) + value
+
+    @staticmethod
+    def _merge(merged, labels, value):
+        merged[labels] = merged.get(labels, 0) + value
+
+    def value(self, labels=()):
+        return self._merged(self.registry._all_shards()).get(labels, 0)
+
+    def render(self, shards):
+        lines = self._header()
+        for labels, value in sorted(self._merged(shards).items()):
+            lines.append(f'{self.name}_total{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    """可加减的 Gauge（如进行中的请求数）：各分片的增减量求和"""
+    metric_type = 'gauge'
+
+    def dec(self, labels=(), value=1):
+        self.inc(labels, -value)
+
+    def render(self, shards):
+        lines = self._header()
+        for labels, value in sorted(self._merged(shards).items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    """累积直方图：每个分片按标签保存 [各桶计数..., 总和, 总数]"""
+    metric_type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames, buckets):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        series = self.registry.shard().setdefault(self, {})
+        state = series.get(labels)
+        if state is None:
+            state = series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        # 非累积计数，输出时再累加
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    @contextmanager
+    def time(self, labels=()):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, labels)
+
+    @staticmethod
+    def _merge(merged, labels, state):
+        current = merged.get(labels)
+        if current is None:
+            merged[labels] = list(state)
+        else:
+            for i, v in enumerate(state):
+                current[i] += v
+
+    def render(self, shards):
+        lines = self._header()
+        for labels, state in sorted(self._merged(shards).items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_count{label_text} {state[-1]}')
+            lines.append(f'{self.name}_sum{label_text} {_format_value(state[-2])}')
+        return lines
+
+
+# ---------------------------------------------------------------- 全局指标
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'monitor_http_requests', 'HTTP requests by route, method and status', ('route', 'method', 'status'))
+HTTP_LATENCY = REGISTRY.histogram(
+    'monitor_http_request_duration_seconds', 'HTTP request latency by route', ('route', 'method'))
+HTTP_IN_FLIGHT = REGISTRY.gauge('monitor_http_requests_in_flight', 'HTTP requests currently being served')
+SQL_LATENCY = REGISTRY.histogram(
+    'monitor_sqlite_query_duration_seconds', 'SQLite statement execution time by operation',
+    ('operation',), FAST_BUCKETS)
+PSUTIL_LATENCY = REGISTRY.histogram(
+    'monitor_psutil_collect_duration_seconds', 'psutil collection time by collector',
+    ('collector',), FAST_BUCKETS)
+ERRORS = REGISTRY.counter('monitor_errors', 'Errors logged through ErrorLogger by level and module',
+                          ('level', 'module'))
+
+
+def sql_operation(sql):
+    """SQL 语句的首个关键字（SELECT / INSERT / ...），用作低基数标签"""
+    head = sql.lstrip()[:10].split(None, 1)
+    return head[0].upper() if head else 'OTHER'
+
+
+def install(app):
+    """为 Flask 应用注册请求计时钩子与 /metrics 接口"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+
+    @app.after_request
+    def _metrics_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(exc):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return
+        HTTP_IN_FLIGHT.dec()
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        status = 500 if exc is not None else g.pop('_metrics_status', 500)
+        HTTP_LATENCY.observe(time.perf_counter() - started, (route, request.method))
+        HTTP_REQUESTS.inc((route, request.method, str(status)))
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+    return app
@@ -0,0 +1,416 @@
+"""
+错误日志归档
+ErrorLogger 的按天日志文件超过大小上限（MONITOR_LOG_MAX_BYTES）或跨天时轮转到 logs/archive/，
+由后台线程压缩为 .gz（安装了 zstandard 时为 .zst）。压缩按条目对齐分块进行，每块是一个独立的
+gzip member / zstd frame（拼接后仍是合法文件，zcat / zstdcat 可直接查看），
+同名 .idx 旁路索引记录每条日志的 (时间, 级别, 模块) 与所在块的字节偏移，
+检索时只解压命中的块，不需要解压整个归档
+
+多进程部署（gunicorn -w N）时各 worker 共用按天日志文件：写入方持共享锁写入并在锁内确认文件未被轮转
+（已轮转则重新打开），轮转持排他锁（archive/.rotate.lock 上的 fcntl.flock）；压缩前先把文件原子地
+重命名为 <名称>.<pid>.compressing 认领，同一文件只会被一个进程压缩
+
+命令行:
+    python LogArchive.py search [--from 时间] [--to 时间] [--level ERROR] [--module Flask] [--limit 50]
+    python LogArchive.py list
+    python LogArchive.py compress      # 立即轮转并压缩所有非当天的日志文件
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import queue
+import zlib
+import argparse
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 上没有 fcntl，只支持单进程写日志
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 单个未压缩日志文件的大小上限（字节），超过后轮转
+MAX_BYTES = int(os.environ.get('MONITOR_LOG_MAX_BYTES', 10 * 1024 * 1024))
+# 压缩块的目标大小（未压缩字节数），越小随机读取越快、压缩率越低
+BLOCK_SIZE = 64 * 1024
+# 压缩算法：auto（有 zstandard 用 zstd，否则 gzip）/ gzip / zstd
+CODEC = os.environ.get('MONITOR_LOG_CODEC', 'auto')
+
+INDEX_VERSION = 1
+_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+_ENTRY_HEADER = re.compile(r'^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] \[([^\]]*)\] \[([^\]]*)\] ')
+_SEPARATOR = '-' * 80
+_DAY_FILE = re.compile(r'^error_(\d{8})\.log$')
+# 压缩中的认领文件 / 临时文件：<名称>.<pid>.compressing、<名称>.<pid>.tmp
+_OWNED_FILE = re.compile(r'^(.+)\.(\d+)\.(compressing|tmp)$')
+# 无法确认属主进程是否存活时，临时文件超过该秒数未修改视为中断遗留
+STALE_SECONDS = 3600
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def resolve_codec(codec=None):
+    codec = codec or CODEC
+    if codec == 'auto':
+        return 'zstd' if zstandard is not None else 'gzip'
+    if codec == 'zstd' and zstandard is None:
+        raise ValueError("MONITOR_LOG_CODEC=zstd 需要安装 zstandard")
+    if codec not in _EXTENSIONS:
+        raise ValueError(f"不支持的压缩算法: {codec}")
+    return codec
+
+
+def _compress_block(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _decompress_block(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data, wbits=31)
+
+
+def _iter_entries(path):
+    """
+    按条目切分日志文件，返回 (timestamp, level, module, 原始字节) 迭代器
+
+    条目以 "[时间] [级别] [模块] " 开头、以 80 个 "-" 的分隔行结束；
+    首个条目之前的内容（文件头中的系统信息）作为 timestamp 为 None 的条目返回
+    """
+    current = []
+    meta = (None, None, None)
+    with open(path, 'rb') as f:
+        for raw in f:
+            line = raw.decode('utf-8', errors='replace')
+            match = _ENTRY_HEADER.match(line)
+            if match:
+                # 新条目开始：之前未以分隔行结束的内容（文件头、被截断的条目）单独成条
+                if current:
+                    yield meta + (b''.join(current),)
+                    current = []
+                meta = match.groups()
+            current.append(raw)
+            if line.rstrip('\r\n') == _SEPARATOR:
+                yield meta + (b''.join(current),)
+                current = []
+                meta = (None, None, None)
+    if current:
+        yield meta + (b''.join(current),)
+
+
+class LogArchiver:
+    """日志轮转、后台分块压缩与基于旁路索引的检索"""
+
+    def __init__(self, log_dir, archive_dir=None, codec=None, block_size=BLOCK_SIZE):
+        self.log_dir = log_dir
+        self.archive_dir = archive_dir or os.path.join(log_dir, 'archive')
+        self.codec = resolve_codec(codec)
+        self.block_size = block_size
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    # ------------------------------------------------------------ 轮转与压缩
+
+    @contextmanager
+    def lock(self, shared=False):
+        """
+        跨进程轮转锁：写日志持共享锁，轮转持排他锁
+
+        每次加锁单独打开锁文件（flock 按打开的文件描述加锁，同一进程内的不同线程也互斥）
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.archive_dir, '.rotate.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def rotate(self, path, min_bytes=0):
+        """
+        把日志文件移入归档目录并排队压缩，返回移动后的路径
+
+        在排他锁内执行：文件小于 min_bytes（其他进程已轮转、当前是新文件）时不处理；
+        仍持有旧文件句柄的写入方在共享锁内发现文件已被移走后重新打开，不会再写入已移走的文件
+        """
+        with self.lock():
+            if not os.path.exists(path):
+                return None
+            size = os.path.getsize(path)
+            if size == 0:
+                os.remove(path)
+                return None
+            if size < min_bytes:
+                return None
+            base = os.path.splitext(os.path.basename(path))[0]
+            names = os.listdir(self.archive_dir)
+            seq = 0
+            while any(name.startswith(f"{base}_{seq:03d}.log") for name in names):
+                seq += 1
+            staged = os.path.join(self.archive_dir, f"{base}_{seq:03d}.log")
+            os.replace(path, staged)
+        self.submit(staged)
+        return staged
+
+    def submit(self, staged):
+        """排队压缩（后台线程首次提交时启动）"""
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._worker_loop, name="log-archiver", daemon=True)
+                self._worker.start()
+        self._queue.put(staged)
+
+    def _worker_loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is not None:
+                    self.compress(item)
+            except Exception:
+                traceback.print_exc(file=sys.stderr)
+            finally:
+                self._queue.task_done()
+
+    def wait(self, timeout=30.0):
+        """等待已排队的压缩任务完成"""
+        if self._worker is None or not self._worker.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def compress(self, staged):
+        """
+        分块压缩一个已轮转的日志文件并写出旁路索引，成功后删除原文件；文件已被其他进程认领时返回 None
+
+        索引为 JSON 行：首行是头信息（版本、算法、时间范围），
+        之后每条日志一行 [timestamp, level, module, 块偏移, 块长度, 块内偏移, 条目长度]
+        """
+        # 认领：重命名成功的进程负责压缩，其他进程（重复排队、并发 sweep）直接跳过
+        claimed = f"{staged}.{os.getpid()}.compressing"
+        try:
+            os.rename(staged, claimed)
+        except FileNotFoundError:
+            return None
+        archive_path = staged + _EXTENSIONS[self.codec]
+        index_path = archive_path + '.idx'
+        tmp_suffix = f".{os.getpid()}.tmp"
+        entries = []
+        block = []
+        block_bytes = 0
+        offset = 0
+        first_ts = last_ts = None
+
+        with open(archive_path + tmp_suffix, 'wb') as out:
+            def flush_block():
+                nonlocal block, block_bytes, offset
+                if not block:
+                    return
+                data = _compress_block(self.codec, b''.join(raw for _, raw in block))
+                out.write(data)
+                pos = 0
+                for meta, raw in block:
+                    if meta[0] is not None:
+                        entries.append(list(meta) + [offset, len(data), pos, len(raw)])
+                    pos += len(raw)
+                offset += len(data)
+                block, block_bytes = [], 0
+
+            for timestamp, level, module, raw in _iter_entries(claimed):
+                block.append(((timestamp, level, module), raw))
+                block_bytes += len(raw)
+                if timestamp is not None:
+                    first_ts = timestamp if first_ts is None else min(first_ts, timestamp)
+                    last_ts = timestamp if last_ts is None else max(last_ts, timestamp)
+                if block_bytes >= self.block_size:
+                    flush_block()
+            flush_block()
+
+        header = {"version": INDEX_VERSION, "codec": self.codec, "source": os.path.basename(staged),
+                  "entries": len(entries), "first": first_ts, "last": last_ts,
+                  "raw_bytes": os.path.getsize(claimed), "compressed_bytes": offset}
+        with open(index_path + tmp_suffix, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header, ensure_ascii=False) + '\n')
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        # 先发布归档，再发布索引：存在 .idx 即表示该归档完整可用
+        os.replace(archive_path + tmp_suffix, archive_path)
+        os.replace(index_path + tmp_suffix, index_path)
+        os.remove(claimed)
+        return archive_path
+
+    def sweep(self, active_day=None):
+        """
+        启动时的补偿处理：清理属主进程已退出的临时文件、收回其未完成的认领，
+        轮转非当天的日志文件，并压缩归档目录中尚未压缩的文件。
+        多个 worker 同时启动时可并发执行：其他存活进程的临时文件不受影响，同一文件只会被一个进程压缩
+        """
+        active_day = active_day or datetime.now().strftime('%Y%m%d')
+        now = time.time()
+        for name in os.listdir(self.archive_dir):
+            match = _OWNED_FILE.match(name)
+            if not match:
+                continue
+            path = os.path.join(self.archive_dir, name)
+            alive = _pid_alive(int(match.group(2)))
+            try:
+                if alive or (alive is None and now - os.path.getmtime(path) < STALE_SECONDS):
+                    continue
+                if match.group(3) == 'tmp':
+                    os.remove(path)
+                else:
+                    # 压缩中断：退回待压缩状态（rename 失败说明已被其他进程收回）
+                    os.rename(path, os.path.join(self.archive_dir, match.group(1)))
+            except FileNotFoundError:
+                pass
+        for name in sorted(os.listdir(self.archive_dir)):
+            path = os.path.join(self.archive_dir, name)
+            if name.endswith('.log'):
+                # 压缩完成但原文件未删除（索引已存在）时直接删除原文件
+                if any(os.path.exists(path + ext + '.idx') for ext in _EXTENSIONS.values()):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                else:
+                    self.submit(path)
+        for name in sorted(os.listdir(self.log_dir)):
+            match = _DAY_FILE.match(name)
+            if match and match.group(1) < active_day:
+                self.rotate(os.path.join(self.log_dir, name))
+
+    # ------------------------------------------------------------ 检索
+
+    def archives(self):
+        """已完成的归档列表（含索引头信息），按文件名排序"""
+        result = []
+        for name in sorted(os.listdir(self.archive_dir)):
+            if not name.endswith('.idx'):
+                continue
+            with open(os.path.join(self.archive_dir, name), encoding='utf-8') as f:
+                header = json.loads(f.readline())
+            header["archive"] = name[:-4]
+            result.append(header)
+        return result
+
+    def search(self, start=None, end=None, level=None, module=None, limit=100):
+        """
+        检索归档中的日志条目（时间升序）
+
+        Args:
+            start / end: 'YYYY-MM-DD HH:MM:SS' 格式的时间范围（闭区间），可只给前缀
+            level / module: 精确匹配
+            limit: 最多返回条数
+        Returns:
+            [{"timestamp", "level", "module", "archive", "text"}]
+        """
+        # end 可以是前缀（如 '2025-11-08'），补一个最大字符使其包含该前缀下的所有时间
+        end_key = end + '\uffff' if end else None
+        results = []
+        for header in self.archives():
+            if header["first"] is None:
+                continue
+            if (start and header["last"] < start) or (end_key and header["first"] > end_key):
+                continue
+            matches = []
+            with open(os.path.join(self.archive_dir, header["archive"] + '.idx'), encoding='utf-8') as f:
+                f.readline()
+                for line in f:
+                    ts, lv, mod, block_off, block_len, pos, length = json.loads(line)
+                    if (start and ts < start) or (end_key and ts > end_key):
+                        continue
+                    if (level and lv != level) or (module and mod != module):
+                        continue
+                    matches.append((ts, lv, mod, block_off, block_len, pos, length))
+                    if len(results) + len(matches) >= limit:
+                        break
+            if matches:
+                results.extend(self._read_entries(header, matches))
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+    def _read_entries(self, header, matches):
+        """按块读取命中条目：每个块只读取与解压一次"""
+        blocks = {}
+        entries = []
+        with open(os.path.join(self.archive_dir, header["archive"]), 'rb') as f:
+            for ts, lv, mod, block_off, block_len, pos, length in matches:
+                data = blocks.get(block_off)
+                if data is None:
+                    f.seek(block_off)
+                    data = blocks[block_off] = _decompress_block(header["codec"], f.read(block_len))
+                entries.append({
+                    "timestamp": ts,
+                    "level": lv,
+                    "module": mod,
+                    "archive": header["archive"],
+                    "text": data[pos:pos + length].decode('utf-8', errors='replace')
+                })
+        return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="错误日志归档检索")
+    parser.add_argument("--log-dir", default=os.environ.get('MONITOR_LOG_DIR')
+                        or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs'))
+    sub = parser.add_subparsers(dest="command", required=True)
+    search = sub.add_parser("search", help="按时间/级别/模块检索归档日志")
+    search.add_argument("--from", dest="start")
+    search.add_argument("--to", dest="end")
+    search.add_argument("--level")
+    search.add_argument("--module")
+    search.add_argument("--limit", type=int, default=50)
+    sub.add_parser("list", help="列出归档及其时间范围")
+    sub.add_parser("compress", help="轮转并压缩所有非当天的日志文件")
+    args = parser.parse_args()
+
+    archiver = LogArchiver(args.log_dir)
+    if args.command == "compress":
+        started = time.perf_counter()
+        archiver.sweep()
+        archiver.wait(timeout=3600)
+        print(f"完成，用时 {time.perf_counter() - started:.2f}s")
+    elif args.command == "list":
+        for a in archiver.archives():
+            ratio = a["compressed_bytes"] / a["raw_bytes"] if a["raw_bytes"] else 0
+            print(f"{a['archive']:40s} {a['entries']:7d} 条  {a['first']} ~ {a['last']}  "
+                  f"{a['raw_bytes']:>10d} -> {a['compressed_bytes']:>9d} ({ratio:.1%})")
+    else:
+        for entry in archiver.search(args.start, args.end, args.level, args.module, args.limit):
+            sys.stdout.write(f"# {entry['archive']}\n{entry['text']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+远程主机指标批量上报
+POST /api/system-metrics/bulk 接收 NDJSON 或 msgpack（可 gzip 压缩）批次，
+按列转换为 NumPy 数组做向量化校验，合法行通过 MetricStore.insert_many 单事务写入，
+并交给 AnomalyDetector 按主机检测异常
+
+每条记录: {"ts": Unix秒, "cpu": %, "memory": %, "disk": %, "network": KB/s}
+ts 缺省为服务器当前时间；四个指标至少提供一个，取值必须是 JSON / msgpack 数值（布尔与数字字符串拒收）
+"""
+import re
+import json
+import time
+import zlib
+import numpy as np
+from MetricStore import METRIC_COLUMNS, RAW_RETENTION
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 解压后的请求体上限与单批行数上限
+MAX_BODY_BYTES = 32 * 1024 * 1024
+MAX_BATCH_ROWS = 100000
+# 允许的时钟偏差（秒）：晚于服务器时间超过该值的样本拒收
+MAX_CLOCK_SKEW = 300
+# 每个指标的合法范围
+METRIC_RANGES = {
+    'cpu': (0.0, 100.0),
+    'memory': (0.0, 100.0),
+    'disk': (0.0, 100.0),
+    'network': (0.0, np.inf),
+}
+# 响应中最多列出的拒收明细条数
+MAX_REPORTED_ERRORS = 20
+
+_HOST_PATTERN = re.compile(r'^[\w.:-]{1,64}$')
+_MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+_ENCODINGS = ('', 'identity', 'gzip', 'x-gzip', 'deflate')
+_NUMERIC_TYPES = (int, float, type(None))
+
+
+class IngestError(ValueError):
+    """请求体整体无法解析（对应 4xx），status_code 为建议的 HTTP 状态码"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def validate_host(host):
+    """校验主机标识：1~64 位字母、数字、下划线、点、冒号或连字符"""
+    if not host or not _HOST_PATTERN.match(host):
+        raise IngestError("缺少或非法的主机标识（X-Host-Id 请求头或 host 参数）")
+    return host
+
+
+def decompress(body, content_encoding=None):
+    """按 Content-Encoding（或 gzip 魔数）解压，限制解压后大小；不支持的编码返回 415"""
+    encoding = (content_encoding or '').strip().lower()
+    if encoding not in _ENCODINGS:
+        raise IngestError(f"不支持的 Content-Encoding: {content_encoding}（仅支持 gzip / deflate）", 415)
+    if encoding in ('', 'identity') and body[:2] != b'\x1f\x8b':
+        if len(body) > MAX_BODY_BYTES:
+            raise IngestError("请求体过大", 413)
+        return body
+    wbits = 16 + zlib.MAX_WBITS if encoding != 'deflate' else zlib.MAX_WBITS
+    decoder = zlib.decompressobj(wbits)
+    try:
+        data = decoder.decompress(body, MAX_BODY_BYTES)
+    except zlib.error as e:
+        raise IngestError(f"解压失败: {e}")
+    if decoder.unconsumed_tail:
+        raise IngestError("解压后的请求体过大", 413)
+    return data
+
+
+def decode_records(data, content_type=None):
+    """
+    解析批次为记录列表
+
+    Returns:
+        (records, rejected)：records 为 (行号, dict)，rejected 为无法解析的 (行号, 原因)
+    """
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+    records = []
+    rejected = []
+    if mimetype in _MSGPACK_TYPES:
+        if msgpack is None:
+            raise IngestError("服务器未安装 msgpack，请改用 NDJSON", 415)
+        try:
+            unpacker = msgpack.Unpacker(raw=False, max_buffer_size=MAX_BODY_BYTES)
+            unpacker.feed(data)
+            items = list(unpacker)
+        except Exception as e:
+            raise IngestError(f"msgpack 解析失败: {e}")
+        # 既支持一个数组，也支持连续的多个 map
+        if len(items) == 1 and isinstance(items[0], list):
+            items = items[0]
+        for lineno, item in enumerate(items, 1):
+            if isinstance(item, dict):
+                records.append((lineno, item))
+            else:
+                rejected.append((lineno, "记录必须是 map"))
+    else:
+        for lineno, line in enumerate(data.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                rejected.append((lineno, "JSON 解析失败"))
+                continue
+            if isinstance(item, dict):
+                records.append((lineno, item))
+            else:
+                rejected.append((lineno, "记录必须是 JSON 对象"))
+    if len(records) + len(rejected) > MAX_BATCH_ROWS:
+        raise IngestError(f"单批最多 {MAX_BATCH_ROWS} 行", 413)
+    return records, rejected
+
+
+def _column(records, key):
+    """把某个字段取成 float 数组，缺失为 NaN；非数值（含布尔与数字字符串）为 inf 以便统一判为非法"""
+    values = [r.get(key) for _, r in records]
+    # JSON / msgpack 解出的数值只有 int / float；bool 是 int 的子类、"12" 能被 float() 转换，都不能走整列转换
+    if all(type(v) in _NUMERIC_TYPES for v in values):
+        return np.array([np.nan if v is None else v for v in values], dtype=float)
+    out = np.empty(len(values))
+    for i, v in enumerate(values):
+        if v is None:
+            out[i] = np.nan
+        elif type(v) in _NUMERIC_TYPES:
+            out[i] = v
+        else:
+            out[i] = np.inf
+    return out
+
+
+def validate_records(records, now=None):
+    """
+    向量化校验
+
+    Returns:
+        (rows, rejected)：rows 为可直接传给 MetricStore.insert_many 的
+        (cpu, memory, disk, network, ts) 列表，rejected 为 (行号, 原因)
+    """
+    if not records:
+        return [], []
+    now = time.time() if now is None else now
+    ts = _column(records, 'ts')
+    ts = np.where(np.isnan(ts), now, ts)
+    reasons = np.full(len(records), '', dtype=object)
+
+    bad_ts = ~np.isfinite(ts) | (ts < now - RAW_RETENTION) | (ts > now + MAX_CLOCK_SKEW)
+    reasons[bad_ts] = "ts 超出保留期或晚于服务器时间"
+
+    columns = []
+    present = np.zeros(len(records), dtype=bool)
+    for m in METRIC_COLUMNS:
+        col = _column(records, m)
+        low, high = METRIC_RANGES[m]
+        missing = np.isnan(col)
+        bad = ~missing & ~((col >= low) & (col <= high))
+        reasons[bad & (reasons == '')] = f"{m} 超出范围或不是数值"
+        present |= ~missing
+        columns.append(col)
+    reasons[~present & (reasons == '')] = "至少需要一个指标"
+
+    ok = reasons == ''
+    stacked = np.column_stack(columns + [ts])[ok]
+    rows = [tuple(None if np.isnan(v) else v for v in row[:4]) + (row[4],) for row in stacked.tolist()]
+    rejected = [(records[i][0], reasons[i]) for i in np.nonzero(~ok)[0]]
+    return rows, rejected
+
+
+def ingest(metric_store, body, host, content_type=None, content_encoding=None, anomaly_detector=None):
+    """
+    解码、校验并写入一个批次，写入的样本再交给 anomaly_detector（若提供）做异常检测
+
+    Returns:
+        {"accepted", "rejected", "errors": [{"line", "reason"}]}
+    Raises:
+        IngestError: 主机标识非法或请求体整体无法解析
+    """
+    host = validate_host(host)
+    data = decompress(body, content_encoding)
+    records, rejected = decode_records(data, content_type)
+    rows, invalid = validate_records(records)
+    rejected += invalid
+    accepted = metric_store.insert_many(rows, host=host) if rows else 0
+    if rows and anomaly_detector is not None:
+        anomaly_detector.observe_rows(host, rows)
+    rejected.sort()
+    return {
+        "host": host,
+        "accepted": accepted,
+        "rejected": len(rejected),
+        "errors": [{"line": line, "reason": reason} for line, reason in rejected[:MAX_REPORTED_ERRORS]]
+    }
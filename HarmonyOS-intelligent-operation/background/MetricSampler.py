@@ -0,0 +1,220 @@
+"""
+后台指标采样模块
+由单个采样线程按固定间隔采集CPU/内存/磁盘/网络数据并写入内存环形缓冲区，
+接口直接读取最新快照，不再在请求线程中阻塞调用 psutil.cpu_percent(interval=1)。
+多进程部署（gunicorn -w N）时每个 worker 都采样（各自的接口和推送需要最新快照），但写库的监听器
+（add_listener(..., leader_only=True)）只在持有主机级文件锁（fcntl.flock）的一个进程中调用，
+该进程退出后由其他进程在下一次采样时接替
+"""
+import os
+import sys
+import time
+import threading
+import traceback
+import psutil
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 上没有 fcntl，只支持单进程部署，始终视为主采样进程
+    fcntl = None
+from collections import deque
+from ReturnData import collect_monitor_snapshot
+from Instrumentation import PSUTIL_LATENCY
+
+# 虚拟块设备不计入磁盘IO利用率
+_VIRTUAL_DISK_PREFIXES = ('loop', 'ram', 'zram', 'dm-')
+
+
+class MetricSampler:
+    """后台系统指标采样器"""
+
+    def __init__(self, interval=None, capacity=None, leader_lock=None):
+        """
+        Args:
+            leader_lock: 主采样进程选举用的锁文件路径；None 表示不选举（本进程始终执行全部监听器）
+        """
+        self.interval = float(interval or os.environ.get('MONITOR_SAMPLE_INTERVAL', 2.0))
+        self.capacity = int(capacity or os.environ.get('MONITOR_SAMPLE_CAPACITY', 300))
+        # TCP连接数、进程数、温度开销较大，每 slow_every 次采样刷新一次
+        self.slow_every = max(1, int(os.environ.get('MONITOR_SLOW_SAMPLE_EVERY', 5)))
+        self._buffer = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._listeners = []
+        self.leader_lock = leader_lock
+        self._leader_file = None
+        self._prev_net = None
+        self._prev_disk = None
+        self._slow_data = {}
+        self._seq = 0
+
+    def start(self):
+        """启动采样线程（重复调用安全）"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="metric-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """停止采样线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def add_listener(self, callback, leader_only=False):
+        """
+        注册采样回调，每个新快照采集完成后以 callback(snapshot) 调用
+
+        Args:
+            leader_only: 只在主采样进程中调用（写入数据库等每台主机只应执行一次的处理）
+        """
+        self._listeners.append((callback, leader_only))
+
+    def is_leader(self):
+        """本进程是否为主采样进程：未持有锁时以非阻塞方式尝试获取（原持有进程退出后锁自动释放）"""
+        if self.leader_lock is None or fcntl is None or self._leader_file is not None:
+            return True
+        f = open(self.leader_lock, 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._leader_file = f
+        return True
+
+    def _run(self):
+        # 首次调用 cpu_percent(interval=None) 只建立基线，结果无意义
+        collect_monitor_snapshot(cpu_interval=None)
+        self._stop_event.wait(min(self.interval, 0.5))
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.sample_once()
+            except Exception:
+                # 偶发的 psutil / /proc 读取失败只丢弃本次样本，采样线程继续运行
+                traceback.print_exc(file=sys.stderr)
+            elapsed = time.monotonic() - started
+            self._stop_event.wait(max(0.0, self.interval - elapsed))
+
+    def sample_once(self):
+        """采集一次快照并写入环形缓冲区"""
+        with PSUTIL_LATENCY.time(("snapshot",)):
+            snapshot = collect_monitor_snapshot(cpu_interval=None)
+        sampled_at = time.time()
+        if "error" not in snapshot:
+            self._add_net_rates(snapshot, sampled_at)
+            with PSUTIL_LATENCY.time(("system_data",)):
+                self._add_system_data(snapshot, sampled_at)
+        with self._lock:
+            self._seq += 1
+            entry = (self._seq, sampled_at, snapshot)
+            self._buffer.append(entry)
+        leader = None
+        for callback, leader_only in list(self._listeners):
+            if leader_only:
+                if leader is None:
+                    leader = self.is_leader()
+                if not leader:
+                    continue
+            try:
+                callback(snapshot)
+            except Exception:
+                # 单个监听器失败不影响其他监听器与后续采样，但需要留下记录
+                traceback.print_exc(file=sys.stderr)
+        return snapshot
+
+    def _add_net_rates(self, snapshot, sampled_at):
+        """根据相邻两次网络计数器计算收发速率（字节/秒）"""
+        net = snapshot["net_data"]
+        prev = self._prev_net
+        self._prev_net = (sampled_at, net["bytes_sent"], net["bytes_recv"])
+        if prev is None or sampled_at <= prev[0]:
+            net["bytes_sent_per_sec"] = 0.0
+            net["bytes_recv_per_sec"] = 0.0
+            return
+        dt = sampled_at - prev[0]
+        net["bytes_sent_per_sec"] = round(max(0, net["bytes_sent"] - prev[1]) / dt, 2)
+        net["bytes_recv_per_sec"] = round(max(0, net["bytes_recv"] - prev[2]) / dt, 2)
+
+    def _add_system_data(self, snapshot, sampled_at):
+        """补充告警规则使用的系统指标：负载、Swap、磁盘IO利用率、进程数、TCP连接数、CPU温度"""
+        data = {
+            "load_avg": [round(x, 2) for x in psutil.getloadavg()] if hasattr(psutil, "getloadavg") else None,
+            "swap_percent": psutil.swap_memory().percent,
+            "disk_io_percent": self._disk_busy_percent(sampled_at)
+        }
+        if self._seq % self.slow_every == 0 or not self._slow_data:
+            self._slow_data = self._collect_slow_data()
+        data.update(self._slow_data)
+        snapshot["system_data"] = data
+
+    def _disk_busy_percent(self, sampled_at):
+        """相邻两次采样间最忙磁盘的 busy_time 占比（%），平台不支持时返回 None"""
+        try:
+            counters = psutil.disk_io_counters(perdisk=True) or {}
+        except Exception:
+            return None
+        busy = {name: c.busy_time for name, c in counters.items()
+                if hasattr(c, "busy_time") and not name.startswith(_VIRTUAL_DISK_PREFIXES)}
+        prev = self._prev_disk
+        self._prev_disk = (sampled_at, busy)
+        if not busy or prev is None or sampled_at <= prev[0]:
+            return None
+        elapsed_ms = (sampled_at - prev[0]) * 1000
+        deltas = [max(0, value - prev[1].get(name, value)) for name, value in busy.items()]
+        return round(min(100.0, max(deltas) / elapsed_ms * 100), 2)
+
+    @staticmethod
+    def _collect_slow_data():
+        data = {"process_count": len(psutil.pids()), "tcp_connections": None, "cpu_temperature": None}
+        try:
+            data["tcp_connections"] = len(psutil.net_connections(kind='tcp'))
+        except (psutil.AccessDenied, OSError):
+            pass
+        try:
+            temps = psutil.sensors_temperatures() if hasattr(psutil, "sensors_temperatures") else {}
+            readings = [t.current for entries in temps.values() for t in entries if t.current]
+            data["cpu_temperature"] = max(readings) if readings else None
+        except Exception:
+            pass
+        return data
+
+    def latest(self):
+        """
+        返回最新快照及其采样时间
+
+        Returns:
+            (snapshot, sampled_at)，尚无样本时返回 (None, None)
+        """
+        with self._lock:
+            if not self._buffer:
+                return None, None
+            _, sampled_at, snapshot = self._buffer[-1]
+        return snapshot, sampled_at
+
+    def latest_with_age(self):
+        """返回附带 sample_age（秒）字段的最新快照副本"""
+        snapshot, sampled_at = self.latest()
+        if snapshot is None:
+            return None
+        payload = dict(snapshot)
+        payload["sample_age"] = round(time.time() - sampled_at, 3)
+        return payload
+
+    def history(self, limit=None):
+        """返回缓冲区内的历史快照列表（旧 -> 新）"""
+        with self._lock:
+            entries = list(self._buffer)
+        if limit:
+            entries = entries[-limit:]
+        return [(sampled_at, snapshot) for _, sampled_at, snapshot in entries]
+
+    @property
+    def seq(self):
+        """最新样本序号，每次采样递增"""
+        return self._seq
@@ -0,0 +1,341 @@
+"""
+系统指标时序存储
+在 system_metrics 原始表之上维护 1分钟 / 1小时 两级汇总（min/max/avg/p95），
+写入时增量更新，按查询范围与步长自动选择合适的分辨率，并按保留期清理过期数据
+所有时间均为 UTC（与 system_metrics.timestamp 的 CURRENT_TIMESTAMP 一致）
+host 为 NULL 的行是本机采样器写入的数据，远程主机批量上报的行带 host 标识，只保存原始样本。
+多进程部署时只有主采样进程（见 MetricSampler）写入采样数据；p95 使用进程内缓存的当前桶样本，
+缓存的样本数与汇总行不一致（其他进程写入了同一个桶）时从原始表重新载入
+"""
+import os
+import math
+import time
+import threading
+from datetime import datetime, timezone
+from Database import get_connection, transaction
+
+METRIC_COLUMNS = ('cpu', 'memory', 'disk', 'network')
+
+# 汇总分辨率（秒） -> 汇总表
+ROLLUP_TABLES = {
+    60: 'system_metrics_1m',
+    3600: 'system_metrics_1h',
+}
+
+# 各分辨率数据保留时长（秒）
+RAW_RETENTION = int(os.environ.get('MONITOR_RAW_RETENTION', 2 * 86400))
+ROLLUP_RETENTION = {
+    60: int(os.environ.get('MONITOR_1M_RETENTION', 30 * 86400)),
+    3600: int(os.environ.get('MONITOR_1H_RETENTION', 400 * 86400)),
+}
+
+# 单次范围查询返回的最大点数，超出时自动放大步长
+MAX_POINTS = 2000
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 原始表查询（同时供 Migrations.hot_queries() 检查执行计划）
+LATEST_SQL = "SELECT * FROM system_metrics WHERE host IS ? ORDER BY timestamp DESC LIMIT ?"
+RAW_RANGE_SQL = (f"SELECT CAST(strftime('%s', timestamp) AS INTEGER) AS ts, {', '.join(METRIC_COLUMNS)} "
+                 f"FROM system_metrics WHERE host IS ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp")
+
+
+def format_ts(epoch):
+    """Unix 秒 -> 'YYYY-MM-DD HH:MM:SS'（UTC）"""
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime(TIME_FORMAT)
+
+
+def parse_ts(value):
+    """解析查询参数中的时间：Unix 秒或 'YYYY-MM-DD HH:MM:SS' / ISO8601（无时区视为 UTC）"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def percentile(sorted_values, q):
+    """对已排序列表求分位数（线性插值）"""
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q
+    lo = int(math.floor(pos))
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def snapshot_to_row(snapshot):
+    """把采样器快照转换为 system_metrics 行 (cpu, memory, disk, network)；network 单位 KB/s"""
+    cpu_list = snapshot["cpu_data"]["cpu_percent"]
+    net = snapshot.get("net_data", {})
+    net_rate = (net.get("bytes_sent_per_sec", 0) + net.get("bytes_recv_per_sec", 0)) / 1024
+    return (
+        round(sum(cpu_list) / len(cpu_list), 2) if cpu_list else 0.0,
+        snapshot["memory_data"]["basic_info"]["percent"],
+        snapshot["disk_data"]["disk_usage"]["percent"],
+        round(net_rate, 2)
+    )
+
+
+class MetricStore:
+    """system_metrics 时序存储与汇总引擎"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(os.path.dirname(__file__), 'monitor.db')
+        self._lock = threading.Lock()
+        # 分辨率 -> [桶起始时间, {指标: [样本值]}, 汇总行样本数]，用于计算当前桶的 p95
+        self._open_buckets = {}
+        self._last_prune = 0
+        self._init_tables()
+
+    def _init_tables(self):
+        """初始化汇总表"""
+        # {m}_count 为该指标的非空样本数（部分样本可能缺少某些指标），平均值 = {m}_sum / {m}_count
+        columns = ",\n".join(
+            f"{m}_min REAL, {m}_max REAL, {m}_sum REAL, {m}_p95 REAL, {m}_count INTEGER NOT NULL DEFAULT 0"
+            for m in METRIC_COLUMNS
+        )
+        with transaction(self.db_path) as conn:
+            for table in ROLLUP_TABLES.values():
+                conn.execute(f'''CREATE TABLE IF NOT EXISTS {table} (
+                    bucket INTEGER PRIMARY KEY,
+                    samples INTEGER NOT NULL,
+                    {columns}
+                )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_system_metrics_timestamp ON system_metrics(timestamp)')
+
+    # ------------------------------------------------------------------ 写入
+
+    def insert(self, cpu, memory, disk, network, timestamp=None):
+        """写入一条原始样本并增量更新汇总，返回新行 id"""
+        return self._write([(cpu, memory, disk, network, timestamp)])
+
+    def insert_many(self, rows, host=None):
+        """
+        批量写入原始样本（单个事务、executemany）
+
+        Args:
+            rows: [(cpu, memory, disk, network, timestamp)]，timestamp 为 Unix 秒，None 表示当前时间
+            host: 远程主机标识；None 表示本机（同时更新汇总表）
+        Returns:
+            写入行数
+        """
+        if not rows:
+            return 0
+        self._write(rows, host)
+        return len(rows)
+
+    def _write(self, rows, host=None):
+        now = time.time()
+        prepared = []
+        for cpu, memory, disk, network, ts in rows:
+            ts = now if ts is None else float(ts)
+            prepared.append((ts, (cpu, memory, disk, network)))
+
+        if host is not None:
+            # 远程主机只写原始表，不进入本机汇总，也不需要持有汇总锁
+            with transaction(self.db_path) as conn:
+                conn.executemany(
+                    "INSERT INTO system_metrics (cpu, memory, disk, network, timestamp, host) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [values + (format_ts(ts), host) for ts, values in prepared])
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self._maybe_prune(now)
+            return last_id
+
+        with self._lock, transaction(self.db_path) as conn:
+            conn.executemany(
+                "INSERT INTO system_metrics (cpu, memory, disk, network, timestamp) VALUES (?, ?, ?, ?, ?)",
+                [values + (format_ts(ts),) for ts, values in prepared])
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            for resolution, table in ROLLUP_TABLES.items():
+                self._update_rollup(conn, resolution, table, prepared)
+        self._maybe_prune(now)
+        return last_id
+
+    def record_snapshot(self, snapshot):
+        """采样器回调：把快照写入时序存储"""
+        if "error" in snapshot:
+            return
+        cpu, memory, disk, network = snapshot_to_row(snapshot)
+        self.insert(cpu, memory, disk, network)
+
+    def _update_rollup(self, conn, resolution, table, prepared):
+        """按桶合并新样本：min/max/sum/samples 用 UPSERT 累加，p95 由当前桶的样本重新计算"""
+        touched = {}
+        for ts, values in prepared:
+            bucket = int(ts // resolution) * resolution
+            touched.setdefault(bucket, []).append(values)
+
+        for bucket, batch in touched.items():
+            open_bucket = self._open_buckets.get(resolution)
+            row = conn.execute(f"SELECT samples FROM {table} WHERE bucket = ?", (bucket,)).fetchone()
+            stored = row[0] if row else 0
+            if open_bucket and open_bucket[0] == bucket and open_bucket[2] == stored:
+                samples = open_bucket[1]
+                for values in batch:
+                    for m, v in zip(METRIC_COLUMNS, values):
+                        if v is not None:
+                            samples[m].append(v)
+                open_bucket[2] = stored + len(batch)
+            else:
+                # 新桶、回填历史桶或缓存已过期（其他进程写入过该桶）：从原始表（已包含本批样本）载入全部样本
+                samples = self._load_raw_bucket(conn, bucket, resolution)
+                if open_bucket is None or bucket >= open_bucket[0]:
+                    self._open_buckets[resolution] = [bucket, samples, stored + len(batch)]
+
+            p95 = {m: percentile(sorted(samples[m]), 0.95) for m in METRIC_COLUMNS}
+
+            agg_values = [bucket, len(batch)]
+            for idx, m in enumerate(METRIC_COLUMNS):
+                vals = [v[idx] for v in batch if v[idx] is not None]
+                agg_values += [min(vals) if vals else None, max(vals) if vals else None,
+                               sum(vals) if vals else 0.0, p95[m], len(vals)]
+
+            columns = ", ".join(f"{m}_min, {m}_max, {m}_sum, {m}_p95, {m}_count" for m in METRIC_COLUMNS)
+            updates = ", ".join(
+                f"{m}_min = min(coalesce({m}_min, excluded.{m}_min), coalesce(excluded.{m}_min, {m}_min)), "
+                f"{m}_max = max(coalesce({m}_max, excluded.{m}_max), coalesce(excluded.{m}_max, {m}_max)), "
+                f"{m}_sum = {m}_sum + excluded.{m}_sum, "
+                f"{m}_p95 = excluded.{m}_p95, "
+                f"{m}_count = {m}_count + excluded.{m}_count"
+                for m in METRIC_COLUMNS
+            )
+            placeholders = ", ".join("?" * len(agg_values))
+            conn.execute(
+                f"INSERT INTO {table} (bucket, samples, {columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT(bucket) DO UPDATE SET samples = samples + excluded.samples, {updates}",
+                agg_values)
+
+    def _load_raw_bucket(self, conn, bucket, resolution):
+        rows = conn.execute(
+            f"SELECT {', '.join(METRIC_COLUMNS)} FROM system_metrics "
+            f"WHERE host IS NULL AND timestamp >= ? AND timestamp < ?",
+            (format_ts(bucket), format_ts(bucket + resolution))).fetchall()
+        samples = {m: [] for m in METRIC_COLUMNS}
+        for row in rows:
+            for m in METRIC_COLUMNS:
+                if row[m] is not None:
+                    samples[m].append(row[m])
+        return samples
+
+    def _maybe_prune(self, now):
+        """每分钟最多清理一次过期数据"""
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        with transaction(self.db_path) as conn:
+            conn.execute("DELETE FROM system_metrics WHERE timestamp < ?", (format_ts(now - RAW_RETENTION),))
+            for resolution, table in ROLLUP_TABLES.items():
+                conn.execute(f"DELETE FROM {table} WHERE bucket < ?", (now - ROLLUP_RETENTION[resolution],))
+
+    # ------------------------------------------------------------------ 查询
+
+    def latest(self, limit=10, host=None):
+        """最近 limit 条原始样本（host 为 None 时为本机）"""
+        rows = get_connection(self.db_path).execute(LATEST_SQL, (host, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def choose_resolution(self, start, step, now=None):
+        """根据步长和起始时间选择数据源分辨率：0 表示原始表"""
+        now = now or time.time()
+        if step >= 3600 or start < now - ROLLUP_RETENTION[60]:
+            return 3600
+        if step >= 60 or start < now - RAW_RETENTION:
+            return 60
+        return 0
+
+    def query_range(self, start=None, end=None, step=None, host=None):
+        """
+        按时间范围与步长查询指标序列
+
+        Args:
+            start/end: Unix 秒（缺省为最近一小时）
+            step: 步长（秒），缺省时按约300个点自动计算
+            host: 远程主机标识；远程主机没有汇总表，始终从原始表聚合
+        Returns:
+            {"resolution", "step", "from", "to", "points": [...]}
+        """
+        end = time.time() if end is None else end
+        start = end - 3600 if start is None else start
+        if end <= start:
+            raise ValueError("to 必须大于 from")
+        span = end - start
+        step = int(step) if step else max(1, int(span // 300))
+        if step <= 0:
+            raise ValueError("step 必须为正整数")
+        step = max(step, int(math.ceil(span / MAX_POINTS)))
+
+        resolution = 0 if host is not None else self.choose_resolution(start, step)
+        if resolution:
+            # 步长对齐到汇总分辨率的整数倍
+            step = max(resolution, int(math.ceil(step / resolution)) * resolution)
+            points = self._query_rollup(ROLLUP_TABLES[resolution], start, end, step)
+        else:
+            points = self._query_raw(start, end, step, host)
+
+        return {
+            "resolution": {0: "raw", 60: "1m", 3600: "1h"}[resolution],
+            "step": step,
+            "from": format_ts(start),
+            "to": format_ts(end),
+            "points": points
+        }
+
+    def _query_rollup(self, table, start, end, step):
+        select = ", ".join(
+            f"MIN({m}_min), MAX({m}_max), SUM({m}_sum), MAX({m}_p95), SUM({m}_count)" for m in METRIC_COLUMNS
+        )
+        rows = get_connection(self.db_path).execute(
+            f"SELECT (bucket / ?) * ? AS ts, SUM(samples), {select} FROM {table} "
+            f"WHERE bucket >= ? AND bucket < ? GROUP BY ts ORDER BY ts",
+            (step, step, int(start // step) * step, end)).fetchall()
+
+        points = []
+        for row in rows:
+            samples = row[1]
+            point = {"timestamp": format_ts(row[0]), "epoch": row[0], "samples": samples}
+            for i, m in enumerate(METRIC_COLUMNS):
+                lo, hi, total, p95, count = row[2 + i * 5: 7 + i * 5]
+                point[m] = {
+                    "min": lo,
+                    "max": hi,
+                    # 只按该指标的非空样本数平均，缺少该指标的样本不拉低均值
+                    "avg": round(total / count, 2) if count else None,
+                    "p95": round(p95, 2) if p95 is not None else None
+                }
+            points.append(point)
+        return points
+
+    def _query_raw(self, start, end, step, host=None):
+        rows = get_connection(self.db_path).execute(
+            RAW_RANGE_SQL, (host, format_ts(start), format_ts(end))).fetchall()
+
+        buckets = {}
+        for row in rows:
+            bucket = (row['ts'] // step) * step
+            samples = buckets.setdefault(bucket, {m: [] for m in METRIC_COLUMNS})
+            for m in METRIC_COLUMNS:
+                if row[m] is not None:
+                    samples[m].append(row[m])
+
+        points = []
+        for bucket in sorted(buckets):
+            samples = buckets[bucket]
+            point = {"timestamp": format_ts(bucket), "epoch": bucket,
+                     "samples": max(len(v) for v in samples.values())}
+            for m in METRIC_COLUMNS:
+                vals = sorted(samples[m])
+                point[m] = {
+                    "min": vals[0] if vals else None,
+                    "max": vals[-1] if vals else None,
+                    "avg": round(sum(vals) / len(vals), 2) if vals else None,
+                    "p95": round(percentile(vals, 0.95), 2) if vals else None
+                }
+            points.append(point)
+        return points
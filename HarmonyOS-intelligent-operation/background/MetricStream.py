@@ -0,0 +1,107 @@
+"""
+实时指标推送
+采样器每产生一个快照只序列化一次，再分发给所有 SSE 订阅者；
+每个订阅者只保留最新一帧，客户端消费慢时直接覆盖旧帧（丢弃过期数据）。
+每个 SSE 连接在整个生命周期内占用一个请求线程：连接最长保持 STREAM_MAX_SECONDS 后由服务端关闭
+（EventSource 按 retry 自动重连），订阅者数量上限应小于每个 worker 的线程数（见 gunicorn.conf.py）
+"""
+import os
+import json
+import time
+import threading
+
+# 单个 SSE 连接的最长保持时间（秒），到期后关闭以释放请求线程（包括已离开但连接未断开的客户端）
+STREAM_MAX_SECONDS = float(os.environ.get('MONITOR_STREAM_MAX_SECONDS', 300))
+# 每个进程的订阅者上限，超出时返回 503（应小于 gunicorn 每个 worker 的线程数，留出线程处理普通请求）
+MAX_SUBSCRIBERS = int(os.environ.get('MONITOR_STREAM_MAX_SUBSCRIBERS', 16))
+
+
+class Subscription:
+    """单个订阅者：一帧待发送槽位 + 唤醒事件"""
+
+    def __init__(self):
+        self._frame = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def offer(self, frame):
+        with self._lock:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+        self._event.set()
+
+    def get(self, timeout=None):
+        """等待下一帧，超时返回 None"""
+        if not self._event.wait(timeout):
+            return None
+        with self._lock:
+            self._event.clear()
+            frame, self._frame = self._frame, None
+        return frame
+
+
+class SnapshotHub:
+    """快照广播中心"""
+
+    def __init__(self, max_subscribers=MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._latest = None
+        self._seq = 0
+
+    def publish(self, snapshot):
+        """采样器回调：序列化一次后分发给全部订阅者"""
+        self._seq += 1
+        payload = dict(snapshot)
+        payload["seq"] = self._seq
+        payload["sampled_at"] = time.time()
+        frame = f"id: {self._seq}\ndata: {json.dumps(payload)}\n\n"
+        with self._lock:
+            self._latest = frame
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub.offer(frame)
+
+    def subscribe(self):
+        """新增订阅者，超过上限时返回 None；有最新帧时立即可读"""
+        sub = Subscription()
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(sub)
+            latest = self._latest
+        if latest is not None:
+            sub.offer(latest)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def stream(self, sub, heartbeat=15.0, max_duration=STREAM_MAX_SECONDS):
+        """
+        SSE 生成器：推送帧，空闲时发送注释行保活（写入失败即发现客户端已断开）；
+        超过 max_duration 秒后结束，客户端断开或结束时自动退订
+        """
+        deadline = time.monotonic() + max_duration
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                frame = sub.get(timeout=min(heartbeat, remaining))
+                if frame is not None:
+                    yield frame
+                elif time.monotonic() < deadline:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
@@ -0,0 +1,263 @@
+"""
+数据库结构迁移
+按版本号顺序执行迁移并记录到 schema_migrations 表，为热点查询建立复合索引；
+check_query_plans() 通过 EXPLAIN QUERY PLAN 检查接口查询是否存在全表扫描
+
+用法: python Migrations.py [db_path] [--check]
+"""
+import os
+import re
+import sys
+import sqlite3
+from Database import get_connection, transaction
+import ErrorFingerprint
+import BlobStore
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), 'monitor.db')
+
+def _add_rollup_counts(conn):
+    """汇总表增加每个指标的非空样本数列；已有行按 min 是否为空回填（旧行无法区分部分缺失，按 samples 计）"""
+    for table in ('system_metrics_1m', 'system_metrics_1h'):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if not columns:
+            # 汇总表由 MetricStore 创建，届时已包含这些列
+            continue
+        for m in ('cpu', 'memory', 'disk', 'network'):
+            if f"{m}_count" not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {m}_count INTEGER NOT NULL DEFAULT 0")
+                conn.execute(f"UPDATE {table} SET {m}_count = samples WHERE {m}_min IS NOT NULL")
+
+
+def _add_column(table, column, decl):
+    """返回一个迁移步骤：列不存在时执行 ALTER TABLE ADD COLUMN"""
+    def step(conn):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    return step
+
+
+# (版本号, 说明, [SQL 语句或 callable(conn)])
+MIGRATIONS = [
+    (1, "error_logs 时间排序与未解决筛选索引", [
+        "CREATE INDEX IF NOT EXISTS idx_error_logs_timestamp ON error_logs(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_error_logs_resolved_timestamp ON error_logs(resolved, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_error_logs_auto_fixed ON error_logs(auto_fixed)",
+        "CREATE INDEX IF NOT EXISTS idx_error_logs_level ON error_logs(level)",
+        "CREATE INDEX IF NOT EXISTS idx_error_logs_os_type ON error_logs(os_type)",
+    ]),
+    (2, "nft_products 状态/分类 + 创建时间索引", [
+        "CREATE INDEX IF NOT EXISTS idx_nft_products_status_created ON nft_products(status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_nft_products_status_category_created "
+        "ON nft_products(status, category, created_at)",
+    ]),
+    (3, "user_methods 状态/作者 + 创建时间索引", [
+        "CREATE INDEX IF NOT EXISTS idx_user_methods_status_created ON user_methods(status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_user_methods_author_status_created "
+        "ON user_methods(author_id, status, created_at)",
+    ]),
+    (4, "monitor_config 创建时间与 nft_orders 商品索引", [
+        "CREATE INDEX IF NOT EXISTS idx_monitor_config_created ON monitor_config(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_nft_orders_product ON nft_orders(product_id)",
+    ]),
+    (5, "system_metrics 增加 host 列（远程主机批量上报）", [
+        _add_column("system_metrics", "host", "TEXT"),
+        "CREATE INDEX IF NOT EXISTS idx_system_metrics_host_timestamp ON system_metrics(host, timestamp)",
+    ]),
+    (6, "error_logs 全文索引（FTS5 外部内容表 + 同步触发器）", [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS error_logs_fts USING fts5("
+        "message, module, traceback, content='error_logs', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER IF NOT EXISTS error_logs_fts_ai AFTER INSERT ON error_logs BEGIN "
+        "INSERT INTO error_logs_fts(rowid, message, module, traceback) "
+        "VALUES (new.id, new.message, new.module, new.traceback); END",
+        "CREATE TRIGGER IF NOT EXISTS error_logs_fts_ad AFTER DELETE ON error_logs BEGIN "
+        "INSERT INTO error_logs_fts(error_logs_fts, rowid, message, module, traceback) "
+        "VALUES ('delete', old.id, old.message, old.module, old.traceback); END",
+        # 只在被索引的列变化时重建（标记已解决等更新不触发）
+        "CREATE TRIGGER IF NOT EXISTS error_logs_fts_au AFTER UPDATE OF message, module, traceback "
+        "ON error_logs BEGIN "
+        "INSERT INTO error_logs_fts(error_logs_fts, rowid, message, module, traceback) "
+        "VALUES ('delete', old.id, old.message, old.module, old.traceback); "
+        "INSERT INTO error_logs_fts(rowid, message, module, traceback) "
+        "VALUES (new.id, new.message, new.module, new.traceback); END",
+        # 写线程每批提交一个小段；放宽自动合并阈值（默认 4），避免大索引上每批都触发昂贵的段合并
+        "INSERT INTO error_logs_fts(error_logs_fts, rank) VALUES ('automerge', 8)",
+        "INSERT INTO error_logs_fts(error_logs_fts) VALUES ('rebuild')",
+    ]),
+    (7, "错误指纹：error_signatures 签名表、按小时计数表，为历史 error_logs 回填 fingerprint", [
+        ErrorFingerprint.backfill,
+    ]),
+    (8, "nft_orders 异步支付状态机（请求时间、尝试次数、失败原因）与支付幂等键表", [
+        _add_column("nft_orders", "payment_requested_at", "TEXT"),
+        _add_column("nft_orders", "payment_updated_at", "TEXT"),
+        _add_column("nft_orders", "payment_attempts", "INTEGER DEFAULT 0"),
+        _add_column("nft_orders", "payment_error", "TEXT"),
+        '''CREATE TABLE IF NOT EXISTS nft_payment_requests (
+            idempotency_key TEXT PRIMARY KEY,
+            order_id TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )''',
+        "CREATE INDEX IF NOT EXISTS idx_nft_orders_payment_status ON nft_orders(payment_status, payment_requested_at)",
+    ]),
+    (9, "nft_orders 购买次数批量计入标记（已支付的订单视为已计入）", [
+        _add_column("nft_orders", "purchase_counted", "INTEGER DEFAULT 0"),
+        # 只有已支付订单计入过 purchase_count；待支付 / 失败的订单之后支付时仍需计入
+        "UPDATE nft_orders SET purchase_counted = 1 WHERE payment_status = 'paid'",
+        "CREATE INDEX IF NOT EXISTS idx_nft_orders_uncounted ON nft_orders(product_id, id) "
+        "WHERE payment_status = 'paid' AND purchase_counted = 0",
+    ]),
+    (10, "市场脚本正文移入内容寻址存储（blobs 表，行中只保留 script_hash）", [
+        BlobStore.move_inline_scripts,
+    ]),
+    (11, "monitor_config 变更版本号（触发器维护，各进程据此重新加载规则）与告警去重表", [
+        '''CREATE TABLE IF NOT EXISTS config_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )''',
+        "INSERT OR IGNORE INTO config_versions (name, version) VALUES ('monitor_config', 0)",
+        *[f"CREATE TRIGGER IF NOT EXISTS monitor_config_version_{event.lower()} AFTER {event} ON monitor_config "
+          f"BEGIN UPDATE config_versions SET version = version + 1 WHERE name = 'monitor_config'; END"
+          for event in ("INSERT", "UPDATE", "DELETE")],
+        '''CREATE TABLE IF NOT EXISTS rule_alert_state (
+            rule_id INTEGER PRIMARY KEY,
+            last_notified REAL NOT NULL
+        )''',
+    ]),
+    (12, "错误签名变更版本号（触发器维护，各进程据此使错误统计缓存失效）", [
+        "INSERT OR IGNORE INTO config_versions (name, version) VALUES ('error_logs', 0)",
+        # 每次记录错误都会写入 / 更新签名行，标记解决也会更新签名的未解决计数
+        *[f"CREATE TRIGGER IF NOT EXISTS error_signatures_version_{event.lower()} AFTER {event} ON error_signatures "
+          f"BEGIN UPDATE config_versions SET version = version + 1 WHERE name = 'error_logs'; END"
+          for event in ("INSERT", "UPDATE", "DELETE")],
+    ]),
+    (13, "汇总表按指标记录非空样本数（平均值不再被缺失该指标的样本拉低）", [
+        _add_rollup_counts,
+    ]),
+]
+
+def hot_queries():
+    """
+    接口使用的热点查询：[(名称, SQL, 参数)]
+
+    SQL 直接取自各模块实际执行的常量与查询构造函数（不手工复制语句），参数只是示例值；
+    在函数内导入，避免执行迁移时加载业务模块
+    """
+    import ErrorLogger
+    import NFTMarket
+    import MetricStore
+    import ReportStore
+    import AnomalyDetector
+    import RuleEngine
+    return [
+        ("monitor_configs", RuleEngine.CONFIG_LIST_SQL, ()),
+        ("config_version", RuleEngine.CONFIG_VERSION_SQL, ("monitor_config",)),
+        ("system_metrics_latest", MetricStore.LATEST_SQL, (None, 10)),
+        ("system_metrics_host_range", MetricStore.RAW_RANGE_SQL,
+         ("host-1", "2025-01-01 00:00:00", "2025-01-02 00:00:00")),
+        ("error_logs", *ErrorLogger.error_logs_query(100)),
+        ("error_logs_with_system_info", *ErrorLogger.error_logs_query(100, include_system_info=True)),
+        ("error_logs_unresolved", *ErrorLogger.error_logs_query(100, unresolved_only=True)),
+        ("error_logs_after", *ErrorLogger.error_logs_query(100, after_id=100)),
+        ("error_logs_resolve", ErrorLogger.RESOLVE_BY_ID, (1,)),
+        ("error_logs_resolve_signature", ErrorLogger.RESOLVE_BY_FINGERPRINT, ("0" * 16,)),
+        ("error_signatures_top", *ErrorLogger.error_signatures_query(50)),
+        ("error_signatures_recent", *ErrorLogger.error_signatures_query(50, sort='recent')),
+        ("error_stats_last_24h", ErrorLogger.ERRORS_SINCE_HOUR, ("2025-01-01 00",)),
+        ("nft_catalog_load", NFTMarket.CATALOG_LOAD_SQL, ()),
+        ("nft_product", NFTMarket.PRODUCT_SQL, ("NFT-001",)),
+        ("nft_payment_status", NFTMarket.PAYMENT_STATUS_SQL, ("ORDER-1",)),
+        ("nft_purchases_uncounted", NFTMarket.UNCOUNTED_PURCHASES_SQL, ()),
+        ("nft_payment_idempotency", NFTMarket.IDEMPOTENCY_KEY_SQL, ("key",)),
+        ("nft_payments_pending", NFTMarket.PENDING_PAYMENTS_SQL, ()),
+        ("user_methods", *NFTMarket.user_methods_query(50)),
+        ("user_methods_author", *NFTMarket.user_methods_query(50, author_id="user_001")),
+        ("user_methods_after", *NFTMarket.user_methods_query(50, after_id=100)),
+        ("reports_list", *ReportStore.list_query(50)),
+        ("reports_list_after", *ReportStore.list_query(50, after=("2025-01-01 00:00:00", "RPT-1"))),
+        ("anomalies_series", *AnomalyDetector.anomalies_query(100, host="host", metric="cpu")),
+    ]
+
+
+# "SCAN <表>" 且未使用索引即为全表扫描
+_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?!.*USING (?:COVERING )?INDEX)')
+
+
+def _init_version_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+
+def current_version(db_path=None):
+    """返回已应用的最高迁移版本（未迁移为 0）"""
+    conn = get_connection(db_path or DEFAULT_DB_PATH)
+    _init_version_table(conn)
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_migrations').fetchone()[0]
+
+
+def migrate(db_path=None, target=None):
+    """
+    依次执行尚未应用的迁移，每个版本一个事务
+
+    Returns:
+        本次应用的版本号列表
+    """
+    db_path = db_path or DEFAULT_DB_PATH
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        with transaction(db_path) as conn:
+            # BEGIN IMMEDIATE 串行化多个进程（gunicorn worker）的迁移
+            conn.execute('BEGIN IMMEDIATE')
+            _init_version_table(conn)
+            done = conn.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,)).fetchone()
+            if done:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute('INSERT INTO schema_migrations (version, description) VALUES (?, ?)',
+                         (version, description))
+        applied.append(version)
+    return applied
+
+
+def check_query_plans(db_path=None, queries=None):
+    """
+    对热点查询执行 EXPLAIN QUERY PLAN
+
+    Returns:
+        [(查询名称, 计划明细)]，仅包含出现全表扫描或无法执行（如表尚未创建）的查询；空列表表示全部走索引
+    """
+    conn = get_connection(db_path or DEFAULT_DB_PATH)
+    offenders = []
+    for name, sql, params in queries or hot_queries():
+        try:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        except sqlite3.OperationalError as e:
+            offenders.append((name, f"无法执行: {e}"))
+            continue
+        for row in plan:
+            detail = row[-1]
+            if _FULL_SCAN.match(detail):
+                offenders.append((name, detail))
+    return offenders
+
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    path = args[0] if args else DEFAULT_DB_PATH
+    print("已应用迁移:", migrate(path) or "无", "当前版本:", current_version(path))
+    if '--check' in sys.argv:
+        problems = check_query_plans(path)
+        for name, detail in problems:
+            print(f"未使用索引: {name}: {detail}")
+        if problems:
+            sys.exit(1)
+        print(f"{len(hot_queries())} 条热点查询均使用索引")
@@ -2,21 +2,81 @@
 NFT市场模块 - 处理NFT交易和用户上传的运维方法
 """
 import os
+import sys
 import json
-import sqlite3
+import uuid
+import atexit
+import threading
+import traceback
 from datetime import datetime
 from pathlib import Path
+from Database import get_connection, transaction
+from CatalogIndex import CatalogIndex, LIST_COLUMNS
+import BlobStore
+
+# save_product() 可写入的列（script_content 单独存入 BlobStore）
+_PRODUCT_COLUMNS = ('product_id', 'title', 'description', 'price', 'category', 'seller_id', 'seller_name',
+                    'status', 'rating', 'image_url', 'os_support')
+# 运维方法列表返回的列（脚本正文通过 script_hash 单独下载）
+_METHOD_LIST_COLUMNS = ('id, method_id, title, description, category, author_id, author_name, price, '
+                        'os_support, created_at, status, purchase_count, rating, script_hash')
+
+# 以下查询同时供 Migrations.hot_queries() 检查执行计划
+CATALOG_LOAD_SQL = f"SELECT {', '.join(LIST_COLUMNS)} FROM nft_products WHERE status = 'active'"
+PRODUCT_SQL = 'SELECT * FROM nft_products WHERE product_id = ?'
+PAYMENT_STATUS_SQL = '''SELECT order_id, product_id, price, payment_method, payment_status, 
+    payment_requested_at, payment_attempts, payment_error, paid_at 
+    FROM nft_orders WHERE order_id = ?'''
+UNCOUNTED_PURCHASES_SQL = '''SELECT product_id, COUNT(*), MAX(id) FROM nft_orders 
+    WHERE payment_status = 'paid' AND purchase_counted = 0 
+    GROUP BY product_id'''
+IDEMPOTENCY_KEY_SQL = 'SELECT order_id FROM nft_payment_requests WHERE idempotency_key = ?'
+PENDING_PAYMENTS_SQL = '''SELECT order_id FROM nft_orders 
+    WHERE payment_status = 'pending' AND payment_requested_at IS NOT NULL 
+    ORDER BY payment_requested_at'''
+
+
+def user_methods_query(limit, author_id=None, after_id=None):
+    """已审核运维方法列表查询（按创建时间倒序，after_id 为键集分页游标），返回 (sql, params)"""
+    conditions = []
+    params = []
+    if author_id:
+        conditions.append('author_id = ?')
+        params.append(author_id)
+    conditions.append("status = 'approved'")
+    if after_id is not None:
+        conditions.append('(created_at, id) < (SELECT created_at, id FROM user_methods WHERE id = ?)')
+        params.append(after_id)
+    params.append(limit)
+    return f'''SELECT {_METHOD_LIST_COLUMNS} FROM user_methods 
+        WHERE {' AND '.join(conditions)}
+        ORDER BY created_at DESC, id DESC LIMIT ?''', params
+
 
 class NFTMarket:
     """NFT市场管理器"""
     
+    # 购买次数批量刷新的间隔（秒），以及累计多少次购买时提前刷新
+    PURCHASE_FLUSH_INTERVAL = float(os.environ.get('MONITOR_PURCHASE_FLUSH_INTERVAL', 2.0))
+    PURCHASE_FLUSH_BATCH = 100
+    # 目录索引定期全量重建的间隔（秒），多进程部署时用于同步其他进程的变更
+    CATALOG_REBUILD_INTERVAL = int(os.environ.get('MONITOR_CATALOG_REBUILD_INTERVAL', 60))
+    
     def __init__(self, db_path=None):
         self.db_path = db_path or os.path.join(os.path.dirname(__file__), 'monitor.db')
+        # 商品列表内存索引（首次访问时构建），列表接口只返回不含 script_content 的投影
+        self.catalog = CatalogIndex(self._load_catalog, rebuild_interval=self.CATALOG_REBUILD_INTERVAL)
+        # 待计入的购买次数由后台线程批量刷新
+        self._purchase_pending = 0
+        self._purchase_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flusher = None
         self._init_db()
+        atexit.register(self._flush_at_exit)
     
     def _init_db(self):
         """初始化数据库表"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_connection(self.db_path)
         c = conn.cursor()
         
         # NFT商品表
@@ -71,21 +131,17 @@ class NFTMarket:
             rating REAL DEFAULT 0
         )''')
         
+        # 脚本正文存储（blobs 表）与 script_hash 列
+        BlobStore.ensure_schema(conn)
         conn.commit()
-        conn.close()
         
         # 初始化一些示例NFT产品
         self._init_sample_products()
     
     def _init_sample_products(self):
         """初始化示例NFT产品"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
         # 检查是否已有产品
-        c.execute('SELECT COUNT(*) FROM nft_products')
-        if c.fetchone()[0] > 0:
-            conn.close()
+        if get_connection(self.db_path).execute('SELECT COUNT(*) FROM nft_products').fetchone()[0] > 0:
             return
         
         sample_products = [
@@ -125,47 +181,64 @@ class NFTMarket:
         ]
         
         for product in sample_products:
-            try:
-                c.execute('''INSERT INTO nft_products 
-                    (product_id, title, description, price, category, seller_id, seller_name, os_support, script_content)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                    (product['product_id'], product['title'], product['description'], 
-                     product['price'], product['category'], product['seller_id'], 
-                     product['seller_name'], product['os_support'], product['script_content']))
-            except sqlite3.IntegrityError:
-                pass  # 已存在，跳过
-        
-        conn.commit()
-        conn.close()
+            self.save_product(product)
     
-    def get_products(self, category=None, limit=50):
-        """获取NFT产品列表"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        
-        if category:
-            c.execute('''SELECT * FROM nft_products 
-                WHERE status = 'active' AND category = ? 
-                ORDER BY created_at DESC LIMIT ?''', (category, limit))
-        else:
-            c.execute('''SELECT * FROM nft_products 
-                WHERE status = 'active' 
-                ORDER BY created_at DESC LIMIT ?''', (limit,))
-        
-        rows = c.fetchall()
-        conn.close()
-        return [dict(row) for row in rows]
+    def save_product(self, product):
+        """新增或更新商品（按 product_id），script_content 存入内容寻址存储，提交后增量更新目录索引"""
+        columns = [column for column in _PRODUCT_COLUMNS if column in product]
+        values = [product[column] for column in columns]
+        with transaction(self.db_path) as conn:
+            old_hash = None
+            if 'script_content' in product:
+                old = conn.execute('SELECT script_hash FROM nft_products WHERE product_id = ?',
+                                   (product['product_id'],)).fetchone()
+                old_hash = old[0] if old else None
+                columns.append('script_hash')
+                values.append(BlobStore.put(conn, product['script_content']))
+            updates = ', '.join(f'{column} = excluded.{column}' for column in columns if column != 'product_id')
+            conn.execute(f'''INSERT INTO nft_products ({', '.join(columns)}) 
+                VALUES ({', '.join('?' * len(columns))}) 
+                ON CONFLICT(product_id) DO UPDATE SET {updates}''', values)
+            BlobStore.release(conn, old_hash)
+            row = conn.execute(f"SELECT {', '.join(LIST_COLUMNS)} FROM nft_products WHERE product_id = ?",
+                               (product['product_id'],)).fetchone()
+        self.catalog.upsert(dict(row))
+    
+    def get_products(self, category=None, limit=50, after_id=None, sort='newest'):
+        """获取NFT产品列表（不含 script_content）"""
+        return list(self.iter_products(category=category, limit=limit, after_id=after_id, sort=sort))
+    
+    def iter_products(self, category=None, limit=50, after_id=None, sort='newest'):
+        """
+        按排序倒序产出上架产品的列表投影（来自内存目录索引），after_id 为键集分页游标（上一页最后一条的 id）
+
+        Args:
+            sort: newest（创建时间）/ rating（评分）/ purchase_count（购买次数）
+        """
+        return iter(self.catalog.page(category=category, sort=sort, limit=limit, after_id=after_id))
+    
+    def _load_catalog(self):
+        c = get_connection(self.db_path).execute(CATALOG_LOAD_SQL)
+        for row in c:
+            yield dict(row)
+    
+    def _flush_at_exit(self):
+        if self._purchase_pending:
+            try:
+                self.flush_purchases()
+            except Exception:
+                pass
     
     def get_product(self, product_id):
-        """获取单个NFT产品详情"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute('SELECT * FROM nft_products WHERE product_id = ?', (product_id,))
-        row = c.fetchone()
-        conn.close()
-        return dict(row) if row else None
+        """获取单个NFT产品详情（script_content 从内容寻址存储中读取）"""
+        conn = get_connection(self.db_path)
+        row = conn.execute(PRODUCT_SQL, (product_id,)).fetchone()
+        if row is None:
+            return None
+        product = dict(row)
+        if product.get('script_hash'):
+            product['script_content'] = BlobStore.read_text(conn, product['script_hash'])
+        return product
     
     def create_order(self, product_id, buyer_id, buyer_name, payment_method='wechat'):
         """创建订单"""
@@ -173,79 +246,179 @@ class NFTMarket:
         if not product:
             return None
         
-        order_id = f"ORDER-{datetime.now().strftime('%Y%m%d%H%M%S')}-{product_id}"
+        # 同一秒内同一商品的多个订单靠随机后缀区分
+        order_id = f"ORDER-{datetime.now().strftime('%Y%m%d%H%M%S')}-{product_id}-{uuid.uuid4().hex[:6]}"
         
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''INSERT INTO nft_orders 
-            (order_id, product_id, buyer_id, buyer_name, price, payment_method)
-            VALUES (?, ?, ?, ?, ?, ?)''',
-            (order_id, product_id, buyer_id, buyer_name, product['price'], payment_method))
-        conn.commit()
-        conn.close()
+        with transaction(self.db_path) as conn:
+            conn.execute('''INSERT INTO nft_orders 
+                (order_id, product_id, buyer_id, buyer_name, price, payment_method)
+                VALUES (?, ?, ?, ?, ?, ?)''',
+                (order_id, product_id, buyer_id, buyer_name, product['price'], payment_method))
         
         return order_id
     
     def complete_payment(self, order_id):
-        """完成支付"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        # 更新订单状态
-        c.execute('''UPDATE nft_orders 
-            SET payment_status = 'paid', paid_at = ? 
-            WHERE order_id = ?''',
-            (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), order_id))
-        
-        # 获取订单信息
-        c.execute('SELECT product_id FROM nft_orders WHERE order_id = ?', (order_id,))
-        result = c.fetchone()
-        if result:
-            product_id = result[0]
-            # 增加产品购买次数
-            c.execute('''UPDATE nft_products 
-                SET purchase_count = purchase_count + 1 
-                WHERE product_id = ?''', (product_id,))
-        
-        conn.commit()
-        conn.close()
+        """
+        完成支付：订单 pending/processing -> paid（带状态条件，重复调用不会重复计数）
+
+        购买次数不在此处更新：已支付且 purchase_counted = 0 的订单即为待计入的增量，
+        由 flush_purchases() 按商品合并后批量累加，热门商品的并发支付不再争用同一行
+
+        Returns:
+            本次调用是否完成了状态转换（订单不存在或已支付/已失败时为 False）
+        """
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with transaction(self.db_path) as conn:
+            c = conn.execute('''UPDATE nft_orders 
+                SET payment_status = 'paid', paid_at = ?, payment_updated_at = ?, purchase_counted = 0 
+                WHERE order_id = ? AND payment_status IN ('pending', 'processing')''',
+                (now, now, order_id))
+            if c.rowcount != 1:
+                return False
+        self._record_purchase()
         return True
     
+    def _record_purchase(self):
+        """登记一次待计入的购买，按需启动刷新线程；累计到 PURCHASE_FLUSH_BATCH 时立即刷新"""
+        with self._purchase_lock:
+            self._purchase_pending += 1
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_loop, name="purchase-flush", daemon=True)
+                self._flusher.start()
+            if self._purchase_pending >= self.PURCHASE_FLUSH_BATCH:
+                self._flush_event.set()
+    
+    def _flush_loop(self):
+        while True:
+            self._flush_event.wait(self.PURCHASE_FLUSH_INTERVAL)
+            self._flush_event.clear()
+            # 本进程没有新的购买时不刷新，避免空闲时周期性地占用写锁
+            with self._purchase_lock:
+                if not self._purchase_pending:
+                    continue
+            try:
+                self.flush_purchases()
+            except Exception:
+                traceback.print_exc(file=sys.stderr)
+    
+    def flush_purchases(self):
+        """
+        把已支付但尚未计入的订单按商品合并，在一个事务中累加 purchase_count 并标记为已计入
+
+        Returns:
+            {product_id: 最新购买次数}，只包含本次有变化的商品
+        """
+        with self._purchase_lock:
+            self._purchase_pending = 0
+        with transaction(self.db_path) as conn:
+            # BEGIN IMMEDIATE 串行化多个进程的刷新，避免同一批订单被重复计入
+            conn.execute('BEGIN IMMEDIATE')
+            pending = conn.execute(UNCOUNTED_PURCHASES_SQL).fetchall()
+            if not pending:
+                return {}
+            conn.executemany('UPDATE nft_products SET purchase_count = purchase_count + ? WHERE product_id = ?',
+                             [(n, product_id) for product_id, n, _ in pending])
+            conn.executemany('''UPDATE nft_orders SET purchase_counted = 1 
+                WHERE product_id = ? AND payment_status = 'paid' AND purchase_counted = 0 AND id <= ?''',
+                             [(product_id, max_id) for product_id, _, max_id in pending])
+            placeholders = ','.join('?' * len(pending))
+            counts = dict(conn.execute(f'SELECT product_id, purchase_count FROM nft_products '
+                                       f'WHERE product_id IN ({placeholders})', [row[0] for row in pending]).fetchall())
+        self.catalog.set_purchase_counts(counts)
+        return counts
+    
+    def request_payment(self, order_id, idempotency_key=None):
+        """
+        登记支付请求（不调用支付渠道）：待支付或失败的订单置为 pending 并记录请求时间
+
+        同一幂等键重复提交直接返回订单当前状态；处理中 / 已支付的订单不会重复登记
+
+        Returns:
+            (订单支付状态 dict, 是否需要入队处理)；订单不存在时为 (None, False)
+
+        Raises:
+            ValueError: 幂等键已用于其他订单
+        """
+        if self.get_payment_status(order_id) is None:
+            return None, False
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with transaction(self.db_path) as conn:
+            if idempotency_key:
+                # 先写幂等键取得写锁，并发的同键请求只有一个能插入成功
+                c = conn.execute('INSERT OR IGNORE INTO nft_payment_requests (idempotency_key, order_id) VALUES (?, ?)',
+                                 (idempotency_key, order_id))
+                if c.rowcount == 0:
+                    row = conn.execute(IDEMPOTENCY_KEY_SQL, (idempotency_key,)).fetchone()
+                    if row[0] != order_id:
+                        raise ValueError("幂等键已用于其他订单")
+                    return self._payment_status(conn, order_id), False
+            c = conn.execute('''UPDATE nft_orders 
+                SET payment_status = 'pending', payment_requested_at = ?, payment_updated_at = ?, payment_error = NULL 
+                WHERE order_id = ? AND (payment_status = 'failed' 
+                    OR (payment_status = 'pending' AND payment_requested_at IS NULL))''', (now, now, order_id))
+            return self._payment_status(conn, order_id), c.rowcount == 1
+    
+    def start_processing(self, order_id):
+        """pending -> processing，返回是否由本次调用取得处理权（同一订单只会被一个 worker 处理）"""
+        with transaction(self.db_path) as conn:
+            c = conn.execute('''UPDATE nft_orders 
+                SET payment_status = 'processing', payment_attempts = payment_attempts + 1, payment_updated_at = ? 
+                WHERE order_id = ? AND payment_status = 'pending' ''',
+                (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), order_id))
+            return c.rowcount == 1
+    
+    def fail_payment(self, order_id, error):
+        """processing -> failed，可用新的支付请求重试"""
+        with transaction(self.db_path) as conn:
+            c = conn.execute('''UPDATE nft_orders 
+                SET payment_status = 'failed', payment_error = ?, payment_updated_at = ? 
+                WHERE order_id = ? AND payment_status = 'processing' ''',
+                (str(error), datetime.now().strftime('%Y-%m-%d %H:%M:%S'), order_id))
+            return c.rowcount == 1
+    
+    def get_payment_status(self, order_id):
+        """订单支付状态，不存在时返回 None"""
+        return self._payment_status(get_connection(self.db_path), order_id)
+    
+    def pending_payments(self, stale_before):
+        """
+        启动恢复：把 payment_updated_at 早于 stale_before 的 processing 订单退回 pending，
+        返回所有已登记但尚未处理的订单号
+        """
+        with transaction(self.db_path) as conn:
+            conn.execute('''UPDATE nft_orders SET payment_status = 'pending' 
+                WHERE payment_status = 'processing' AND payment_updated_at < ?''', (stale_before,))
+            return [row[0] for row in conn.execute(PENDING_PAYMENTS_SQL)]
+    
+    @staticmethod
+    def _payment_status(conn, order_id):
+        row = conn.execute(PAYMENT_STATUS_SQL, (order_id,)).fetchone()
+        return dict(row) if row else None
+    
     def submit_user_method(self, method_data):
         """用户提交运维方法"""
-        method_id = f"METHOD-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        method_id = f"METHOD-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
         
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''INSERT INTO user_methods 
-            (method_id, title, description, category, author_id, author_name, 
-             price, script_content, os_support)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-            (method_id, method_data.get('title'), method_data.get('description'),
-             method_data.get('category'), method_data.get('author_id'),
-             method_data.get('author_name'), method_data.get('price', 0),
-             method_data.get('script_content'), method_data.get('os_support', '')))
-        conn.commit()
-        conn.close()
+        with transaction(self.db_path) as conn:
+            # 脚本正文按内容去重存储，行中只保存哈希
+            script_hash = BlobStore.put(conn, method_data.get('script_content'))
+            conn.execute('''INSERT INTO user_methods 
+                (method_id, title, description, category, author_id, author_name, 
+                 price, script_hash, os_support)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (method_id, method_data.get('title'), method_data.get('description'),
+                 method_data.get('category'), method_data.get('author_id'),
+                 method_data.get('author_name'), method_data.get('price', 0),
+                 script_hash, method_data.get('os_support', '')))
         
         return method_id
     
-    def get_user_methods(self, author_id=None, limit=50):
+    def get_user_methods(self, author_id=None, limit=50, after_id=None):
         """获取用户上传的运维方法"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        
-        if author_id:
-            c.execute('''SELECT * FROM user_methods 
-                WHERE author_id = ? AND status = 'approved'
-                ORDER BY created_at DESC LIMIT ?''', (author_id, limit))
-        else:
-            c.execute('''SELECT * FROM user_methods 
-                WHERE status = 'approved'
-                ORDER BY created_at DESC LIMIT ?''', (limit,))
-        
-        rows = c.fetchall()
-        conn.close()
-        return [dict(row) for row in rows]
-
+        return list(self.iter_user_methods(author_id=author_id, limit=limit, after_id=after_id))
+    
+    def iter_user_methods(self, author_id=None, limit=50, after_id=None):
+        """按创建时间倒序逐行产出已审核的运维方法（脚本正文只返回 script_hash），after_id 为键集分页游标"""
+        c = get_connection(self.db_path).execute(*user_methods_query(limit, author_id, after_id))
+        for row in c:
+            yield dict(row)
@@ -0,0 +1,74 @@
+"""
+Ollama 大模型客户端
+复用带连接池的 requests.Session（keep-alive），支持逐 token 流式读取
+"""
+import os
+import json
+import requests
+from requests.adapters import HTTPAdapter
+
+SYSTEM_PROMPT = "你是NexGen MetaOps系统运维助手，专业回答系统监控和项目相关问题，回答简洁准确"
+
+
+class OllamaError(Exception):
+    """Ollama 返回非 200 状态"""
+
+    def __init__(self, status_code, text):
+        super().__init__(f"HTTP {status_code}, {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class OllamaClient:
+    """Ollama /api/chat 客户端"""
+
+    def __init__(self, api_url=None, model=None, pool_size=None, timeout=None):
+        self.api_url = api_url or os.environ.get('OLLAMA_API_URL', "http://localhost:11434/api/chat")
+        self.model = model or os.environ.get('OLLAMA_MODEL', "mistral")
+        # (连接超时, 两个数据块之间的读取超时)
+        self.timeout = timeout or (5, 300)
+        pool_size = int(pool_size or os.environ.get('OLLAMA_POOL_SIZE', 16))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _payload(self, question):
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": question}
+            ],
+            "stream": True
+        }
+
+    def stream_chat(self, question):
+        """
+        流式问答，逐块产出回答内容
+
+        Raises:
+            OllamaError: Ollama 返回非 200
+            requests.exceptions.ConnectionError: Ollama 服务未启动
+        """
+        with self.session.post(self.api_url, json=self._payload(question),
+                               stream=True, timeout=self.timeout) as response:
+            if response.status_code != 200:
+                raise OllamaError(response.status_code, response.text)
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                try:
+                    line_data = json.loads(line.decode('utf-8'))
+                except json.JSONDecodeError:
+                    continue
+                content = line_data.get("message", {}).get("content")
+                if content:
+                    yield content
+                if line_data.get("done"):
+                    break
+
+    def chat(self, question):
+        """一次性返回完整回答"""
+        return "".join(self.stream_chat(question)).strip()
@@ -0,0 +1,117 @@
+"""
+异步支付处理
+/api/nft/payment 只登记支付请求并入队，立即返回；后台 worker 线程推进订单状态机
+pending -> processing -> paid / failed。每次转换都是带状态条件的 UPDATE，购买次数由 NFTMarket 按订单的
+purchase_counted 标记批量计入（每笔已支付订单只计一次），重复提交、并发 worker 或重启恢复都不会重复扣款或重复累加购买次数。
+客户端通过 GET /api/nft/payment/<order_id> 轮询结果
+"""
+import os
+import sys
+import time
+import queue
+import threading
+import traceback
+from collections import Counter
+from datetime import datetime, timedelta
+
+# 模拟支付渠道的处理耗时（秒）
+PAYMENT_LATENCY = float(os.environ.get('MONITOR_PAYMENT_LATENCY', 0.5))
+# 处理支付的 worker 线程数
+WORKERS = int(os.environ.get('MONITOR_PAYMENT_WORKERS', 2))
+# 启动时 processing 状态超过该秒数未更新的订单视为中断，退回 pending 重新处理
+STALE_SECONDS = 60
+
+
+def simulated_gateway(order):
+    """模拟支付渠道：等待 PAYMENT_LATENCY 秒后成功；接入真实渠道时失败应抛出异常"""
+    time.sleep(PAYMENT_LATENCY)
+
+
+class PaymentProcessor:
+    """支付请求队列与后台 worker"""
+
+    def __init__(self, market, gateway=None, workers=WORKERS):
+        self.market = market
+        self.gateway = gateway or simulated_gateway
+        self.workers = max(1, workers)
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        # 处理结果计数（paid / failed），供 /metrics 输出
+        self.outcomes = Counter()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def start(self):
+        """启动 worker，并把上次退出时已登记但未完成的支付重新入队"""
+        stale_before = (datetime.now() - timedelta(seconds=STALE_SECONDS)).strftime('%Y-%m-%d %H:%M:%S')
+        for order_id in self.market.pending_payments(stale_before):
+            self._queue.put(order_id)
+        self._ensure_workers()
+
+    def submit(self, order_id, idempotency_key=None):
+        """
+        登记支付请求，需要处理时入队
+
+        Returns:
+            (订单支付状态 dict, 是否为本次新登记)；订单不存在时为 (None, False)
+
+        Raises:
+            ValueError: 幂等键已用于其他订单
+        """
+        status, accepted = self.market.request_payment(order_id, idempotency_key)
+        if accepted:
+            self._queue.put(order_id)
+            self._ensure_workers()
+        return status, accepted
+
+    def close(self, timeout=5.0):
+        """停止 worker（队列中未处理的订单保持 pending，下次启动时恢复）"""
+        with self._lock:
+            threads = [t for t in self._threads if t.is_alive()]
+            self._threads = []
+        for _ in threads:
+            self._queue.put(None)
+        for t in threads:
+            t.join(timeout)
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._worker_loop, name=f"payment-worker-{len(self._threads)}",
+                                     daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _worker_loop(self):
+        while True:
+            order_id = self._queue.get()
+            try:
+                if order_id is None:
+                    return
+                self._process(order_id)
+            except Exception:
+                traceback.print_exc(file=sys.stderr)
+            finally:
+                self._queue.task_done()
+
+    def _process(self, order_id):
+        # pending -> processing：没有取得处理权（已被处理或已完成）时直接跳过
+        if not self.market.start_processing(order_id):
+            return
+        order = self.market.get_payment_status(order_id)
+        try:
+            self.gateway(order)
+        except Exception as e:
+            if self.market.fail_payment(order_id, e):
+                self._count('failed')
+            return
+        if self.market.complete_payment(order_id):
+            self._count('paid')
+
+    def _count(self, outcome):
+        with self._lock:
+            self.outcomes[outcome] += 1
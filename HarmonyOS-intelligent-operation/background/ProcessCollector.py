@@ -0,0 +1,177 @@
+"""
+进程级指标采集
+在两次采集之间保留 psutil.Process 对象，只对新出现的进程读取名称与命令行，
+每轮在 oneshot() 中刷新 CPU 时间；CPU 时间有变化的进程才继续读取 RSS、线程数与 IO 计数器
+（空闲进程沿用上一轮的值，每 FULL_REFRESH_EVERY 轮强制全量刷新一次），
+本地计算 CPU% 与 IO 速率，再用堆（heapq.nlargest）取 Top-N 供 /api/processes/top 查询
+"""
+import os
+import time
+import heapq
+import threading
+import psutil
+from Instrumentation import PSUTIL_LATENCY
+from Profiler import span
+
+# 命令行截断长度
+CMDLINE_LIMIT = 200
+# 空闲进程每隔多少轮强制刷新一次 RSS / 线程数（内存回收等不消耗 CPU 时间的变化）
+FULL_REFRESH_EVERY = 12
+
+
+class _Tracked:
+    """单个进程的缓存句柄与上一轮计数器"""
+    __slots__ = ('proc', 'name', 'cmdline', 'cpu_time', 'io_read', 'io_write', 'io_denied',
+                 'io_at', 'rss', 'threads', 'idle_ticks')
+
+    def __init__(self, proc):
+        self.proc = proc
+        with proc.oneshot():
+            self.name = proc.name()
+            try:
+                self.cmdline = ' '.join(proc.cmdline())[:CMDLINE_LIMIT]
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                self.cmdline = ''
+        self.cpu_time = None
+        self.io_read = None
+        self.io_write = None
+        self.io_at = None
+        self.io_denied = False
+        self.rss = 0
+        self.threads = 0
+        self.idle_ticks = FULL_REFRESH_EVERY
+
+
+class ProcessCollector:
+    """缓存 Process 句柄的 Top-N 进程采集器"""
+
+    def __init__(self, top_n=None, min_interval=None):
+        """
+        Args:
+            top_n: 每个维度保留的进程数（MONITOR_PROCESS_TOP_N，默认 20）
+            min_interval: 两次采集的最小间隔秒数（MONITOR_PROCESS_INTERVAL，默认 5），
+                          作为采样器回调时用于节流
+        """
+        self.top_n = int(top_n or os.environ.get('MONITOR_PROCESS_TOP_N', 20))
+        self.min_interval = float(min_interval or os.environ.get('MONITOR_PROCESS_INTERVAL', 5))
+        self.total_memory = psutil.virtual_memory().total
+        self._tracked = {}
+        self._last_refresh = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._result = None
+
+    def refresh(self):
+        """采集一轮：同步进程表、刷新计数器并计算 Top-N"""
+        with self._refresh_lock, PSUTIL_LATENCY.time(("processes",)), span("psutil", "ProcessCollector.refresh"):
+            return self._refresh()
+
+    def _refresh(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refresh if self._last_refresh else None
+        cpu_capacity = psutil.cpu_count() or 1
+
+        pids = set(psutil.pids())
+        tracked = self._tracked
+        for pid in list(tracked):
+            if pid not in pids:
+                del tracked[pid]
+        for pid in pids - tracked.keys():
+            try:
+                tracked[pid] = _Tracked(psutil.Process(pid))
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                pass
+
+        entries = []
+        for pid, t in list(tracked.items()):
+            try:
+                entries.append(self._update(pid, t, now, elapsed, cpu_capacity))
+            except psutil.NoSuchProcess:
+                del tracked[pid]
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+
+        self._last_refresh = now
+        result = {
+            "sampled_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+            "process_count": len(entries),
+            "by_cpu": heapq.nlargest(self.top_n, entries, key=lambda e: e["cpu_percent"]),
+            "by_memory": heapq.nlargest(self.top_n, entries, key=lambda e: e["rss"]),
+            "by_io": heapq.nlargest(self.top_n, entries, key=lambda e: e["io_read_bps"] + e["io_write_bps"]),
+        }
+        with self._lock:
+            self._result = result
+        return result
+
+    def _update(self, pid, t, now, elapsed, cpu_capacity):
+        """在 oneshot() 中读取本轮需要的属性，返回进程条目"""
+        proc = t.proc
+        io = None
+        with proc.oneshot():
+            times = proc.cpu_times()
+            cpu_time = times.user + times.system
+            # CPU 时间未变化的进程不可能产生新的 IO，RSS 也基本不变，跳过其余 /proc 读取
+            if cpu_time != t.cpu_time or t.idle_ticks >= FULL_REFRESH_EVERY:
+                t.idle_ticks = 0
+                t.rss = proc.memory_info().rss
+                t.threads = proc.num_threads()
+                if not t.io_denied:
+                    try:
+                        io = proc.io_counters()
+                    except (psutil.AccessDenied, AttributeError):
+                        # 无权限（或平台不支持）的进程以后不再尝试读取 IO
+                        t.io_denied = True
+            else:
+                t.idle_ticks += 1
+        rss = t.rss
+
+        cpu_percent = 0.0
+        read_bps = write_bps = 0.0
+        if elapsed and t.cpu_time is not None:
+            # 与 psutil.cpu_percent 一致：单核满载为 100%，上限为核数 * 100%
+            cpu_percent = min(100.0 * cpu_capacity, max(0.0, cpu_time - t.cpu_time) / elapsed * 100)
+        if io is not None and t.io_read is not None and now > t.io_at:
+            # 空闲期间跳过了 IO 读取，速率按距上次读取的时间计算
+            read_bps = max(0, io.read_bytes - t.io_read) / (now - t.io_at)
+            write_bps = max(0, io.write_bytes - t.io_write) / (now - t.io_at)
+        t.cpu_time = cpu_time
+        if io is not None:
+            t.io_read, t.io_write, t.io_at = io.read_bytes, io.write_bytes, now
+
+        return {
+            "pid": pid,
+            "name": t.name,
+            "cmdline": t.cmdline,
+            "cpu_percent": round(cpu_percent, 2),
+            "rss": rss,
+            "rss_mb": round(rss / 1024 / 1024, 2),
+            "memory_percent": round(rss / self.total_memory * 100, 2),
+            "num_threads": t.threads,
+            "io_read_bps": round(read_bps, 1),
+            "io_write_bps": round(write_bps, 1),
+        }
+
+    def observe_snapshot(self, snapshot):
+        """采样器回调：按 min_interval 节流后采集一轮"""
+        if self._last_refresh and time.monotonic() - self._last_refresh < self.min_interval:
+            return
+        self.refresh()
+
+    def top(self, n=None, sort=None):
+        """
+        返回最近一轮的 Top-N（尚未采集时立即采集一轮）
+
+        Args:
+            n: 每个维度返回的条数（不超过 top_n）
+            sort: cpu / memory / io，只返回该维度；None 返回全部
+        """
+        with self._lock:
+            result = self._result
+        if result is None:
+            result = self.refresh()
+        n = self.top_n if n is None else max(1, min(n, self.top_n))
+        keys = (f"by_{sort}",) if sort else ("by_cpu", "by_memory", "by_io")
+        data = {"sampled_at": result["sampled_at"], "process_count": result["process_count"]}
+        for key in keys:
+            data[key] = result[key][:n]
+        return data
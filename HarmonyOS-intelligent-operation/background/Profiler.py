@@ -0,0 +1,259 @@
+"""
+请求剖析（默认关闭，MONITOR_PROFILE=1 开启）
+为每个被采样的请求记录分段耗时（SQL 语句、psutil 调用、JSON 序列化、文件写入），
+完成的请求进入固定容量的环形缓冲区，/api/debug/profile 返回其中最慢的 N 个；
+/api/debug/profile/flamegraph 按需用 sys._current_frames() 做统计采样，输出 flamegraph.pl / speedscope 可读的折叠栈文本
+"""
+import os
+import sys
+import time
+import heapq
+import random
+import threading
+from collections import deque, Counter
+from contextlib import contextmanager
+
+ENABLED = os.environ.get('MONITOR_PROFILE', '0') == '1'
+# 环形缓冲区保留的已完成请求数
+RING_SIZE = int(os.environ.get('MONITOR_PROFILE_RING', 500))
+# 被剖析请求的比例（0~1）
+SAMPLE_RATE = float(os.environ.get('MONITOR_PROFILE_SAMPLE', 1.0))
+# 单个请求最多记录的分段数，超出只计数
+MAX_SPANS = 256
+# 分段描述（SQL 文本等）截断长度
+DETAIL_LIMIT = 200
+# 统计采样的时长与间隔上限
+MAX_SAMPLE_SECONDS = 30.0
+MIN_SAMPLE_INTERVAL = 0.001
+
+_local = threading.local()
+
+
+class _Trace:
+    __slots__ = ('method', 'path', 'route', 'started', 'started_at', 'spans', 'dropped')
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.route = None
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.spans = []
+        self.dropped = 0
+
+
+def add_span(kind, detail, started, duration):
+    """
+    为当前线程正在剖析的请求追加一个分段（不在请求中或未采样时直接返回）
+
+    Args:
+        kind: sql / psutil / json / file
+        detail: 描述（SQL 文本、函数名、文件路径）
+        started: time.perf_counter() 起点
+        duration: 耗时（秒）
+    """
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return
+    if len(trace.spans) >= MAX_SPANS:
+        trace.dropped += 1
+        return
+    trace.spans.append((kind, detail, started, duration))
+
+
+@contextmanager
+def span(kind, detail):
+    """分段计时上下文管理器"""
+    if getattr(_local, 'trace', None) is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(kind, detail, started, time.perf_counter() - started)
+
+
+def _compact(detail):
+    return ' '.join(str(detail).split())[:DETAIL_LIMIT]
+
+
+class RequestProfiler:
+    """请求分段记录与最近请求环形缓冲区"""
+
+    def __init__(self, ring_size=RING_SIZE, sample_rate=SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self._ring = deque(maxlen=ring_size)
+        self._lock = threading.Lock()
+
+    def start(self, method, path):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            _local.trace = None
+            return
+        _local.trace = _Trace(method, path)
+
+    def finish(self, route, status):
+        trace = getattr(_local, 'trace', None)
+        if trace is None:
+            return
+        _local.trace = None
+        duration = time.perf_counter() - trace.started
+        with self._lock:
+            self._ring.append((duration, trace, route, status))
+
+    def slowest(self, n=10, route=None):
+        """环形缓冲区中最慢的 n 个请求（可按路由过滤）"""
+        with self._lock:
+            entries = list(self._ring)
+        if route:
+            entries = [e for e in entries if e[2] == route]
+        return [self._describe(*e) for e in heapq.nlargest(n, entries, key=lambda e: e[0])]
+
+    def clear(self):
+        with self._lock:
+            self._ring.clear()
+
+    @staticmethod
+    def _describe(duration, trace, route, status):
+        summary = {}
+        spans = []
+        for kind, detail, started, elapsed in trace.spans:
+            item = summary.setdefault(kind, {"count": 0, "total_ms": 0.0})
+            item["count"] += 1
+            item["total_ms"] += elapsed * 1000
+            spans.append({
+                "kind": kind,
+                "detail": _compact(detail),
+                "offset_ms": round((started - trace.started) * 1000, 3),
+                "duration_ms": round(elapsed * 1000, 3)
+            })
+        for item in summary.values():
+            item["total_ms"] = round(item["total_ms"], 3)
+        accounted = sum(item["total_ms"] for item in summary.values())
+        return {
+            "method": trace.method,
+            "path": trace.path,
+            "route": route,
+            "status": status,
+            "started_at": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(trace.started_at)),
+            "duration_ms": round(duration * 1000, 3),
+            "unaccounted_ms": round(max(0.0, duration * 1000 - accounted), 3),
+            "summary": summary,
+            "spans": spans,
+            "dropped_spans": trace.dropped
+        }
+
+
+class StackSampler:
+    """按需统计采样：定时抓取所有线程的调用栈，累计折叠栈出现次数"""
+
+    def __init__(self):
+        self._busy = threading.Lock()
+
+    def sample(self, seconds=5.0, interval=0.005, include_idle=False):
+        """
+        采样 seconds 秒，返回折叠栈文本（每行 "帧;帧;帧 次数"，根帧在前）
+
+        Returns:
+            折叠栈文本；已有采样在进行时返回 None
+        """
+        if not self._busy.acquire(blocking=False):
+            return None
+        try:
+            seconds = min(max(seconds, interval), MAX_SAMPLE_SECONDS)
+            interval = max(interval, MIN_SAMPLE_INTERVAL)
+            me = threading.get_ident()
+            names = {}
+            folded = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                frames = sys._current_frames()
+                if len(names) != len(frames):
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in frames.items():
+                    if ident == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    if not include_idle and stack and stack[0].startswith(('wait (', 'select (', 'poll (', '_wait_for_tstate_lock (')):
+                        continue
+                    stack.append(names.get(ident, str(ident)))
+                    folded[';'.join(reversed(stack))] += 1
+                del frames
+                time.sleep(interval)
+            return ''.join(f"{stack} {count}\n" for stack, count in folded.most_common())
+        finally:
+            self._busy.release()
+
+
+def install(app, profiler=None):
+    """
+    为 Flask 应用注册剖析钩子（仅 ENABLED 时）与 /api/debug/profile 接口
+
+    Returns:
+        RequestProfiler；未开启时为 None
+    """
+    from flask import Response, g, jsonify, request
+    from flask.json.provider import DefaultJSONProvider
+
+    stack_sampler = StackSampler()
+    if ENABLED:
+        profiler = profiler or RequestProfiler()
+
+        class ProfiledJSONProvider(DefaultJSONProvider):
+            def dumps(self, obj, **kwargs):
+                with span("json", "dumps"):
+                    return super().dumps(obj, **kwargs)
+
+        app.json = ProfiledJSONProvider(app)
+
+        @app.before_request
+        def _profile_start():
+            profiler.start(request.method, request.path)
+
+        @app.after_request
+        def _profile_status(response):
+            g._profile_status = response.status_code
+            return response
+
+        @app.teardown_request
+        def _profile_finish(exc):
+            route = request.url_rule.rule if request.url_rule is not None else None
+            profiler.finish(route, 500 if exc is not None else g.pop('_profile_status', None))
+
+    def _disabled():
+        return jsonify({"code": 1, "message": "请求剖析未开启（设置 MONITOR_PROFILE=1 后重启）"}), 404
+
+    @app.route('/api/debug/profile', methods=['GET', 'DELETE'])
+    def debug_profile():
+        """最慢的 N 个请求及其分段耗时；DELETE 清空环形缓冲区"""
+        if profiler is None:
+            return _disabled()
+        if request.method == 'DELETE':
+            profiler.clear()
+            return jsonify({"code": 0, "message": "已清空"})
+        try:
+            n = max(1, min(int(request.args.get('n', 10)), RING_SIZE))
+        except ValueError:
+            return jsonify({"code": 1, "message": "n 必须为整数"}), 400
+        return jsonify({"code": 0, "data": profiler.slowest(n, request.args.get('route'))})
+
+    @app.route('/api/debug/profile/flamegraph', methods=['GET'])
+    def debug_flamegraph():
+        """统计采样 seconds 秒（默认 5），返回折叠栈文本"""
+        if profiler is None:
+            return _disabled()
+        try:
+            seconds = float(request.args.get('seconds', 5))
+            interval = float(request.args.get('interval', 0.005))
+        except ValueError:
+            return jsonify({"code": 1, "message": "seconds / interval 必须为数字"}), 400
+        folded = stack_sampler.sample(seconds, interval, request.args.get('idle') == '1')
+        if folded is None:
+            return jsonify({"code": 1, "message": "已有采样正在进行"}), 409
+        return Response(folded, content_type='text/plain; charset=utf-8')
+
+    return profiler
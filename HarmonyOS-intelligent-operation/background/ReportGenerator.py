@@ -4,10 +4,11 @@ NFT风格报告生成器 - 数据故障修复报告
 """
 import os
 import json
-import sqlite3
 import platform
 from datetime import datetime
 from ErrorLogger import ErrorLogger
+from ReportStore import ReportStore
+from Profiler import span
 
 class NFTReportGenerator:
     """NFT风格报告生成器"""
@@ -15,6 +16,7 @@ class NFTReportGenerator:
     def __init__(self, db_path=None):
         self.db_path = db_path or os.path.join(os.path.dirname(__file__), 'monitor.db')
         self.error_logger = ErrorLogger(db_path=self.db_path)
+        self.report_store = ReportStore(db_path=self.db_path)
     
     def generate_fault_repair_report(self, report_id=None, title="数据故障修复报告"):
         """
@@ -283,26 +285,30 @@ class NFTReportGenerator:
         return "\n".join(lines)
     
     def save_report(self, report, format='both'):
-        """保存报告到文件"""
-        report_dir = os.path.join(os.path.dirname(__file__), 'reports')
-        os.makedirs(report_dir, exist_ok=True)
+        """保存报告到文件，并登记到报告索引"""
+        report_dir = self.report_store.report_dir
         
         report_id = report['report_id']
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
         saved_files = []
+        json_file = text_file = None
         
         if format in ['json', 'both']:
             json_file = os.path.join(report_dir, f"{report_id}_{timestamp}.json")
-            with open(json_file, 'w', encoding='utf-8') as f:
+            with span("file", json_file), open(json_file, 'w', encoding='utf-8') as f:
                 json.dump(report['json'], f, ensure_ascii=False, indent=2)
             saved_files.append(json_file)
         
         if format in ['text', 'both']:
             text_file = os.path.join(report_dir, f"{report_id}_{timestamp}.txt")
-            with open(text_file, 'w', encoding='utf-8') as f:
+            with span("file", text_file), open(text_file, 'w', encoding='utf-8') as f:
                 f.write(report['text'])
             saved_files.append(text_file)
         
+        if saved_files:
+            self.report_store.register(report_id, report['json'].get('title'),
+                                       report['json'].get('generated_at'), json_file, text_file)
+        
         return saved_files
 
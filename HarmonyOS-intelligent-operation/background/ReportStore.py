@@ -0,0 +1,152 @@
+"""
+报告存储索引
+reports 表按 report_id 记录 save_report() 写出的 JSON/TXT 文件，
+读取已生成报告时直接返回落盘文件，不再重新查询错误统计和渲染
+"""
+import os
+import json
+from datetime import datetime
+from Database import get_connection, transaction
+
+# 列表接口返回的列（不读取文件内容）
+_LIST_COLUMNS = ('report_id, title, generated_at, json_size, text_size, '
+                 'json_file IS NOT NULL AS has_json, text_file IS NOT NULL AS has_text')
+
+
+def list_query(limit, after=None):
+    """
+    报告列表查询（按生成时间倒序），返回 (sql, params)；同时供 Migrations.hot_queries() 检查执行计划
+
+    Args:
+        after: 键集分页游标 (generated_at, report_id)
+    """
+    if after:
+        return f'''SELECT {_LIST_COLUMNS} FROM reports
+            WHERE (generated_at, report_id) < (?, ?)
+            ORDER BY generated_at DESC, report_id DESC LIMIT ?''', (after[0], after[1], limit)
+    return f'''SELECT {_LIST_COLUMNS} FROM reports
+        ORDER BY generated_at DESC, report_id DESC LIMIT ?''', (limit,)
+
+
+class ReportStore:
+    """已生成报告的索引（SQLite）"""
+
+    def __init__(self, db_path=None, report_dir=None):
+        self.db_path = db_path or os.path.join(os.path.dirname(__file__), 'monitor.db')
+        # MONITOR_REPORT_DIR 可把报告写到其他目录（压测时使用临时目录）
+        self.report_dir = report_dir or os.environ.get('MONITOR_REPORT_DIR') or os.path.join(os.path.dirname(__file__), 'reports')
+        os.makedirs(self.report_dir, exist_ok=True)
+        self._init_table()
+        self.backfill()
+
+    def _init_table(self):
+        """初始化报告索引表"""
+        with transaction(self.db_path) as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS reports (
+                report_id TEXT PRIMARY KEY,
+                title TEXT,
+                generated_at TEXT NOT NULL,
+                json_file TEXT,
+                text_file TEXT,
+                json_size INTEGER,
+                text_size INTEGER,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_generated_at ON reports(generated_at, report_id)')
+
+    def register(self, report_id, title, generated_at, json_file=None, text_file=None):
+        """登记（或覆盖）一份报告的落盘文件，文件路径按 report_dir 下的文件名保存"""
+        json_name = os.path.basename(json_file) if json_file else None
+        text_name = os.path.basename(text_file) if text_file else None
+        with transaction(self.db_path) as conn:
+            conn.execute('''INSERT INTO reports
+                (report_id, title, generated_at, json_file, text_file, json_size, text_size)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(report_id) DO UPDATE SET
+                    title = excluded.title,
+                    generated_at = excluded.generated_at,
+                    json_file = coalesce(excluded.json_file, json_file),
+                    text_file = coalesce(excluded.text_file, text_file),
+                    json_size = coalesce(excluded.json_size, json_size),
+                    text_size = coalesce(excluded.text_size, text_size)''',
+                (report_id, title, generated_at, json_name, text_name,
+                 self._size(json_name), self._size(text_name)))
+
+    def _size(self, name):
+        if not name:
+            return None
+        try:
+            return os.path.getsize(os.path.join(self.report_dir, name))
+        except OSError:
+            return None
+
+    def backfill(self):
+        """把 reports 目录中尚未登记的历史文件（{report_id}_{YYYYmmdd}_{HHMMSS}.json/.txt）补录到索引"""
+        known = set()
+        for row in get_connection(self.db_path).execute('SELECT json_file, text_file FROM reports'):
+            known.update(name for name in row if name)
+
+        found = {}
+        for name in sorted(os.listdir(self.report_dir)):
+            if name in known:
+                continue
+            stem, ext = os.path.splitext(name)
+            parts = stem.rsplit('_', 2)
+            if ext not in ('.json', '.txt') or len(parts) != 3:
+                continue
+            report_id, day, clock = parts
+            try:
+                saved_at = datetime.strptime(f"{day}{clock}", '%Y%m%d%H%M%S').strftime('%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                continue
+            entry = found.setdefault(report_id, {"title": None, "generated_at": saved_at})
+            entry["json_file" if ext == '.json' else "text_file"] = name
+            # 同一 report_id 有多份时保留最新的
+            entry["generated_at"] = max(entry["generated_at"], saved_at)
+
+        for report_id, entry in found.items():
+            if entry.get("json_file"):
+                try:
+                    with open(os.path.join(self.report_dir, entry["json_file"]), encoding='utf-8') as f:
+                        meta = json.load(f)
+                    entry["title"] = meta.get("title")
+                    entry["generated_at"] = meta.get("generated_at") or entry["generated_at"]
+                except (OSError, ValueError):
+                    pass
+            self.register(report_id, entry["title"], entry["generated_at"],
+                          entry.get("json_file"), entry.get("text_file"))
+        return len(found)
+
+    def get(self, report_id):
+        """返回报告索引记录（附带文件绝对路径），不存在返回 None"""
+        row = get_connection(self.db_path).execute(
+            'SELECT * FROM reports WHERE report_id = ?', (report_id,)).fetchone()
+        if not row:
+            return None
+        record = dict(row)
+        for key in ('json_file', 'text_file'):
+            if record[key]:
+                record[key] = os.path.join(self.report_dir, record[key])
+        return record
+
+    def list(self, limit=50, after_id=None):
+        """
+        按生成时间倒序分页列出报告（键集分页）
+
+        Args:
+            limit: 每页条数
+            after_id: 上一页最后一条的 report_id
+        Returns:
+            (records, next_after_id)
+        """
+        conn = get_connection(self.db_path)
+        after = None
+        if after_id:
+            cursor_row = conn.execute('SELECT generated_at FROM reports WHERE report_id = ?', (after_id,)).fetchone()
+            if not cursor_row:
+                return [], None
+            after = (cursor_row['generated_at'], after_id)
+        rows = conn.execute(*list_query(limit, after)).fetchall()
+        records = [dict(row) for row in rows]
+        next_after_id = records[-1]['report_id'] if records and len(records) == limit else None
+        return records, next_after_id
@@ -0,0 +1,143 @@
+"""
+读接口响应缓存
+进程内 LRU + TTL 存储，条目带标签（如 error_logs / monitor_config）；
+数据写入方调用 invalidate(标签) 精确失效相关条目。标签维护代数计数，
+计算期间发生失效的结果不会写回缓存，避免把旧数据缓存到 TTL 结束。
+invalidate 只作用于本进程；多 worker 部署时 cached(version=...) 为条目记录数据版本号
+（如 config_versions 中由触发器维护的版本），命中时版本不一致即视为失效，其他进程的写入同样生效
+"""
+import time
+import threading
+import functools
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """带标签失效与命中统计的 LRU/TTL 缓存"""
+
+    def __init__(self, max_entries=256, default_ttl=30.0):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags, version)
+        self._tag_keys = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _count(self, name, field):
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = {"hits": 0, "misses": 0}
+        stats[field] += 1
+
+    def get(self, key, name=None, version=None):
+        """返回 (是否命中, 值)；version 与写入时记录的版本号不一致的条目视为失效"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now and entry[3] == version:
+                self._entries.move_to_end(key)
+                self._count(name or key[0], "hits")
+                return True, entry[1]
+            if entry is not None:
+                self._remove(key)
+            self._count(name or key[0], "misses")
+        return False, None
+
+    def generations(self, tags):
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def set(self, key, value, ttl=None, tags=(), generations=None, version=None):
+        """
+        写入缓存
+
+        Args:
+            generations: 计算开始前 generations(tags) 的返回值；与当前不一致说明期间已失效，放弃写入
+            version: 计算开始前读取的数据版本号，随条目保存供 get() 比较
+        """
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            if generations is not None and generations != tuple(self._generations.get(t, 0) for t in tags):
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, value, tuple(tags), version)
+            for tag in tags:
+                self._tag_keys.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def _remove(self, key):
+        _, _, tags, _ = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+
+    def invalidate(self, *tags):
+        """使带任一标签的条目失效"""
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in list(self._tag_keys.pop(tag, ())):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tag_keys.clear()
+
+    def cached(self, name, ttl=None, tags=(), key=None, version=None):
+        """
+        函数结果缓存装饰器（只缓存正常返回的结果，异常直接抛出）
+
+        Args:
+            name: 统计名称，同时作为缓存键前缀
+            ttl: 过期秒数，None 使用 default_ttl
+            tags: 失效标签
+            key: callable(*args, **kwargs) -> 可哈希对象；缺省使用参数本身
+            version: callable() -> 数据版本号（应远比被缓存的计算廉价）；每次读取时比较，跨进程失效
+        """
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                cache_key = (name, key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items()))))
+                current = version() if version else None
+                hit, value = self.get(cache_key, name, current)
+                if hit:
+                    return value
+                generations = self.generations(tags)
+                value = fn(*args, **kwargs)
+                # 保存计算前读到的版本：计算期间其他进程的写入会使下次读取不命中
+                self.set(cache_key, value, ttl, tags, generations, current)
+                return value
+            wrapper.cache = self
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """命中/未命中计数（总计与按名称）"""
+        with self._lock:
+            by_name = {name: dict(s) for name, s in self._stats.items()}
+            entries = len(self._entries)
+        hits = sum(s["hits"] for s in by_name.values())
+        misses = sum(s["misses"] for s in by_name.values())
+        for s in by_name.values():
+            total = s["hits"] + s["misses"]
+            s["hit_ratio"] = round(s["hits"] / total, 4) if total else None
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+            "entries": entries,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "by_name": by_name
+        }
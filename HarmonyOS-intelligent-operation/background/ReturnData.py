@@ -1,60 +1,30 @@
 import os
-import time
 import psutil
-from datetime import datetime, timedelta
-import random
-
-def return_anomaly_data(dataset="nyc_taxi"):
-    """根据数据集参数返回对应异常数据，nyc_taxi数据集返回2025年数据"""
-    if dataset == "nyc_taxi":
-        return [
-            {
-                "timestamp": "2025-08-15 09:00:00",
-                "prediction": 5.313,
-                "real_value": 2.431,
-                "is_anomaly": 1
-            },
-            {
-                "timestamp": "2025-08-15 09:05:00",
-                "prediction": 5.657,
-                "real_value": 3.039,
-                "is_anomaly": 1
-            },
-            {
-                "timestamp": "2025-08-15 09:10:00",
-                "prediction": 6.315,
-                "real_value": 4.001,
-                "is_anomaly": 1
-            }
-        ]
-    # 其他数据集 - 保留原有实时数据逻辑
-    else:
-        historical_data = [
-            {"prediction": 6.490, "real_value": 4.402},
-            {"prediction": 4.930, "real_value": 2.840},
-            {"prediction": 5.617, "real_value": 3.322}
-        ]
-        real_time_data = []
-        now = datetime.now()
-        for i, item in enumerate(historical_data):
-            delta = timedelta(minutes=25 - i*5)
-            real_time = now - delta
-            real_time_data.append({
-                "timestamp": real_time.strftime("%Y-%m-%d %H:%M:%S"),
-                "prediction": item["prediction"],
-                "real_value": item["real_value"],
-                "is_anomaly": 1
-            })
-        return real_time_data
+from Profiler import span
+from datetime import datetime
 
 # 恢复系统监控数据采集函数完整实现
 def return_monitor_data_dynamic_one():
     """采集并返回系统实时监控数据"""
+    return collect_monitor_snapshot(cpu_interval=1)
+
+def collect_monitor_snapshot(cpu_interval=None):
+    """
+    采集一次系统监控快照
+
+    Args:
+        cpu_interval: 传给 psutil.cpu_percent 的采样间隔；None 表示与上次调用比较，不阻塞
+    """
+    with span("psutil", "collect_monitor_snapshot"):
+        return _collect_monitor_snapshot(cpu_interval)
+
+
+def _collect_monitor_snapshot(cpu_interval):
     try:
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         # CPU数据
-        cpu_percent = psutil.cpu_percent(interval=1, percpu=True)
+        cpu_percent = psutil.cpu_percent(interval=cpu_interval, percpu=True)
         cpu_count = psutil.cpu_count(logical=True)
         
         # 磁盘数据（Windows系统适配）
@@ -109,30 +79,28 @@ def return_monitor_data_dynamic_one():
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
 
-def return_monitor_data_dynamic(num):
-    """返回动态预测数据"""
+def return_monitor_data_dynamic(num, real_data=None, forecaster=None, metrics=('cpu',)):
+    """
+    返回动态预测数据
+
+    Args:
+        num: 预测步数
+        real_data: 采样器提供的最新快照，缺省时现场采集
+        forecaster: ForecastService 实例（维护滚动窗口与模型）；缺省时仅用当前快照做统计预测
+        metrics: 需要预测的指标
+    """
     try:
-        # 获取最新实时数据
-        real_data = return_monitor_data_dynamic_one()
+        if real_data is None:
+            real_data = return_monitor_data_dynamic_one()
         if "error" in real_data:
             return real_data
-            
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        data_length = 30
-        
-        # 生成基于CPU使用率的预测数据
-        cpu_avg = sum(real_data["cpu_data"]["cpu_percent"]) / len(real_data["cpu_data"]["cpu_percent"])
-        real_values = [round(cpu_avg + random.uniform(-5, 5), 2) for _ in range(data_length)]
-        predict_values = [round(val + random.uniform(-3, 3), 2) for val in real_values[-10:]]
-        
-        return {
-            "timestamp": current_time,
-            "real_values": real_values,
-            "predict_values": predict_values,
-            "num": num
-        }
+        if forecaster is None:
+            from ForecastService import ForecastService
+            forecaster = ForecastService()
+            forecaster.observe_snapshot(real_data)
+        return forecaster.monitor_data(num, metrics=tuple(metrics), sample_age=real_data.get("sample_age", 0))
     except Exception as e:
         return {
             "error": f"预测数据错误: {str(e)}",
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
\ No newline at end of file
+        }
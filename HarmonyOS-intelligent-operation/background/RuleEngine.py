@@ -0,0 +1,255 @@
+"""
+阈值告警规则引擎
+monitor_config 中的阈值编译为 NumPy 数组（指标下标 / 阈值 / 方向），
+每个采样快照一次向量化比较全部规则；带回差（hysteresis）避免在阈值附近抖动，
+仅在规则由正常转为告警时写一条 ErrorLogger 日志（持续告警按 renotify 间隔重复提醒）。
+多进程部署时每个 worker 各自评估：monitor_config 的变更通过 config_versions 版本号（触发器维护）
+在每次评估前检测并重新加载；提醒前在 rule_alert_state 表中按规则原子认领，同一告警只由一个进程写日志
+"""
+import os
+import sys
+import time
+import sqlite3
+import threading
+import traceback
+import numpy as np
+from Database import get_connection, transaction
+
+# 规则可引用的指标（快照 -> 向量的顺序）
+METRIC_KEYS = (
+    'cpu_percent', 'memory_percent', 'disk_io_percent', 'net_kbps', 'load1',
+    'process_count', 'tcp_connections', 'disk_free_gb', 'cpu_temperature', 'swap_percent',
+    'disk_free_percent'
+)
+
+# 百分比指标的阈值若写成 0~1 的小数（如 0.85），按比例换算为百分数
+PERCENT_KEYS = ('cpu_percent', 'memory_percent', 'disk_io_percent', 'swap_percent', 'disk_free_percent')
+
+# 预置配置名称 -> (指标, 方向)；方向 1 表示高于阈值告警，-1 表示低于阈值告警
+PRESET_RULES = {
+    "CPU利用率阈值": ('cpu_percent', 1),
+    "内存占用率阈值": ('memory_percent', 1),
+    "磁盘IO阈值": ('disk_io_percent', 1),
+    "网络流量上限": ('net_kbps', 1),
+    "系统负载阈值": ('load1', 1),
+    "进程数阈值": ('process_count', 1),
+    "TCP连接数阈值": ('tcp_connections', 1),
+    "磁盘剩余空间下限": ('disk_free_gb', -1),
+    "CPU温度阈值": ('cpu_temperature', 1),
+    "内存交换区阈值": ('swap_percent', 1),
+    # 早期版本数据库中的配置名称
+    "CPU使用率监控": ('cpu_percent', 1),
+    "内存使用监控": ('memory_percent', 1),
+    "磁盘空间监控": ('disk_free_percent', -1),
+}
+
+# /api/monitor-configs 列表查询（同时供 Migrations.hot_queries() 检查执行计划）
+CONFIG_LIST_SQL = "SELECT * FROM monitor_config ORDER BY created_at DESC"
+# 数据版本号（config_versions 由触发器维护，迁移 11 / 12）
+CONFIG_VERSION_SQL = "SELECT version FROM config_versions WHERE name = ?"
+
+# 告警恢复需回落到阈值的 (1 - HYSTERESIS) 以下（下限规则为回升到 1 + HYSTERESIS 以上）
+HYSTERESIS = float(os.environ.get('MONITOR_RULE_HYSTERESIS', 0.05))
+# 持续告警的重复提醒间隔（秒），0 表示只在状态变化时提醒
+RENOTIFY_SECONDS = float(os.environ.get('MONITOR_RULE_RENOTIFY', 1800))
+# 多进程去重窗口（秒）：同一规则在该时间内已由其他进程提醒过的新告警不再重复写日志
+DEDUP_SECONDS = float(os.environ.get('MONITOR_RULE_DEDUP', 60))
+
+
+def resolve_rule(name):
+    """
+    把配置名称解析为 (指标, 方向)，无法识别返回 None
+
+    除预置名称外也接受直接写指标名（如 "load1"），名称中含“下限”时为低于阈值告警
+    """
+    if name in PRESET_RULES:
+        return PRESET_RULES[name]
+    key = (name or '').split('下限')[0].strip()
+    if key in METRIC_KEYS:
+        return key, -1 if '下限' in name else 1
+    return None
+
+
+def snapshot_metrics(snapshot):
+    """把采样器快照转换为按 METRIC_KEYS 排列的向量，缺失的指标为 NaN"""
+    cpu_list = snapshot["cpu_data"]["cpu_percent"]
+    net = snapshot.get("net_data", {})
+    system = snapshot.get("system_data", {})
+    load_avg = system.get("load_avg")
+    values = (
+        sum(cpu_list) / len(cpu_list) if cpu_list else None,
+        snapshot["memory_data"]["basic_info"]["percent"],
+        system.get("disk_io_percent"),
+        (net.get("bytes_sent_per_sec", 0) + net.get("bytes_recv_per_sec", 0)) / 1024,
+        load_avg[0] if load_avg else None,
+        system.get("process_count"),
+        system.get("tcp_connections"),
+        snapshot["disk_data"]["disk_usage"]["free"],
+        system.get("cpu_temperature"),
+        system.get("swap_percent"),
+        100 - snapshot["disk_data"]["disk_usage"]["percent"],
+    )
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+
+class RuleEngine:
+    """monitor_config 阈值规则的编译与评估"""
+
+    def __init__(self, db_path=None, error_logger=None, hysteresis=HYSTERESIS, renotify=RENOTIFY_SECONDS,
+                 dedup=DEDUP_SECONDS):
+        self.db_path = db_path or os.path.join(os.path.dirname(__file__), 'monitor.db')
+        self.error_logger = error_logger
+        self.hysteresis = hysteresis
+        self.renotify = renotify
+        self.dedup = dedup
+        self._lock = threading.RLock()
+        self.unmapped = []
+        self.evaluations = 0
+        # 已加载规则对应的 monitor_config 版本号（迁移前为 None）
+        self.version = None
+        self._compile([])
+
+    def _compile(self, rules):
+        """rules: [(id, name, metric, direction, threshold)]；保留未变化规则的告警状态"""
+        previous = {}
+        if getattr(self, 'ids', None) is not None:
+            for i, key in enumerate(zip(self.ids.tolist(), self.metric_idx.tolist(),
+                                        self.direction.tolist(), self.threshold.tolist())):
+                previous[key] = (self.active[i], self.last_notified[i], self.since[i])
+
+        index = {key: i for i, key in enumerate(METRIC_KEYS)}
+        self.names = [r[1] for r in rules]
+        self.ids = np.array([r[0] for r in rules], dtype=np.int64)
+        self.metric_idx = np.array([index[r[2]] for r in rules], dtype=np.int64)
+        self.direction = np.array([r[3] for r in rules], dtype=float)
+        self.threshold = np.array([r[4] for r in rules], dtype=float)
+        # 恢复线：高于阈值告警的规则回落到 threshold - band 才算恢复
+        self.clear_level = self.threshold - self.direction * self.hysteresis * np.abs(self.threshold)
+        self.active = np.zeros(len(rules), dtype=bool)
+        self.last_notified = np.zeros(len(rules))
+        self.since = np.zeros(len(rules))
+        self.last_values = np.full(len(rules), np.nan)
+
+        for i, key in enumerate(zip(self.ids.tolist(), self.metric_idx.tolist(),
+                                    self.direction.tolist(), self.threshold.tolist())):
+            if key in previous:
+                self.active[i], self.last_notified[i], self.since[i] = previous[key]
+
+    def _config_version(self):
+        try:
+            row = get_connection(self.db_path).execute(CONFIG_VERSION_SQL, ('monitor_config',)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    def reload_if_changed(self):
+        """monitor_config 版本号变化（任一进程增删改了配置）时重新加载规则"""
+        version = self._config_version()
+        if version is not None and version != self.version:
+            self.reload()
+
+    def reload(self):
+        """从 monitor_config 重新加载规则（配置增删改后调用）"""
+        # 先读版本号再读规则：两者之间的变更会在下次检测时再次加载
+        version = self._config_version()
+        rows = get_connection(self.db_path).execute(
+            'SELECT id, name, threshold FROM monitor_config ORDER BY id').fetchall()
+        rules = []
+        unmapped = []
+        for row in rows:
+            resolved = resolve_rule(row['name'])
+            if resolved is None or row['threshold'] is None:
+                unmapped.append(row['name'])
+                continue
+            metric, direction = resolved
+            threshold = float(row['threshold'])
+            if metric in PERCENT_KEYS and 0 < threshold <= 1:
+                threshold *= 100
+            rules.append((row['id'], row['name'], metric, direction, threshold))
+        with self._lock:
+            self._compile(rules)
+            self.unmapped = unmapped
+            self.version = version
+        return len(rules)
+
+    def evaluate(self, values, now=None):
+        """
+        用一个指标向量评估全部规则
+
+        Args:
+            values: 按 METRIC_KEYS 排列的指标值（NaN 表示本次缺失，规则保持原状态）
+        Returns:
+            (新触发或需重复提醒的规则下标, 本次恢复的规则下标)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            x = values[self.metric_idx]
+            signed = self.direction * x
+            breach = signed > self.direction * self.threshold
+            clear = signed < self.direction * self.clear_level
+            active = np.where(self.active, ~clear, breach)
+
+            fired = active & ~self.active
+            if self.renotify > 0:
+                fired |= active & self.active & (now - self.last_notified >= self.renotify)
+            recovered = self.active & ~active
+
+            self.since[active & ~self.active] = now
+            self.last_notified[fired] = now
+            self.active = active
+            self.last_values = x
+            self.evaluations += 1
+        return np.nonzero(fired)[0], np.nonzero(recovered)[0]
+
+    def observe_snapshot(self, snapshot):
+        """采样器回调：评估快照并把触发的告警写入 ErrorLogger"""
+        if "error" in snapshot:
+            return
+        self.reload_if_changed()
+        values = snapshot_metrics(snapshot)
+        now = time.time()
+        # 持锁生成消息，避免评估后规则被 reload 导致下标错位
+        with self._lock:
+            fired, _ = self.evaluate(values, now)
+            # 新触发的告警 since 与 last_notified 相同，按去重窗口认领；重复提醒按 renotify 间隔认领
+            alerts = [(int(self.ids[i]), self.dedup if self.since[i] == self.last_notified[i] else self.renotify,
+                       self._describe(i)) for i in fired]
+        if self.error_logger is None:
+            return
+        for rule_id, gap, message in alerts:
+            if self._claim(rule_id, now, gap):
+                self.error_logger.log_error(level="WARNING", module="RuleEngine", message=message)
+
+    def _claim(self, rule_id, now, gap):
+        """
+        在数据库中认领一次提醒：该规则最近一次提醒（任一进程）距今不足 gap 秒时返回 False
+
+        数据库不可用时仍然提醒（宁可重复，不丢告警）
+        """
+        try:
+            with transaction(self.db_path) as conn:
+                c = conn.execute('''INSERT INTO rule_alert_state (rule_id, last_notified) VALUES (?, ?)
+                    ON CONFLICT(rule_id) DO UPDATE SET last_notified = excluded.last_notified
+                    WHERE excluded.last_notified - rule_alert_state.last_notified >= ?''', (rule_id, now, gap))
+                return c.rowcount > 0
+        except sqlite3.Error:
+            traceback.print_exc(file=sys.stderr)
+            return True
+
+    def _describe(self, i):
+        metric = METRIC_KEYS[self.metric_idx[i]]
+        relation = "高于" if self.direction[i] > 0 else "低于"
+        return (f"{self.names[i]}: {metric} 当前值 {self.last_values[i]:.2f} "
+                f"{relation}阈值 {self.threshold[i]:g}")
+
+    def active_alerts(self):
+        """当前处于告警状态的规则"""
+        with self._lock:
+            return [{
+                "id": int(self.ids[i]),
+                "name": self.names[i],
+                "metric": METRIC_KEYS[self.metric_idx[i]],
+                "threshold": float(self.threshold[i]),
+                "value": None if np.isnan(self.last_values[i]) else round(float(self.last_values[i]), 2),
+                "since": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.since[i]))
+            } for i in np.nonzero(self.active)[0]]
@@ -0,0 +1,44 @@
+"""
+流式 JSON 响应
+逐行编码数据库游标返回的记录，不在内存中构造完整列表，
+输出格式与 jsonify({"code": 0, "data": [...]}) 一致，并附带键集分页游标 next_after_id
+"""
+import json
+from flask import Response, stream_with_context
+
+# 累积到该字节数再向客户端写出一次
+CHUNK_SIZE = 16 * 1024
+
+
+def iter_json_page(rows, limit, cursor_field='id'):
+    """
+    生成 {"code": 0, "data": [...], "next_after_id": ...} 的文本片段
+
+    Args:
+        rows: 可迭代的 dict 记录（通常直接来自数据库游标）
+        limit: 本页条数上限；返回条数达到 limit 时 next_after_id 为最后一条的 cursor_field
+        cursor_field: 作为分页游标的字段
+    """
+    buffer = ['{"code": 0, "data": [']
+    size = 0
+    count = 0
+    last = None
+    for row in rows:
+        text = json.dumps(row, default=str)
+        buffer.append(',' + text if count else text)
+        size += len(text)
+        count += 1
+        last = row
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    next_after_id = last.get(cursor_field) if last is not None and count >= limit else None
+    buffer.append('], "next_after_id": ' + json.dumps(next_after_id) + '}')
+    yield ''.join(buffer)
+
+
+def json_page_response(rows, limit, cursor_field='id'):
+    """把记录迭代器包装为流式 application/json 响应"""
+    return Response(stream_with_context(iter_json_page(rows, limit, cursor_field)),
+                    mimetype='application/json')
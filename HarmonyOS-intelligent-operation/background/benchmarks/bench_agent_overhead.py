@@ -0,0 +1,76 @@
+"""
+采集代理资源占用基准：以子进程运行 GetStatus.py 代理，向本地模拟的批量上报接口推送，
+统计代理进程的 CPU 占用率与常驻内存
+用法: python benchmarks/bench_agent_overhead.py [--duration 60] [--interval 1]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import psutil
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StubIngestHandler(BaseHTTPRequestHandler):
+    """只读取请求体并返回 200 的模拟 /api/system-metrics/bulk"""
+    received = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        StubIngestHandler.received += 1
+        body = b'{"code": 0}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="采集代理资源占用基准")
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--batch", type=int, default=12)
+    args = parser.parse_args()
+
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), StubIngestHandler)
+    stub.daemon_threads = True
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory(prefix="agent_spool_") as spool_dir:
+        proc = subprocess.Popen([
+            sys.executable, os.path.join(BACKEND_DIR, "GetStatus.py"),
+            "--url", f"http://127.0.0.1:{stub.server_port}/api/system-metrics/bulk",
+            "--host", "bench-agent", "--interval", str(args.interval), "--batch", str(args.batch),
+            "--spool-dir", spool_dir, "--duration", str(args.duration)])
+        agent = psutil.Process(proc.pid)
+        # 跳过解释器启动与 import 的开销，只统计稳定运行阶段
+        time.sleep(2)
+        cpu_start = sum(agent.cpu_times()[:2])
+        started = time.monotonic()
+        peak_rss = 0
+        while proc.poll() is None:
+            try:
+                peak_rss = max(peak_rss, agent.memory_info().rss)
+                cpu_used = sum(agent.cpu_times()[:2]) - cpu_start
+                elapsed = time.monotonic() - started
+            except psutil.NoSuchProcess:
+                break
+            time.sleep(0.5)
+        proc.wait()
+
+    print(f"interval={args.interval}s batch={args.batch} measured={elapsed:.1f}s batches received={StubIngestHandler.received}")
+    print(f"agent cpu={cpu_used / elapsed * 100:.3f}%  peak rss={peak_rss / 1024 / 1024:.1f} MB")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+批量上报压测：多个模拟主机并发向 /api/system-metrics/bulk 发送 gzip NDJSON 批次，
+统计持续写入速率（行/秒），并与逐行 POST /api/system-metrics 对比
+用法: python benchmarks/bench_bulk_ingest.py [--hosts 8] [--batch 500] [--duration 10]
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_batch(host_no, batch, now):
+    lines = [json.dumps({"ts": now - i * 0.01, "cpu": (host_no * 7 + i) % 100, "memory": 42.5,
+                         "disk": 61.0, "network": 128.0}) for i in range(batch)]
+    return gzip.compress("\n".join(lines).encode())
+
+
+def run_clients(base_url, hosts, duration, send):
+    """每个模拟主机一个线程，持续发送 duration 秒，返回 (总行数, 请求数, 耗时)"""
+    import requests
+    totals = [0] * hosts
+    requests_sent = [0] * hosts
+    deadline = time.perf_counter() + duration
+
+    def worker(n):
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            totals[n] += send(session, base_url, n)
+            requests_sent[n] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(hosts)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(totals), sum(requests_sent), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量上报压测")
+    parser.add_argument("--hosts", type=int, default=8, help="并发模拟主机数")
+    parser.add_argument("--batch", type=int, default=500, help="每批行数")
+    parser.add_argument("--duration", type=float, default=10, help="每种模式的压测时长（秒）")
+    args = parser.parse_args()
+
+    # 使用临时数据库副本，避免污染 monitor.db
+    tmp_dir = tempfile.mkdtemp(prefix="bench_ingest_")
+    os.environ["MONITOR_DB_PATH"] = os.path.join(tmp_dir, "monitor.db")
+    shutil.copy(os.path.join(BACKEND_DIR, "monitor.db"), os.environ["MONITOR_DB_PATH"])
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    sys.path.insert(0, BACKEND_DIR)
+    from werkzeug.serving import make_server
+    import GetRequest
+
+    server = make_server("127.0.0.1", 0, GetRequest.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    def send_bulk(session, url, n):
+        body = make_batch(n, args.batch, time.time())
+        resp = session.post(f"{url}/api/system-metrics/bulk", data=body, headers={
+            "X-Host-Id": f"bench-{n:03d}", "Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"})
+        return resp.json()["data"]["accepted"]
+
+    def send_single(session, url, n):
+        session.post(f"{url}/api/system-metrics", json={"cpu": n, "memory": 42.5, "disk": 61.0, "network": 128.0})
+        return 1
+
+    print(f"hosts={args.hosts} batch={args.batch} duration={args.duration}s")
+    print(f"{'mode':12s} {'rows':>10s} {'requests':>9s} {'rows/s':>12s}")
+    for name, send in (("single-row", send_single), ("bulk", send_bulk)):
+        rows, sent, elapsed = run_clients(base_url, args.hosts, args.duration, send)
+        print(f"{name:12s} {rows:10d} {sent:9d} {rows / elapsed:12,.0f}")
+
+    GetRequest.metric_sampler.stop()
+    server.shutdown()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
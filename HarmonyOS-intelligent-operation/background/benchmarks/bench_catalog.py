@@ -0,0 +1,97 @@
+"""
+NFT 商品列表基准：临时数据库中生成 N 个带脚本内容的商品，对比
+SELECT * 分页查询（旧实现）与内存目录索引分页，以及逐笔累加购买次数与批量刷新
+用法: python benchmarks/bench_catalog.py [--products 5000] [--script-kb 20] [--purchases 2000]
+"""
+import os
+import sys
+import time
+import shutil
+import random
+import argparse
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def timed(fn, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NFT 商品列表基准")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--script-kb", type=int, default=20)
+    parser.add_argument("--purchases", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    # 使用 monitor.db 的临时副本（迁移依赖其他业务表）
+    tmp_dir = tempfile.mkdtemp(prefix="bench_catalog_")
+    db_path = os.path.join(tmp_dir, "monitor.db")
+    shutil.copy(os.path.join(BACKEND_DIR, "monitor.db"), db_path)
+    from NFTMarket import NFTMarket
+    from Migrations import migrate
+    from Database import transaction, get_connection
+
+    market = NFTMarket(db_path=db_path)
+    migrate(db_path)
+    rng = random.Random(3)
+    script = "#" * (args.script_kb * 1024)
+    with transaction(db_path) as conn:
+        conn.executemany('''INSERT INTO nft_products (product_id, title, description, price, category, rating,
+            created_at, script_content) VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+            [(f"B-{i:06d}", f"方案 {i}", "描述" * 20, rng.randint(1, 5000), f"分类{i % 8}", rng.randint(0, 50) / 10,
+              f"2025-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}", script) for i in range(args.products)])
+    print(f"products={args.products} script={args.script_kb}KB "
+          f"db size {os.path.getsize(db_path) / 1024 / 1024:.0f} MB")
+
+    conn = get_connection(db_path)
+    old_first = lambda: conn.execute('''SELECT * FROM nft_products WHERE status = 'active'
+        ORDER BY created_at DESC, id DESC LIMIT 50''').fetchall()
+    old_category = lambda: conn.execute('''SELECT * FROM nft_products WHERE status = 'active' AND category = ?
+        ORDER BY created_at DESC, id DESC LIMIT 50''', ("分类3",)).fetchall()
+    old_rating = lambda: conn.execute('''SELECT * FROM nft_products WHERE status = 'active'
+        ORDER BY rating DESC, created_at DESC, id DESC LIMIT 50''').fetchall()
+
+    started = time.perf_counter()
+    market.get_products(limit=1)
+    print(f"catalog build: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    cases = [
+        ("newest, first page", old_first, lambda: market.get_products(limit=50)),
+        ("category, first page", old_category, lambda: market.get_products(category="分类3", limit=50)),
+        ("by rating (unindexed in SQL)", old_rating, lambda: market.get_products(limit=50, sort="rating")),
+    ]
+    print(f"{'list query':30s} {'SELECT * ms':>12s} {'index ms':>10s}")
+    for name, old, new in cases:
+        print(f"{name:30s} {timed(old, args.rounds):12.3f} {timed(new, args.rounds):10.3f}")
+
+    # 购买次数：逐笔 UPDATE 热门商品 vs 已支付订单按商品合并批量计入
+    hot = [f"B-{i:06d}" for i in range(10)]
+    with transaction(db_path) as conn:
+        conn.executemany('''INSERT INTO nft_orders (order_id, product_id, price, payment_status, purchase_counted)
+            VALUES (?, ?, 1, 'paid', 0)''', [(f"O-{i}", rng.choice(hot)) for i in range(args.purchases)])
+    started = time.perf_counter()
+    for i in range(args.purchases):
+        with transaction(db_path) as conn:
+            conn.execute('UPDATE nft_products SET purchase_count = purchase_count + 1 WHERE product_id = ?',
+                         (rng.choice(hot),))
+    per_purchase = time.perf_counter() - started
+    started = time.perf_counter()
+    market.flush_purchases()
+    batched = time.perf_counter() - started
+    print(f"{args.purchases} purchases on {len(hot)} hot products: "
+          f"per-purchase UPDATE {per_purchase * 1000:.0f} ms, one batched flush {batched * 1000:.1f} ms")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
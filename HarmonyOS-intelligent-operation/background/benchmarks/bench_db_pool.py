@@ -0,0 +1,97 @@
+"""
+监控接口数据库访问基准：对比每次新建连接（旧行为）与按线程持久连接（WAL）
+用法: python benchmarks/bench_db_pool.py [--threads 8] [--seconds 5]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (方法, 路径, 请求体)
+ENDPOINTS = [
+    ("GET", "/api/monitor-configs", None),
+    ("GET", "/api/system-metrics", None),
+    ("POST", "/api/system-metrics", {"cpu": 12.5, "memory": 40.1, "disk": 55.0, "network": 1.2}),
+    ("GET", "/api/error-logs?limit=20", None),
+    ("GET", "/api/error-statistics", None),
+]
+
+
+def run_worker(threads, seconds):
+    """在子进程中运行：多线程压测各接口，输出 JSON 结果"""
+    sys.path.insert(0, BACKEND_DIR)
+    import GetRequest
+
+    results = {}
+    for method, path, body in ENDPOINTS:
+        counts = [0] * threads
+        errors = [0] * threads
+        deadline = time.perf_counter() + seconds
+
+        def loop(idx):
+            client = GetRequest.app.test_client()
+            while time.perf_counter() < deadline:
+                resp = client.open(path, method=method, json=body)
+                if resp.status_code >= 400:
+                    errors[idx] += 1
+                counts[idx] += 1
+
+        workers = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+        started = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - started
+        results[f"{method} {path}"] = {
+            "rps": round(sum(counts) / elapsed, 1),
+            "errors": sum(errors)
+        }
+    print(json.dumps(results))
+
+
+def run_mode(pool_enabled, threads, seconds):
+    tmp_dir = tempfile.mkdtemp(prefix="bench_db_")
+    try:
+        db_path = os.path.join(tmp_dir, "monitor.db")
+        shutil.copy(os.path.join(BACKEND_DIR, "monitor.db"), db_path)
+        env = dict(os.environ, MONITOR_DB_PATH=db_path, MONITOR_DB_POOL="1" if pool_enabled else "0")
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker",
+             "--threads", str(threads), "--seconds", str(seconds)],
+            env=env, cwd=tmp_dir, capture_output=True, text=True, check=True
+        )
+        return json.loads(out.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="监控接口数据库连接基准")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.threads, args.seconds)
+        return
+
+    before = run_mode(False, args.threads, args.seconds)
+    after = run_mode(True, args.threads, args.seconds)
+    print(f"{'endpoint':40s} {'before rps':>12s} {'after rps':>12s} {'speedup':>8s} {'errors(b/a)':>12s}")
+    for name in before:
+        b, a = before[name], after[name]
+        speedup = a["rps"] / b["rps"] if b["rps"] else float("inf")
+        print(f"{name:40s} {b['rps']:12.1f} {a['rps']:12.1f} {speedup:7.2f}x {b['errors']:>5d}/{a['errors']:<5d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+错误日志全文检索基准：在临时数据库中生成 N 条带堆栈的错误日志，建立 FTS5 索引后测量
+/api/error-logs/search 使用的查询（相关度 / 时间倒序 / 时间范围）耗时，并与 LIKE 全表扫描对比
+用法: python benchmarks/bench_error_search.py [--rows 1000000] [--rounds 20]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MODULES = ["Flask", "error_logs", "get_nft_products", "qa", "generate_report", "RuleEngine",
+           "system_metrics", "auto_repair", "nft_payment", "MetricIngest"]
+MESSAGES = [
+    "404 Not Found: The requested URL was not found on the server",
+    "database is locked while writing batch {n}",
+    "Connection refused when calling ollama at 127.0.0.1:{n}",
+    "规则触发: CPU使用率监控 cpu_percent={n}",
+    "KeyError: 'product_id' in order {n}",
+    "TimeoutError: read operation timed out after {n} ms",
+    "disk usage above threshold on /dev/sda{n}",
+    "JSONDecodeError: Expecting value: line 1 column {n}",
+]
+FRAMES = ["flask/app.py", "werkzeug/serving.py", "GetRequest.py", "NFTMarket.py", "Database.py",
+          "requests/adapters.py", "urllib3/connectionpool.py", "sqlite3/dbapi2.py"]
+
+
+def make_rows(n, start):
+    from ErrorFingerprint import fingerprint
+    rng = random.Random(7)
+    for i in range(n):
+        ts = (start + timedelta(seconds=i * 3)).strftime('%Y-%m-%d %H:%M:%S')
+        message = rng.choice(MESSAGES).format(n=rng.randint(1, 9999))
+        traceback = ""
+        if rng.random() < 0.6:
+            frames = [f'  File "{rng.choice(FRAMES)}", line {rng.randint(1, 900)}, in handler_{rng.randint(1, 50)}'
+                      for _ in range(rng.randint(3, 8))]
+            traceback = "Traceback (most recent call last):\n" + "\n".join(frames) + f"\n{message}\n"
+        level, module = rng.choice(["ERROR", "ERROR", "WARNING", "CRITICAL"]), rng.choice(MODULES)
+        yield (ts, level, module, message, traceback, "{}", "linux", 0,
+               fingerprint(level, module, message, traceback, "linux")[0])
+
+
+def timed(fn, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, timings[-1] * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="错误日志全文检索基准")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    # 使用 monitor.db 的临时副本（迁移依赖其他业务表）
+    tmp_dir = tempfile.mkdtemp(prefix="bench_search_")
+    db_path = os.path.join(tmp_dir, "monitor.db")
+    shutil.copy(os.path.join(BACKEND_DIR, "monitor.db"), db_path)
+    from ErrorLogger import ErrorLogger, _INSERT_ERROR_LOG
+    from Migrations import migrate
+    from Database import transaction
+
+    logger = ErrorLogger(db_path=db_path, log_dir=os.path.join(tmp_dir, "logs"))
+    start = datetime(2025, 1, 1)
+    started = time.perf_counter()
+    with transaction(db_path) as conn:
+        conn.executemany(_INSERT_ERROR_LOG, make_rows(args.rows, start))
+    print(f"rows={args.rows} insert: {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    migrate(db_path)
+    print(f"migrate (FTS rebuild): {time.perf_counter() - started:.1f}s, "
+          f"db size {os.path.getsize(db_path) / 1024 / 1024:.0f} MB")
+
+    # 重建索引的大事务留在 WAL 中，先检查点，避免计入下面的写入耗时
+    with transaction(db_path) as conn:
+        pass
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    # 与写线程一致：每批 BATCH_SIZE 条一个事务，触发器同步 FTS
+    # （重建后的前几批会触发一次性的段合并，另外报告中位批次耗时）
+    rows = list(make_rows(10240, start + timedelta(days=365)))
+    batch_timings = []
+    for i in range(0, len(rows), ErrorLogger.BATCH_SIZE):
+        started = time.perf_counter()
+        with transaction(db_path) as conn:
+            conn.executemany(_INSERT_ERROR_LOG, rows[i:i + ErrorLogger.BATCH_SIZE])
+        batch_timings.append(time.perf_counter() - started)
+    elapsed = sum(batch_timings)
+    print(f"insert {len(rows)} rows in batches of {ErrorLogger.BATCH_SIZE} with FTS triggers: "
+          f"{elapsed:.2f}s ({len(rows) / elapsed:,.0f} rows/s), "
+          f"median batch {sorted(batch_timings)[len(batch_timings) // 2] * 1000:.1f} ms")
+
+    mid = (start + timedelta(seconds=args.rows * 3 // 2)).strftime('%Y-%m-%d')
+    cases = [
+        ("rare term, rank", dict(query="ollama refused")),
+        ("common term, recent", dict(query="found", sort="recent")),
+        ("common term, rank", dict(query="found")),
+        ("traceback term + day", dict(query="adapters", start=mid, end=mid)),
+        ("chinese term, level", dict(query="规则触发", level="WARNING")),
+        ("prefix term", dict(query="adapt*")),
+        ("no match", dict(query="nosuchterm")),
+    ]
+    print(f"{'query':24s} {'p50 ms':>8s} {'max ms':>8s} {'hits':>5s}")
+    for name, kwargs in cases:
+        p50, worst, result = timed(lambda: logger.search_error_logs(limit=50, **kwargs), args.rounds)
+        print(f"{name:24s} {p50:8.1f} {worst:8.1f} {len(result):5d}")
+
+    conn = sqlite3.connect(db_path)
+    # 对照：LIKE 没有索引可用，未命中（或命中很少）时必须扫描全表
+    p50, worst, _ = timed(lambda: conn.execute(
+        "SELECT id FROM error_logs WHERE message LIKE ? OR traceback LIKE ? "
+        "ORDER BY timestamp DESC LIMIT 50", ("%nosuchterm%", "%nosuchterm%")).fetchall(), 3)
+    print(f"{'no match, LIKE scan':24s} {p50:8.1f} {worst:8.1f}")
+    conn.close()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+预测服务延迟基准：新样本到达后的首次批量预测 vs 缓存命中
+用法: python benchmarks/bench_forecast.py [--rounds 500] [--steps 10] [--model path/to/model.h5]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ForecastService import ForecastService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预测服务延迟基准")
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--model", default=None, help="Keras 模型文件（缺省自动查找）")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    service = ForecastService(model_path=args.model)
+    service.seed({"cpu": 40 + 10 * np.sin(i / 10), "memory": 60.0, "disk": 70.0,
+                  "network": float(rng.uniform(0, 500))} for i in range(service.capacity))
+    metrics = service.metrics
+    service.forecast(metrics, args.steps)
+    print(f"backend={service.backend} window={service.window_size} metrics={len(metrics)} steps={args.steps}")
+
+    cold = []
+    warm = []
+    for i in range(args.rounds):
+        service.observe([40 + 10 * np.sin(i / 10), 60.0, 70.0, float(rng.uniform(0, 500))])
+        started = time.perf_counter()
+        service.forecast(metrics, args.steps)
+        cold.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        service.forecast(metrics, args.steps)
+        warm.append(time.perf_counter() - started)
+
+    for name, samples in (("new sample", cold), ("cached", warm)):
+        ms = np.array(samples) * 1000
+        print(f"{name:>10}: p50={np.percentile(ms, 50):.3f} ms  p95={np.percentile(ms, 95):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+指标记录开销基准：按线程分片的计数器/直方图与全局锁实现在多线程下的单次记录耗时对比
+用法: python benchmarks/bench_instrumentation.py [--threads 8] [--ops 200000]
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Instrumentation import Registry, LATENCY_BUCKETS
+
+
+class LockedHistogram:
+    """对照组：所有线程共享一份状态，每次记录加全局锁"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.state = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        with self.lock:
+            state = self.state.setdefault(labels, [0] * (len(self.buckets) + 3))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-2] += value
+            state[-1] += 1
+
+
+def run(observe, threads, ops):
+    labels = [(f"/api/route/{i}", "GET") for i in range(8)]
+
+    def worker():
+        for i in range(ops):
+            observe(0.003, labels[i & 7])
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指标记录开销基准")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=200000)
+    args = parser.parse_args()
+    total = args.threads * args.ops
+
+    registry = Registry()
+    sharded = registry.histogram("bench_latency_seconds", "bench", ("route", "method"))
+    locked = LockedHistogram(LATENCY_BUCKETS)
+
+    for name, observe in (("sharded", sharded.observe), ("locked", locked.observe)):
+        elapsed = run(observe, args.threads, args.ops)
+        print(f"{name:8s} threads={args.threads} observations={total}: "
+              f"{elapsed * 1e9 / total:.0f} ns/op")
+
+    started = time.perf_counter()
+    text = registry.render()
+    print(f"render: {(time.perf_counter() - started) * 1000:.2f} ms, {len(text.splitlines())} lines")
+
+
+if __name__ == "__main__":
+    main()
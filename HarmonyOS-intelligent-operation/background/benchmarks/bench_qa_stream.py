@@ -0,0 +1,111 @@
+"""
+/api/qa 首 token 延迟基准：本地启动一个模拟 Ollama 的流式服务，
+对比整段返回（旧行为）与 SSE 流式返回的首字节时间和总耗时
+用法: python benchmarks/bench_qa_stream.py [--tokens 50] [--delay 0.02] [--requests 10]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_stub_handler(tokens, delay):
+    class StubOllamaHandler(BaseHTTPRequestHandler):
+        """按固定间隔逐行输出 NDJSON 的模拟 /api/chat"""
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(tokens):
+                time.sleep(delay)
+                self._chunk({"message": {"role": "assistant", "content": f"tok{i} "}, "done": False})
+            self._chunk({"message": {"role": "assistant", "content": ""}, "done": True})
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _chunk(self, obj):
+            body = (json.dumps(obj) + "\n").encode()
+            self.wfile.write(f"{len(body):X}\r\n".encode() + body + b"\r\n")
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    return StubOllamaHandler
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端关闭 keep-alive 连接时的 ConnectionResetError 不影响结果
+        pass
+
+
+def measure(session, url, stream, n):
+    ttfb, total = [], []
+    for _ in range(n):
+        started = time.perf_counter()
+        body = {"question": "CPU占用高怎么办", "stream": stream}
+        with session.post(url, json=body, stream=True) as resp:
+            first = None
+            for chunk in resp.iter_content(chunk_size=None):
+                if first is None and chunk:
+                    first = time.perf_counter() - started
+            total.append(time.perf_counter() - started)
+            ttfb.append(first)
+    return statistics.median(ttfb), statistics.median(total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/api/qa 首 token 延迟基准")
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.02, help="模拟每个 token 的生成间隔（秒）")
+    parser.add_argument("--requests", type=int, default=10)
+    args = parser.parse_args()
+
+    stub = QuietHTTPServer(("127.0.0.1", 0), make_stub_handler(args.tokens, args.delay))
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    os.environ["OLLAMA_API_URL"] = f"http://127.0.0.1:{stub.server_port}/api/chat"
+    # 使用临时数据库副本，避免污染 monitor.db
+    tmp_dir = tempfile.mkdtemp(prefix="bench_qa_")
+    os.environ["MONITOR_DB_PATH"] = os.path.join(tmp_dir, "monitor.db")
+    shutil.copy(os.path.join(BACKEND_DIR, "monitor.db"), os.environ["MONITOR_DB_PATH"])
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    sys.path.insert(0, BACKEND_DIR)
+    import requests
+    from werkzeug.serving import make_server
+    import GetRequest
+
+    server = make_server("127.0.0.1", 0, GetRequest.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api/qa"
+
+    session = requests.Session()
+    b_first, b_total = measure(session, url, False, args.requests)
+    s_first, s_total = measure(session, url, True, args.requests)
+    print(f"stub: {args.tokens} tokens x {args.delay * 1000:.0f} ms")
+    print(f"{'mode':10s} {'first byte (ms)':>16s} {'total (ms)':>12s}")
+    print(f"{'buffered':10s} {b_first * 1000:16.1f} {b_total * 1000:12.1f}")
+    print(f"{'sse':10s} {s_first * 1000:16.1f} {s_total * 1000:12.1f}")
+
+    server.shutdown()
+    stub.shutdown()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
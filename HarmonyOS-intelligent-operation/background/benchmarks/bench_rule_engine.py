@@ -0,0 +1,42 @@
+"""
+规则引擎评估开销基准：N 条规则对单个快照向量的一次评估耗时
+用法: python benchmarks/bench_rule_engine.py [--rules 5000] [--rounds 2000]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from RuleEngine import RuleEngine, METRIC_KEYS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="规则引擎评估开销基准")
+    parser.add_argument("--rules", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    engine = RuleEngine(db_path=":memory:", renotify=60)
+    rules = [(i, f"rule-{i}", METRIC_KEYS[i % len(METRIC_KEYS)], 1 if i % 7 else -1,
+              float(rng.uniform(10, 90))) for i in range(args.rules)]
+    engine._compile(rules)
+
+    timings = []
+    fired_total = 0
+    for i in range(args.rounds):
+        values = rng.uniform(0, 100, len(METRIC_KEYS))
+        started = time.perf_counter()
+        fired, _ = engine.evaluate(values, now=i * 2.0)
+        timings.append(time.perf_counter() - started)
+        fired_total += len(fired)
+
+    us = np.array(timings) * 1e6
+    print(f"rules={args.rules} rounds={args.rounds} alerts fired={fired_total}")
+    print(f"evaluate: p50={np.percentile(us, 50):.1f} us  p99={np.percentile(us, 99):.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+监控 API 压测：以固定并发驱动若干真实请求组合，输出每个场景的 req/s 与 p50/p95/p99 延迟，
+并与保存的 JSON 基线对比，任一场景退化时以退出码 1 结束
+
+场景:
+    status  状态轮询（/api/status、/monitor/data/10、/api/system-metrics、/api/alerts）
+    ingest  批量上报（gzip NDJSON -> /api/system-metrics/bulk）
+    errors  错误日志键集分页（/api/error-logs?after_id=）与统计
+    report  报告生成（POST /api/generate-report）
+    nft     NFT 产品列表分页与详情
+    mixed   以上按权重混合
+
+用法:
+    python benchmarks/loadtest.py                                  # 进程内启动（werkzeug 多线程）
+    python benchmarks/loadtest.py --server gunicorn --workers 4    # gunicorn 多进程
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000      # 压测已运行的实例
+    python benchmarks/loadtest.py --save-baseline                  # 结果写入基线文件
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import shutil
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "loadtest_baseline.json")
+
+
+# ---------------------------------------------------------------- 请求定义
+# 每个操作: fn(session, base_url, state) -> Response；state 为单个客户端线程的私有状态
+
+def op_status(session, url, state):
+    return session.get(f"{url}/api/status")
+
+
+def op_monitor_data(session, url, state):
+    return session.get(f"{url}/monitor/data/10")
+
+
+def op_latest_metrics(session, url, state):
+    return session.get(f"{url}/api/system-metrics")
+
+
+def op_alerts(session, url, state):
+    return session.get(f"{url}/api/alerts")
+
+
+def op_bulk_ingest(session, url, state):
+    now = time.time()
+    n = state["client"]
+    lines = [json.dumps({"ts": now - i * 0.01, "cpu": (n * 7 + i) % 100, "memory": 42.5,
+                         "disk": 61.0, "network": 128.0}) for i in range(state["batch"])]
+    return session.post(f"{url}/api/system-metrics/bulk", data=gzip.compress("\n".join(lines).encode()), headers={
+        "X-Host-Id": f"loadtest-{n:03d}", "Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"})
+
+
+def _page(session, url, path, state, key, limit):
+    params = {"limit": limit}
+    if state.get(key):
+        params["after_id"] = state[key]
+    resp = session.get(f"{url}{path}", params=params)
+    if resp.ok:
+        # 翻到末页后从头开始
+        state[key] = resp.json().get("next_after_id")
+    return resp
+
+
+def op_error_logs_page(session, url, state):
+    return _page(session, url, "/api/error-logs", state, "error_cursor", 50)
+
+
+def op_error_statistics(session, url, state):
+    return session.get(f"{url}/api/error-statistics")
+
+
+def op_generate_report(session, url, state):
+    return session.post(f"{url}/api/generate-report", json={"title": "压测报告", "format": "json"})
+
+
+def op_nft_page(session, url, state):
+    return _page(session, url, "/api/nft/products", state, "nft_cursor", 20)
+
+
+def op_nft_product(session, url, state):
+    products = state.get("nft_ids")
+    if products is None:
+        resp = session.get(f"{url}/api/nft/products", params={"limit": 50})
+        products = state["nft_ids"] = [p["product_id"] for p in resp.json().get("data", [])] if resp.ok else []
+    if not products:
+        return session.get(f"{url}/api/nft/products", params={"limit": 1})
+    return session.get(f"{url}/api/nft/product/{random.choice(products)}")
+
+
+SCENARIOS = {
+    "status": [(4, op_status), (3, op_monitor_data), (2, op_latest_metrics), (1, op_alerts)],
+    "ingest": [(1, op_bulk_ingest)],
+    "errors": [(4, op_error_logs_page), (1, op_error_statistics)],
+    "report": [(1, op_generate_report)],
+    "nft": [(3, op_nft_page), (2, op_nft_product)],
+    "mixed": [(30, op_status), (20, op_monitor_data), (10, op_latest_metrics), (5, op_bulk_ingest),
+              (15, op_error_logs_page), (5, op_error_statistics), (1, op_generate_report),
+              (10, op_nft_page), (4, op_nft_product)],
+}
+
+
+# ---------------------------------------------------------------- 压测执行
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def run_scenario(base_url, ops, concurrency, duration, warmup, batch):
+    """固定并发的闭环压测：每个客户端线程收到响应后立即发下一个请求"""
+    import requests
+    weights = [w for w, _ in ops]
+    funcs = [f for _, f in ops]
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    start_barrier = threading.Barrier(concurrency + 1)
+    window = {}
+
+    def worker(n):
+        session = requests.Session()
+        state = {"client": n, "batch": batch}
+        rng = random.Random(n)
+        start_barrier.wait()
+        while True:
+            now = time.perf_counter()
+            if now >= window["end"]:
+                break
+            fn = rng.choices(funcs, weights)[0]
+            try:
+                resp = fn(session, base_url, state)
+                ok = resp.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - now
+            if now >= window["measure_from"]:
+                latencies[n].append(elapsed)
+                if not ok:
+                    errors[n] += 1
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    window["measure_from"] = time.perf_counter() + warmup
+    window["end"] = window["measure_from"] + duration
+    start_barrier.wait()
+    for t in threads:
+        t.join()
+
+    samples = sorted(x for per_client in latencies for x in per_client)
+    count = len(samples)
+    return {
+        "requests": count,
+        "errors": sum(errors),
+        "error_rate": round(sum(errors) / count, 4) if count else 0.0,
+        "rps": round(count / duration, 1),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """
+    与基线对比，返回退化描述列表
+
+    延迟超过基线 (1 + tolerance) 倍且绝对差大于 min_delta_ms、吞吐低于基线 (1 - tolerance) 倍、
+    或错误率上升超过 1 个百分点都视为退化
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if result[key] > base[key] * (1 + tolerance) and result[key] - base[key] > min_delta_ms:
+                regressions.append(f"{name}: {key} {base[key]} -> {result[key]}")
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {base['rps']} -> {result['rps']}")
+        if result["error_rate"] > base.get("error_rate", 0.0) + 0.01:
+            regressions.append(f"{name}: error_rate {base.get('error_rate', 0.0)} -> {result['error_rate']}")
+    return regressions
+
+
+# ---------------------------------------------------------------- 服务启动
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(base_url, timeout=30):
+    import requests
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/api/status", timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"服务未在 {timeout} 秒内就绪: {base_url}")
+
+
+def start_inprocess():
+    """在当前进程内以 werkzeug 多线程服务器启动应用，返回 (base_url, stop)"""
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    sys.path.insert(0, BACKEND_DIR)
+    from werkzeug.serving import make_server
+    import GetRequest
+
+    server = make_server("127.0.0.1", 0, GetRequest.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        GetRequest.metric_sampler.stop()
+        server.shutdown()
+    return f"http://127.0.0.1:{server.server_port}", stop
+
+
+def start_gunicorn(workers, threads):
+    """以 gunicorn 子进程启动（需已安装 gunicorn），返回 (base_url, stop)"""
+    if shutil.which("gunicorn") is None:
+        raise RuntimeError("未找到 gunicorn，请先 pip install gunicorn 或使用 --server inprocess")
+    port = _free_port()
+    proc = subprocess.Popen(
+        ["gunicorn", "-w", str(workers), "--threads", str(threads), "-b", f"127.0.0.1:{port}",
+         "--log-level", "warning", "GetRequest:app"],
+        cwd=BACKEND_DIR, env=dict(os.environ))
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(base_url)
+    except Exception:
+        proc.terminate()
+        raise
+
+    def stop():
+        proc.terminate()
+        proc.wait(timeout=10)
+    return base_url, stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="监控 API 压测")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔的场景名")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发客户端数")
+    parser.add_argument("--duration", type=float, default=10, help="每个场景的统计时长（秒）")
+    parser.add_argument("--warmup", type=float, default=2, help="每个场景统计前的预热时长（秒）")
+    parser.add_argument("--batch", type=int, default=200, help="ingest 场景每批行数")
+    parser.add_argument("--server", choices=("inprocess", "gunicorn"), default="inprocess")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker 数")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn 每个 worker 的线程数")
+    parser.add_argument("--url", help="压测已运行的实例，不启动服务")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线 JSON 文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果写入基线文件")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的相对退化比例")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="延迟退化的最小绝对差（毫秒）")
+    parser.add_argument("--json", help="结果另存为 JSON 文件")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+
+    tmp_dir = None
+    if args.url:
+        base_url, stop = args.url.rstrip("/"), (lambda: None)
+    else:
+        # 使用临时数据库副本与报告/日志目录，避免污染 monitor.db、reports/ 和 logs/
+        tmp_dir = tempfile.mkdtemp(prefix="loadtest_")
+        os.environ["MONITOR_DB_PATH"] = os.path.join(tmp_dir, "monitor.db")
+        shutil.copy(os.path.join(BACKEND_DIR, "monitor.db"), os.environ["MONITOR_DB_PATH"])
+        os.environ["MONITOR_REPORT_DIR"] = os.path.join(tmp_dir, "reports")
+        os.environ["MONITOR_LOG_DIR"] = os.path.join(tmp_dir, "logs")
+        if args.server == "gunicorn":
+            base_url, stop = start_gunicorn(args.workers, args.threads)
+        else:
+            base_url, stop = start_inprocess()
+
+    server_desc = args.url or (f"gunicorn workers={args.workers} threads={args.threads}"
+                               if args.server == "gunicorn" else "inprocess")
+    print(f"server={server_desc} concurrency={args.concurrency} duration={args.duration}s")
+    print(f"{'scenario':10s} {'requests':>9s} {'errors':>7s} {'req/s':>9s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}")
+    results = {}
+    try:
+        for name in names:
+            r = run_scenario(base_url, SCENARIOS[name], args.concurrency, args.duration, args.warmup, args.batch)
+            results[name] = r
+            print(f"{name:10s} {r['requests']:9d} {r['errors']:7d} {r['rps']:9.1f} "
+                  f"{r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['p99_ms']:8.2f}")
+    finally:
+        stop()
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    report = {
+        "generated_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "server": server_desc,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "scenarios": results
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"基线已写入 {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"未找到基线文件 {args.baseline}，跳过对比（可用 --save-baseline 生成）")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("concurrency") != args.concurrency or baseline.get("server") != server_desc:
+        print(f"注意: 基线条件为 server={baseline.get('server')} concurrency={baseline.get('concurrency')}，与本次不同")
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print("性能退化:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"与基线 {baseline.get('generated_at')} 对比: 无退化（容差 {args.tolerance:.0%}）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"""
+gunicorn 配置（在本目录执行 gunicorn 时自动读取，命令行参数优先）
+/monitor/stream、/api/qa 等流式接口在整个连接期间占用一个请求线程，默认的同步 worker 会被一个打开的看板
+整个占住，因此使用 gthread：每个 worker 进程 threads 个线程，流式连接只占其中一个。
+SSE 订阅者上限（MONITOR_STREAM_MAX_SUBSCRIBERS）应小于 threads，连接最长保持 MONITOR_STREAM_MAX_SECONDS 秒
+
+用法: gunicorn -b 0.0.0.0:5000 GetRequest:app
+"""
+import os
+
+worker_class = 'gthread'
+workers = int(os.environ.get('MONITOR_GUNICORN_WORKERS', 2))
+threads = int(os.environ.get('MONITOR_GUNICORN_THREADS', 32))
+# gthread worker 的心跳与请求无关，长连接不会触发超时重启
+timeout = 30
+graceful_timeout = 10
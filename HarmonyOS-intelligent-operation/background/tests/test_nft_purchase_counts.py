@@ -0,0 +1,51 @@
+"""
+购买次数批量计入：迁移 9 之前的待支付订单在迁移后支付，仍应计入 purchase_count
+
+用法: python -m pytest tests
+"""
+import os
+import shutil
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import Migrations
+from Database import transaction, get_connection
+from NFTMarket import NFTMarket
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'monitor.db')
+    shutil.copy(os.path.join(BACKEND_DIR, 'monitor.db'), path)
+    return path
+
+
+def _purchase_count(db_path, product_id):
+    return get_connection(db_path).execute(
+        'SELECT purchase_count FROM nft_products WHERE product_id = ?', (product_id,)).fetchone()[0]
+
+
+def test_order_paid_after_migration_is_counted(db_path):
+    NFTMarket(db_path)
+    Migrations.migrate(db_path, target=8)
+    product_id = get_connection(db_path).execute('SELECT product_id FROM nft_products LIMIT 1').fetchone()[0]
+    with transaction(db_path) as conn:
+        conn.executemany('''INSERT INTO nft_orders (order_id, product_id, price, payment_status)
+            VALUES (?, ?, 1.0, ?)''', [('ORDER-PENDING', product_id, 'pending'),
+                                       ('ORDER-FAILED', product_id, 'failed'),
+                                       ('ORDER-PAID', product_id, 'paid')])
+    Migrations.migrate(db_path)
+
+    market = NFTMarket(db_path)
+    before = _purchase_count(db_path, product_id)
+    # 迁移前已支付的订单视为已计入，不会被重复累加
+    assert market.flush_purchases() == {}
+
+    assert market.complete_payment('ORDER-PENDING')
+    assert market.flush_purchases() == {product_id: before + 1}
+    assert _purchase_count(db_path, product_id) == before + 1
+    assert market.flush_purchases() == {}
@@ -0,0 +1,44 @@
+"""
+热点查询执行计划回归测试：hot_queries() 由各模块实际执行的 SQL 生成，迁移后的库上不应出现全表扫描
+
+用法: python -m pytest tests
+"""
+import os
+import shutil
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import Migrations
+from Database import get_connection
+from ReportStore import ReportStore
+from AnomalyDetector import AnomalyDetector
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'monitor.db')
+    shutil.copy(os.path.join(BACKEND_DIR, 'monitor.db'), path)
+    Migrations.migrate(path)
+    # reports / anomalies 表由各自模块在启动时创建，不在迁移中
+    ReportStore(path, report_dir=str(tmp_path / 'reports'))
+    AnomalyDetector(path)
+    return path
+
+
+def test_hot_queries_use_indexes(db_path):
+    assert Migrations.check_query_plans(db_path) == []
+
+
+def test_hot_queries_execute(db_path):
+    conn = get_connection(db_path)
+    for name, sql, params in Migrations.hot_queries():
+        conn.execute(sql, params).fetchall()
+
+
+def test_hot_query_names_unique():
+    names = [name for name, _, _ in Migrations.hot_queries()]
+    assert len(names) == len(set(names))
@@ -0,0 +1,31 @@
+"""
+响应缓存：本进程按标签失效，其他进程的写入通过数据版本号失效
+
+用法: python -m pytest tests
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from ResponseCache import ResponseCache
+
+
+def test_version_change_invalidates_entry():
+    cache = ResponseCache()
+    state = {"version": 1, "calls": 0}
+
+    @cache.cached("configs", ttl=300, tags=("monitor_config",), version=lambda: state["version"])
+    def load():
+        state["calls"] += 1
+        return state["calls"]
+
+    assert load() == 1
+    assert load() == 1
+    # 其他 worker 写入：本进程未调用 invalidate，只有版本号变化
+    state["version"] = 2
+    assert load() == 2
+    assert load() == 2
+    cache.invalidate("monitor_config")
+    assert load() == 3